@@ -0,0 +1,245 @@
+"""
+Async serving mode. The read endpoints that dominate traffic run natively
+on asyncio with Motor, so one worker keeps many requests in flight while
+they wait on MongoDB. The live post event streams run here too, where an
+open stream is a parked coroutine rather than a thread. Every other /api
+route falls through to the Flask app (app.py), which keeps working on its
+own as the WSGI entry point.
+
+    uvicorn asgi_app:app --workers 4
+
+Requires starlette, motor, a2wsgi and uvicorn.
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import generate_etag, parse_accept_header, parse_etags, quote_etag
+
+from config import Config
+from app import create_app
+from models import posts_collection, image_store, client_options, DB_NAME, READ_PREFERENCES
+import comments
+from cursors import parse_limit, DEFAULT_PAGE_SIZE
+from feed import (sample_pipeline, cards_pipeline, order_cards, to_card,
+                  user_posts_pipeline, user_posts_page, parse_fields)
+from httpcache import post_etag, matching_tag, choose_encoding, encode_body
+from events import post_events, sse_frame
+from search import search_index
+
+client = None
+
+def collection(name, reads=False):
+    # reads=True: listing queries that may go to secondaries
+    if reads:
+        return client[DB_NAME].get_collection(name, read_preference=READ_PREFERENCES[Config.MONGO_READ_PREFERENCE])
+    return client[DB_NAME][name]
+
+@asynccontextmanager
+async def lifespan(app):
+    # One client (and pool) per worker, created on the worker's own loop
+    global client
+    options = dict(client_options(Config), maxPoolSize=Config.ASYNC_MONGO_POOL_SIZE)
+    client = AsyncIOMotorClient(Config.MONGO_URI, **options)
+    try:
+        yield
+    finally:
+        client.close()
+
+def json_response(request, payload, status=200, etag=None):
+    # Same validators and content coding as the Flask after_request hooks
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    if request.headers.get("origin") == Config.FRONTEND_ORIGIN:
+        headers["Access-Control-Allow-Origin"] = Config.FRONTEND_ORIGIN
+        headers["Vary"] = "Origin, Accept-Encoding"
+    if status != 200:
+        return Response(body, status_code=status, headers=headers, media_type="application/json")
+    etag = etag or generate_etag(body)
+    headers["Cache-Control"] = "no-cache"
+    matched = matching_tag(etag, parse_etags(request.headers.get("if-none-match")))
+    if matched:
+        headers["ETag"] = quote_etag(matched)
+        return Response(status_code=304, headers=headers)
+    if len(body) >= Config.COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(parse_accept_header(request.headers.get("accept-encoding")))
+        if encoding:
+            body = encode_body(body, encoding)
+            headers["Content-Encoding"] = encoding
+            etag = f"{etag}-{encoding}"
+    headers["ETag"] = quote_etag(etag)
+    return Response(body, headers=headers, media_type="application/json")
+
+def message(request, text, status):
+    return json_response(request, {"message": text}, status)
+
+async def aggregate(name, pipeline):
+    return await collection(name, reads=True).aggregate(pipeline).to_list(None)
+
+async def get_reaction(post_id, user_id):
+    if not user_id:
+        return None
+    doc = await collection("reactions").find_one({"postId": post_id, "userId": user_id}, {"_id": 0, "kind": 1})
+    return doc.get("kind") if doc else None
+
+async def get_random_posts(request):
+    cards = [image_store.add_variants(to_card(doc)) for doc in await aggregate("posts", sample_pipeline())]
+    return json_response(request, cards)
+
+async def search_posts(request):
+    query = request.query_params.get("q") or request.query_params.get("title", "")
+    if not query.strip():
+        cards = [image_store.add_variants(to_card(doc)) for doc in await aggregate("posts", sample_pipeline())]
+        return json_response(request, {"results": cards, "nextCursor": None})
+    # The index is in-process; building it uses the blocking driver once
+    await run_in_threadpool(search_index.ensure_loaded, posts_collection.reads)
+    try:
+        limit = parse_limit(request.query_params.get("limit"))
+        hits, next_cursor = search_index.search(query, limit, request.query_params.get("cursor"))
+    except ValueError as e:
+        return message(request, str(e), 400)
+    post_ids = [post_id for post_id, _ in hits]
+    docs = await aggregate("posts", cards_pipeline(post_ids)) if post_ids else []
+    results = [image_store.add_variants(card) for card in order_cards(docs, post_ids)]
+    return json_response(request, {"results": results, "nextCursor": next_cursor})
+
+async def get_single_post(request):
+    post_id = request.path_params["post_id"]
+    user_id = request.query_params.get("userId")
+    posts = collection("posts")
+    if request.headers.get("if-none-match"):
+        # Version stamp and reaction are independent, so fetch them together
+        stamp, reaction = await asyncio.gather(
+            posts.find_one({"postId": post_id}, {"_id": 0, "version": 1}),
+            get_reaction(post_id, user_id)
+        )
+        if stamp is None:
+            return message(request, "Post not found", 404)
+        etag = post_etag(post_id, stamp.get("version"), reaction, bool(user_id))
+        if matching_tag(etag, parse_etags(request.headers["if-none-match"])):
+            # Answered as 304 by json_response without loading the body
+            return json_response(request, None, etag=etag)
+        post = await posts.find_one({"postId": post_id}, {"_id": 0, "comments": 0, "hot": 0})
+    else:
+        post, reaction = await asyncio.gather(
+            posts.find_one({"postId": post_id}, {"_id": 0, "comments": 0, "hot": 0}),
+            get_reaction(post_id, user_id)
+        )
+    if not post:
+        return message(request, "Post not found", 404)
+    if user_id:
+        post["reaction"] = reaction
+    etag = post_etag(post_id, post.get("version"), reaction, bool(user_id))
+    return json_response(request, image_store.add_variants(post), etag=etag)
+
+async def post_event_stream(request):
+    post_id = request.path_params["post_id"]
+    if not await collection("posts").find_one({"postId": post_id}, {"_id": 1}):
+        return message(request, "Post not found", 404)
+    # Writes handled by the mounted Flask app publish on the same bus
+    subscription = post_events.subscribe(post_id, loop=asyncio.get_running_loop())
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                frame = await subscription.next_async(Config.EVENTS_HEARTBEAT_SECONDS)
+                if subscription.evicted:
+                    yield sse_frame("resync", {})
+                    return
+                yield frame if frame is not None else ": keepalive\n\n"
+        finally:
+            post_events.unsubscribe(subscription)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if request.headers.get("origin") == Config.FRONTEND_ORIGIN:
+        headers["Access-Control-Allow-Origin"] = Config.FRONTEND_ORIGIN
+        headers["Vary"] = "Origin"
+    return StreamingResponse(stream(), headers=headers, media_type="text/event-stream")
+
+async def list_thread(request, name, thread, parent_id, key):
+    try:
+        limit = parse_limit(request.query_params.get("limit"))
+        match, sort = comments.page_query(thread, parent_id, request.query_params.get("cursor"))
+    except ValueError as e:
+        return message(request, str(e), 400)
+    docs = await collection(name, reads=True).find(match, {"_id": 0}).sort(sort).limit(limit + 1).to_list(None)
+    page, next_cursor = comments.finish_page(thread, docs, limit)
+    return json_response(request, {key: page, "nextCursor": next_cursor})
+
+async def get_comments(request):
+    return await list_thread(request, "comments", comments.COMMENT_THREAD, request.path_params["post_id"], "comments")
+
+async def get_replies(request):
+    return await list_thread(request, "replies", comments.REPLY_THREAD, request.path_params["comment_id"], "replies")
+
+async def get_user(request):
+    user_id = request.path_params["user_id"]
+    try:
+        user_object_id = ObjectId(user_id)
+    except Exception:
+        return message(request, "Invalid user ID format", 400)
+    try:
+        projection = parse_fields(request.query_params.get("fields"))
+    except ValueError as e:
+        return message(request, str(e), 400)
+    # Profile and first page of posts are independent queries
+    user, docs = await asyncio.gather(
+        collection("users", reads=True).find_one({"_id": user_object_id}, {"password": 0}),
+        aggregate("posts", user_posts_pipeline(user_id, projection=projection))
+    )
+    if not user:
+        return message(request, "User not found", 404)
+    posts, next_cursor = user_posts_page(docs, DEFAULT_PAGE_SIZE)
+    return json_response(request, {
+        "id": str(user["_id"]),
+        "name": user["name"],
+        "email": user["email"],
+        "phone": user.get("phone"),
+        "education": user.get("education"),
+        "occupation": user.get("occupation"),
+        "profileImage": user.get("profileImage"),
+        "profileImageVariants": image_store.variant_urls(user.get("profileImage")),
+        "posts": [image_store.add_variants(post) for post in posts],
+        "nextCursor": next_cursor
+    })
+
+async def get_user_posts(request):
+    user_id = request.path_params["user_id"]
+    try:
+        ObjectId(user_id)
+    except Exception:
+        return message(request, "Invalid user ID format", 400)
+    try:
+        limit = parse_limit(request.query_params.get("limit"))
+        projection = parse_fields(request.query_params.get("fields"))
+        pipeline = user_posts_pipeline(user_id, limit, request.query_params.get("cursor"), projection)
+    except ValueError as e:
+        return message(request, str(e), 400)
+    posts, next_cursor = user_posts_page(await aggregate("posts", pipeline), limit)
+    return json_response(request, {
+        "posts": [image_store.add_variants(post) for post in posts],
+        "nextCursor": next_cursor
+    })
+
+app = Starlette(
+    routes=[
+        Route("/api/posts", get_random_posts),
+        Route("/api/search", search_posts),
+        Route("/api/post/{post_id}", get_single_post),
+        Route("/api/post/{post_id}/events", post_event_stream),
+        Route("/api/post/{post_id}/comments", get_comments),
+        Route("/api/post/{post_id}/comments/{comment_id}/replies", get_replies),
+        Route("/api/user/{user_id}", get_user),
+        Route("/api/user/{user_id}/posts", get_user_posts),
+        # Writes, images and everything else
+        Mount("/", app=WSGIMiddleware(create_app())),
+    ],
+    lifespan=lifespan,
+)
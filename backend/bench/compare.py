@@ -0,0 +1,41 @@
+"""Compare two bench.loadtest result files route by route.
+
+    python -m bench.compare before.json after.json [--threshold 10]
+
+Exits with status 1 if any route's p95 latency regressed by more than
+--threshold percent, so it can gate a CI job.
+"""
+import argparse
+import json
+
+def change(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff two load-test result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 regression in percent")
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)["routes"]
+    with open(args.after) as f:
+        after = json.load(f)["routes"]
+
+    regressed = []
+    print(f"{'route':20} {'p50 ms':>17} {'p95 ms':>17} {'req/s':>17}")
+    for name in sorted(set(before) & set(after)):
+        b, a = before[name], after[name]
+        cells = []
+        for key in ("p50Ms", "p95Ms", "throughput"):
+            delta = change(b.get(key), a.get(key))
+            cells.append(f"{a.get(key)!s:>8} ({delta:+.0f}%)" if delta is not None else f"{a.get(key)!s:>17}")
+        print(f"{name:20} " + " ".join(cells))
+        delta = change(b.get("p95Ms"), a.get("p95Ms"))
+        if delta is not None and delta > args.threshold:
+            regressed.append(name)
+    if regressed:
+        print("p95 regressions: " + ", ".join(regressed))
+        raise SystemExit(1)
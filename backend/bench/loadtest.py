@@ -0,0 +1,197 @@
+"""Drive the blog API at a fixed concurrency and record per-route latency.
+
+    python -m bench.loadtest --mongomock --requests 500 --concurrency 8 -o results.json
+    python -m bench.loadtest --url http://localhost:5000 --no-seed -o results.json
+
+Run from backend/. Without --url the app runs in-process behind Flask's
+test client, so only the app and the database are measured. With --url,
+requests go over HTTP to a running server that uses the same MONGO_URI,
+because request ids are sampled from the database.
+
+Each route runs as its own phase of --requests requests, so the numbers do
+not mix. Results are written as JSON. bench.compare diffs two result files.
+"""
+import argparse
+import json
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bench.seed import WORDS, BENCH_PASSWORD, add_corpus_arguments, seed_from_args, use_mongomock
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class Sample:
+    # Ids drawn from the seeded corpus
+    def __init__(self, rng):
+        from models import users_collection, posts_collection
+        self.rng = rng
+        self.user_ids = [str(u["_id"]) for u in users_collection.find({}, {"_id": 1}).limit(1000)]
+        self.post_ids = [p["postId"] for p in posts_collection.find({}, {"_id": 0, "postId": 1}).limit(5000)]
+        if not self.user_ids or not self.post_ids:
+            raise SystemExit("No users or posts found; seed first")
+
+    def user(self):
+        return self.rng.choice(self.user_ids)
+
+    def post(self):
+        return self.rng.choice(self.post_ids)
+
+# route name -> builder(sample) returning (method, path, json body or None)
+SCENARIOS = {
+    "feed": lambda s: ("GET", "/api/posts", None),
+    "hot": lambda s: ("GET", "/api/posts/hot", None),
+    "search": lambda s: ("GET", f"/api/search?q={s.rng.choice(WORDS)}", None),
+    "post": lambda s: ("GET", f"/api/post/{s.post()}", None),
+    "post_with_reaction": lambda s: ("GET", f"/api/post/{s.post()}?userId={s.user()}", None),
+    "comments": lambda s: ("GET", f"/api/post/{s.post()}/comments", None),
+    "user": lambda s: ("GET", f"/api/user/{s.user()}", None),
+    "user_posts": lambda s: ("GET", f"/api/user/{s.user()}/posts?fields=title,image", None),
+    "toggle_like": lambda s: ("POST", f"/api/post/{s.post()}/toggle-like", {"userId": s.user()}),
+    "toggle_dislike": lambda s: ("POST", f"/api/post/{s.post()}/toggle-dislike", {"userId": s.user()}),
+    "add_view": lambda s: ("POST", f"/api/post/{s.post()}/add-view", {"userId": s.user()}),
+    "add_comment": lambda s: ("POST", f"/api/post/{s.post()}/add-comment", {"userId": s.user(), "content": "bench comment"}),
+    "login": lambda s: ("POST", "/api/login", {"email": f"bench{s.rng.randrange(len(s.user_ids))}@example.com", "password": BENCH_PASSWORD}),
+}
+
+class InProcessClient:
+    def __init__(self):
+        from config import Config
+        # A single process, so a throwaway signing key is enough
+        Config.SECRET_KEY = Config.SECRET_KEY or secrets.token_hex(32)
+        from app import create_app
+        self.app = create_app()
+        self.local = threading.local()
+
+    def request(self, method, path, body):
+        # One test client per worker thread
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers={"Accept-Encoding": "gzip"})
+        response.get_data()
+        return response.status_code
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers={
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip",
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+def run_route(client, sample, name, requests, concurrency):
+    build = SCENARIOS[name]
+    # Build all requests up front so id sampling is not timed
+    planned = [build(sample) for _ in range(requests)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(spec):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            status = client.request(*spec)
+        except Exception:
+            status = 599
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, planned))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput": round(requests / wall, 1) if wall else None,
+        "meanMs": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50Ms": ms(percentile(latencies, 50)),
+        "p95Ms": ms(percentile(latencies, 95)),
+        "p99Ms": ms(percentile(latencies, 99)),
+        "maxMs": ms(latencies[-1]) if latencies else None,
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the blog API")
+    add_corpus_arguments(parser)
+    parser.add_argument("--mongomock", action="store_true", help="seed and run against an in-memory stand-in")
+    parser.add_argument("--no-seed", action="store_true", help="use the corpus already in the database")
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routes", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("-o", "--output", help="write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        use_mongomock()
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in SCENARIOS]
+    if unknown:
+        parser.error("unknown routes: " + ", ".join(unknown))
+
+    corpus = None
+    if not args.no_seed:
+        corpus = seed_from_args(args)
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    sample = Sample(random.Random(args.seed))
+
+    results = {}
+    for name in routes:
+        results[name] = run_route(client, sample, name, args.requests, args.concurrency)
+        print(f"{name:20} {results[name]['throughput']:>8} req/s  p50 {results[name]['p50Ms']} ms"
+              f"  p99 {results[name]['p99Ms']} ms  errors {results[name]['errors']}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "startedAt": datetime.utcnow().isoformat(),
+            "revision": git_revision(),
+            "target": args.url or "in-process",
+            "database": "mongomock" if args.mongomock else "MONGO_URI",
+            "requestsPerRoute": args.requests,
+            "concurrency": args.concurrency,
+            "corpus": corpus,
+        },
+        "routes": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,82 @@
+"""Microbenchmarks of the CPU-bound helpers behind the API.
+
+    python -m bench.micro [-o micro.json]
+
+Run from backend/. Needs no database. Reports the best of several timing
+runs, in microseconds per call.
+"""
+import argparse
+import json
+import random
+import timeit
+
+from bench.seed import WORDS
+
+def build_fixtures(rng, posts=500, words_per_post=400):
+    docs = []
+    for i in range(posts):
+        body = "".join(
+            "<p>" + " ".join(rng.choice(WORDS) for _ in range(40)) + "</p>"
+            for _ in range(words_per_post // 40)
+        )
+        docs.append({"postId": f"{i:024x}", "title": " ".join(rng.choice(WORDS) for _ in range(6)), "content": body})
+    return docs
+
+class ListCollection:
+    # Enough of a collection for SearchIndex.build
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query=None, projection=None):
+        return iter(self.docs)
+
+def cases(rng):
+    from cursors import encode_cursor, decode_cursor
+    from feed import to_card, summarize_post
+    from html_text import html_to_text, make_excerpt
+    from search import SearchIndex
+    from views import hll_position
+    import flask.json
+    from flask import Flask
+
+    docs = build_fixtures(rng)
+    collection = ListCollection(docs)
+    index = SearchIndex()
+    index.build(collection)
+    post = dict(docs[0], likes=3, dislikes=1, views=120, commentCount=4, timestamp="2024-01-01T00:00:00")
+    cursor = encode_cursor("2024-01-01T00:00:00", docs[0]["postId"])
+    app = Flask(__name__)
+
+    def serialize():
+        with app.app_context():
+            flask.json.dumps(post)
+
+    return {
+        "html_to_text": (lambda: html_to_text(docs[0]["content"]), 200),
+        "make_excerpt": (lambda: make_excerpt(html_to_text(docs[0]["content"][:600])), 2000),
+        "to_card": (lambda: to_card({"postId": "x", "contentHead": docs[0]["content"][:600]}), 2000),
+        "summarize_post": (lambda: summarize_post(docs[0]["content"]), 200),
+        "search_build_500_posts": (lambda: SearchIndex().build(collection), 3),
+        "search_query": (lambda: index.search("cache", 10), 500),
+        "search_prefix_query": (lambda: index.search("ca", 10), 200),
+        "hll_position": (lambda: hll_position("5f2b0c7e9d1a4b3c2d1e0f9a"), 20000),
+        "cursor_roundtrip": (lambda: decode_cursor(encode_cursor("2024-01-01T00:00:00", "abc"), str, str), 20000),
+        "serialize_post": (serialize, 2000),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of CPU-bound helpers")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, (fn, number) in cases(random.Random(1)).items():
+        best = min(timeit.repeat(fn, number=number, repeat=args.repeat)) / number
+        results[name] = {"usPerCall": round(best * 1e6, 2), "calls": number}
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,155 @@
+"""Seed MongoDB with a synthetic blog corpus for benchmarking.
+
+    python -m bench.seed --users 100 --posts-per-user 20 --comments 5 --replies 2
+
+Run from backend/. Writes through the app's own collections (MONGO_URI),
+so point it at a scratch database. With --mongomock the corpus lives in
+memory and only exists for the current process; bench.loadtest seeds that
+way itself.
+
+To reuse a large corpus, seed once, save it with `python corpus.py export`
+and load it into other databases with `python corpus.py import`.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+WORDS = (
+    "mongo index query cursor latency cache request thread pool buffer stream "
+    "python flask react render image variant search token score shard replica "
+    "write read batch flush counter comment reply profile feed excerpt blog post "
+    "design system network memory disk process worker queue event socket server"
+).split()
+
+BENCH_PASSWORD = "benchpass"
+
+def use_mongomock():
+    # Must run before models is imported
+    import mongomock
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+    # mongomock lacks $substrCP; $substr is close enough for timing
+    from feed import CARD_PROJECTION
+    CARD_PROJECTION["contentHead"] = {"$substr": CARD_PROJECTION["contentHead"]["$substrCP"]}
+
+def words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+def make_image(rng, size_kb):
+    # A real PNG when Pillow is available (so variants can be rendered),
+    # otherwise random bytes of the requested size
+    try:
+        from PIL import Image
+    except ImportError:
+        return os.urandom(size_kb * 1024), "image/png"
+    side = max(16, int((size_kb * 1024 / 3) ** 0.5))
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue(), "image/png"
+
+def seed(users=50, posts_per_user=10, comments=3, replies=1, words_per_post=400,
+         image_kb=0, images=5, seed_value=1):
+    from bson import ObjectId
+    from models import (users_collection, posts_collection, comments_collection,
+                        replies_collection, image_store)
+    from indexes import apply_indexes
+    from passwords import password_hasher
+    from feed import summarize_post
+    from hot import hot_score
+
+    rng = random.Random(seed_value)
+    apply_indexes()
+    hashed = password_hasher.hash(BENCH_PASSWORD)
+    image_urls = []
+    for _ in range(images if image_kb else 0):
+        data, content_type = make_image(rng, image_kb)
+        image_urls.append(image_store.url_for(image_store.blobs.put(data, content_type)))
+
+    start = datetime(2024, 1, 1)
+    user_docs = [{
+        "_id": ObjectId(),
+        "name": f"bench user {i}",
+        "email": f"bench{i}@example.com",
+        "password": hashed,
+    } for i in range(users)]
+    users_collection.insert_many(user_docs)
+
+    post_ids = []
+    for user in user_docs:
+        posts, thread, reply_docs = [], [], []
+        for _ in range(posts_per_user):
+            post_id = str(ObjectId())
+            timestamp = (start + timedelta(minutes=rng.randrange(500000))).isoformat()
+            paragraphs = "".join(f"<p>{words(rng, 40)}</p>" for _ in range(max(1, words_per_post // 40)))
+            image = rng.choice(image_urls) if image_urls else None
+            posts.append({
+                "postId": post_id,
+                "userId": str(user["_id"]),
+                "title": words(rng, 6).title(),
+                "content": paragraphs,
+                "image": image,
+                "timestamp": timestamp,
+                "author": user["name"],
+                "likes": 0,
+                "dislikes": 0,
+                "views": 0,
+                "commentCount": comments,
+                "version": 1,
+                **summarize_post(paragraphs, image),
+            })
+            posts[-1]["hot"] = hot_score(posts[-1])
+            post_ids.append(post_id)
+            for c in range(comments):
+                comment_id = str(ObjectId())
+                thread.append({
+                    "commentId": comment_id,
+                    "postId": post_id,
+                    "userId": str(user["_id"]),
+                    "commenter": user["name"],
+                    "content": words(rng, 20),
+                    "timestamp": f"{timestamp}.{c:04d}",
+                    "replyCount": replies,
+                })
+                reply_docs.extend({
+                    "replyId": str(ObjectId()),
+                    "commentId": comment_id,
+                    "postId": post_id,
+                    "userId": str(user["_id"]),
+                    "replyCommenter": user["name"],
+                    "replyContent": words(rng, 10),
+                    "timestamp": f"{timestamp}.{c:04d}.{r:04d}",
+                } for r in range(replies))
+        if posts:
+            posts_collection.insert_many(posts)
+        if thread:
+            comments_collection.insert_many(thread)
+        if reply_docs:
+            replies_collection.insert_many(reply_docs)
+    return {"users": len(user_docs), "posts": len(post_ids)}
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--posts-per-user", type=int, default=10)
+    parser.add_argument("--comments", type=int, default=3, help="comments per post")
+    parser.add_argument("--replies", type=int, default=1, help="replies per comment")
+    parser.add_argument("--words", type=int, default=400, help="words per post body")
+    parser.add_argument("--image-kb", type=int, default=0, help="size of post images (0 = none)")
+    parser.add_argument("--images", type=int, default=5, help="distinct images shared by the posts")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+
+def seed_from_args(args):
+    return seed(args.users, args.posts_per_user, args.comments, args.replies,
+                args.words, args.image_kb, args.images, args.seed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a synthetic blog corpus")
+    add_corpus_arguments(parser)
+    parser.add_argument("--mongomock", action="store_true", help="in-memory stand-in (for trying the script)")
+    args = parser.parse_args()
+    if args.mongomock:
+        use_mongomock()
+    print(seed_from_args(args), file=sys.stderr)
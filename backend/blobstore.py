@@ -0,0 +1,186 @@
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import tempfile
+import gridfs
+
+DATA_URL_RE = re.compile(r"^data:(?P<type>[^;,]*)[^,]*;base64,(?P<data>.*)$", re.DOTALL)
+# <img src="data:..."> embedded in post HTML by the rich-text editor
+INLINE_IMAGE_RE = re.compile(r"""(<img\b[^>]*?\bsrc=)(["'])(data:[^"']*)\2""", re.IGNORECASE)
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+# Leading bytes of the image formats accepted for upload
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+class Blob:
+    def __init__(self, fileobj, length, content_type):
+        self.fileobj = fileobj
+        self.length = length
+        self.content_type = content_type
+
+class FilesystemBlobStore:
+    # Blobs live at <root>/<aa>/<bb>/<sha256> with a small JSON sidecar for
+    # the content type. Writes go through a temp file + rename, so readers
+    # never see a partial blob.
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def put(self, data, content_type):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".json", "w") as meta:
+            json.dump({"contentType": content_type}, meta)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return digest
+
+    def open(self, digest):
+        path = self._path(digest)
+        try:
+            fileobj = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            with open(path + ".json") as meta:
+                content_type = json.load(meta).get("contentType")
+        except (OSError, ValueError):
+            content_type = None
+        return Blob(fileobj, os.fstat(fileobj.fileno()).st_size, content_type or "application/octet-stream")
+
+class GridFSBlobStore:
+    # Blobs are GridFS files named by their sha256 in the "blobs" bucket.
+    # `get_db` is called per use so the store follows the process's client.
+    def __init__(self, get_db):
+        self.get_db = get_db
+
+    @property
+    def bucket(self):
+        return gridfs.GridFSBucket(self.get_db(), bucket_name="blobs")
+
+    @property
+    def files(self):
+        return self.get_db()["blobs.files"]
+
+    def exists(self, digest):
+        return self.files.find_one({"filename": digest}, {"_id": 1}) is not None
+
+    def put(self, data, content_type):
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            self.bucket.upload_from_stream(digest, data, metadata={"contentType": content_type})
+        return digest
+
+    def open(self, digest):
+        try:
+            stream = self.bucket.open_download_stream_by_name(digest)
+        except gridfs.errors.NoFile:
+            return None
+        content_type = (stream.metadata or {}).get("contentType") or "application/octet-stream"
+        return Blob(stream, stream.length, content_type)
+
+def make_blob_store(config, get_db):
+    if config.BLOB_STORE == "gridfs":
+        return GridFSBlobStore(get_db)
+    return FilesystemBlobStore(config.BLOB_DIR)
+
+def decode_data_url(value):
+    # Returns (bytes, content type) for a base64 data URL, None for anything else
+    match = DATA_URL_RE.match(value)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(match.group("data"), validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid base64 image data")
+    if not data:
+        raise ValueError("Empty image data")
+    return data, match.group("type") or "application/octet-stream"
+
+def sniff_image_type(data):
+    # The content type named by the data's own header, or None when it is not
+    # an image format we accept
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+class ImageStore:
+    # Turns uploaded images into content-addressed blobs. Documents keep only
+    # the image URL; identical uploads share one blob.
+    def __init__(self, blob_store, base_url, pipeline=None):
+        self.blobs = blob_store
+        self.base_url = base_url.rstrip("/")
+        # Optional imaging.ImagePipeline that renders resized variants
+        self.pipeline = pipeline
+
+    def url_for(self, digest):
+        return f"{self.base_url}/api/images/{digest}"
+
+    def variant_urls(self, url):
+        # {width: URL} for a stored image; the URLs are stable, and fall back
+        # to the original until the pipeline has rendered the variant
+        digest = self.digest_of(url)
+        if not digest or not self.pipeline:
+            return None
+        return {str(width): f"{self.url_for(digest)}/w/{width}" for width in self.pipeline.widths}
+
+    def add_variants(self, doc, field="image"):
+        if doc is not None:
+            variants = self.variant_urls(doc.get(field))
+            if variants:
+                doc[field + "Variants"] = variants
+        return doc
+
+    def digest_of(self, url):
+        if url and url.startswith(self.base_url + "/api/images/"):
+            digest = url.rsplit("/", 1)[-1]
+            if DIGEST_RE.match(digest):
+                return digest
+        return None
+
+    def save(self, value):
+        # Data URLs are decoded and stored; existing URLs (e.g. an unchanged
+        # image sent back by the update form) and empty values pass through
+        if not value or not isinstance(value, str):
+            return value
+        decoded = decode_data_url(value)
+        if decoded is None:
+            return value
+        data, content_type = decoded
+        if not content_type.startswith("image/"):
+            raise ValueError("Only image uploads are supported")
+        # Served with the type its bytes declare, not the one the client sent
+        content_type = sniff_image_type(data)
+        if content_type is None:
+            raise ValueError("Unsupported or corrupt image data")
+        digest = self.blobs.put(data, content_type)
+        if self.pipeline:
+            self.pipeline.submit(digest, data)
+        return self.url_for(digest)
+
+    def save_inline(self, content):
+        # Same treatment for images pasted into the post body
+        if not content or "data:" not in content:
+            return content
+        return INLINE_IMAGE_RE.sub(lambda m: m.group(1) + m.group(2) + self.save(m.group(3)) + m.group(2), content)
@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+class LocalBackend:
+    # In-process stand-in for a shared cache (same get/set/delete surface as
+    # RedisBackend). Values are JSON strings with an absolute expiry.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+class RedisBackend:
+    # Shared across worker processes, so an invalidation in one process is
+    # seen by all of them (their local tier still lags by at most its TTL)
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+def make_backend(url):
+    # "" = local tier only, "local" = in-process stand-in, redis://... = Redis
+    if not url:
+        return None
+    if url == "local":
+        return LocalBackend()
+    return RedisBackend(url)
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # Set when the key is invalidated while the load is running
+        self.stale = False
+
+class Cache:
+    # Read-through LRU with a TTL and an entry/byte budget, in front of an
+    # optional shared backend. Concurrent misses for one key share a single
+    # load; an invalidation during a load keeps its (possibly stale) result
+    # out of the cache.
+    def __init__(self, name, ttl, max_entries, max_bytes, backend=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Also the initial state; a forked child must not inherit a held lock
+        # or loads that are in flight on the parent's threads
+        self.lock = threading.Lock()
+        # key -> (value, size, expires), least recently used first
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.flights = {}
+
+    def _backend_key(self, key):
+        return f"{self.name}:{key}"
+
+    def _lookup(self, key):
+        # Caller holds the lock
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        if item[2] <= time.monotonic():
+            self._drop(key)
+            self.stats["expirations"] += 1
+            return None
+        self.entries.move_to_end(key)
+        return item
+
+    def _drop(self, key):
+        item = self.entries.pop(key, None)
+        if item is not None:
+            self.bytes -= item[1]
+
+    def _store(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        self.entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._drop(oldest)
+            self.stats["evictions"] += 1
+
+    def get_or_load(self, key, loader):
+        # Returns loader()'s value (a JSON-serialisable object); None results
+        # are returned but never cached
+        with self.lock:
+            item = self._lookup(key)
+            if item is not None:
+                self.stats["hits"] += 1
+                return json.loads(item[0])
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return json.loads(flight.value) if flight.value is not None else None
+
+        encoded = None
+        try:
+            if self.backend is not None:
+                encoded = self.backend.get(self._backend_key(key))
+            if encoded is None:
+                value = loader()
+                if value is not None:
+                    encoded = json.dumps(value, default=str)
+                    if self.backend is not None:
+                        self.backend.set(self._backend_key(key), encoded, self.ttl)
+            flight.value = encoded
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                stale = flight.stale
+                if encoded is not None and not stale:
+                    self._store(key, encoded, len(encoded))
+            if stale and self.backend is not None:
+                self.backend.delete(self._backend_key(key))
+            flight.done.set()
+        return json.loads(encoded) if encoded is not None else None
+
+    def invalidate(self, *keys):
+        with self.lock:
+            for key in keys:
+                self._drop(key)
+                if key in self.flights:
+                    self.flights[key].stale = True
+                self.stats["invalidations"] += 1
+        if self.backend is not None and keys:
+            self.backend.delete(*(self._backend_key(key) for key in keys))
+
+    def info(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.bytes)
+
+backend = make_backend(Config.CACHE_URL)
+# Whole post documents (without comments), keyed by postId
+post_cache = Cache(
+    "post", Config.POST_CACHE_SECONDS, Config.CACHE_MAX_ENTRIES, Config.CACHE_MAX_BYTES, backend
+)
+# First page of each post's comment thread, keyed by postId
+comments_cache = Cache(
+    "comments", Config.POST_CACHE_SECONDS, Config.CACHE_MAX_ENTRIES, Config.CACHE_MAX_BYTES, backend
+)
+# {name, profileImage} of a user, keyed by user id
+user_cache = Cache(
+    "user", Config.USER_CACHE_SECONDS, Config.USER_CACHE_MAX_ENTRIES, Config.CACHE_MAX_BYTES, backend
+)
+# The pool of sampled feed cards that requests draw from ("pool") and the
+# top of the hot ranking ("hot")
+feed_cache = Cache(
+    "feed", Config.FEED_CACHE_SECONDS, 2, Config.CACHE_MAX_BYTES, backend
+)
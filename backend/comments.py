@@ -0,0 +1,81 @@
+from collections import Counter
+from pymongo import ReturnDocument, UpdateOne
+from cursors import encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE
+
+# Comments and replies are their own documents. Posts carry commentCount and
+# comments carry replyCount, so threads can be listed a page at a time.
+
+# Threads are listed oldest first, keyset-paginated on (timestamp, <id>).
+# page_query/finish_page are shared with the async server.
+COMMENT_THREAD = ("postId", "commentId")
+REPLY_THREAD = ("commentId", "replyId")
+
+def page_query(thread, parent_id, cursor):
+    parent_field, id_field = thread
+    match = {parent_field: parent_id}
+    if cursor:
+        last_timestamp, last_id = decode_cursor(cursor, str, str)
+        match["$or"] = [
+            {"timestamp": {"$gt": last_timestamp}},
+            {"timestamp": last_timestamp, id_field: {"$gt": last_id}}
+        ]
+    return match, [("timestamp", 1), (id_field, 1)]
+
+def finish_page(thread, docs, limit):
+    id_field = thread[1]
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["timestamp"], docs[-1][id_field])
+    return docs, next_cursor
+
+def _page(collection, thread, parent_id, limit, cursor):
+    match, sort = page_query(thread, parent_id, cursor)
+    docs = list(collection.find(match, {"_id": 0}).sort(sort).limit(limit + 1))
+    return finish_page(thread, docs, limit)
+
+def list_comments(comments_collection, post_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    return _page(comments_collection, COMMENT_THREAD, post_id, limit, cursor)
+
+def list_replies(replies_collection, comment_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    return _page(replies_collection, REPLY_THREAD, comment_id, limit, cursor)
+
+def add_comment(posts_collection, comments_collection, post_id, comment):
+    # Bumps the post's counter first, which doubles as the existence check.
+    # Returns the new commentCount, or None if the post does not exist.
+    post = posts_collection.find_one_and_update(
+        {"postId": post_id},
+        {"$inc": {"commentCount": 1, "version": 1}},
+        projection={"_id": 0, "commentCount": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if post is None:
+        return None
+    comments_collection.insert_one(dict(comment, postId=post_id, replyCount=0))
+    return post["commentCount"]
+
+def add_comments(posts_collection, comments_collection, new_comments):
+    # add_comment for a list of (postId, comment) on posts already known to
+    # exist: one insert_many and one bulk $inc however many comments
+    if not new_comments:
+        return
+    comments_collection.insert_many([dict(comment, postId=post_id, replyCount=0) for post_id, comment in new_comments])
+    per_post = Counter(post_id for post_id, _ in new_comments)
+    posts_collection.bulk_write([
+        UpdateOne({"postId": post_id}, {"$inc": {"commentCount": n, "version": 1}})
+        for post_id, n in per_post.items()
+    ], ordered=False)
+
+def add_reply(comments_collection, replies_collection, post_id, comment_id, reply):
+    # Returns the comment's new replyCount, or None if there is no such
+    # comment on this post
+    comment = comments_collection.find_one_and_update(
+        {"commentId": comment_id, "postId": post_id},
+        {"$inc": {"replyCount": 1}},
+        projection={"_id": 0, "replyCount": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if comment is None:
+        return None
+    replies_collection.insert_one(dict(reply, postId=post_id, commentId=comment_id))
+    return comment["replyCount"]
@@ -5,3 +5,117 @@ load_dotenv()
 
 class Config:
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+    # Rebuild the in-process search index this often (0 = only on first use);
+    # needed when several worker processes accept writes
+    SEARCH_REFRESH_SECONDS = int(os.getenv("SEARCH_REFRESH_SECONDS", "0"))
+    # "exact" keeps one record per (post, reader); "approximate" keeps a
+    # fixed-size HyperLogLog sketch per post instead
+    VIEW_COUNTING = os.getenv("VIEW_COUNTING", "exact")
+    # Write-behind buffering of view/like counters: flushed every
+    # COUNTER_FLUSH_SECONDS or once COUNTER_FLUSH_SIZE updates are pending
+    COUNTER_BUFFER = os.getenv("COUNTER_BUFFER", "1") == "1"
+    COUNTER_FLUSH_SECONDS = float(os.getenv("COUNTER_FLUSH_SECONDS", "5"))
+    COUNTER_FLUSH_SIZE = int(os.getenv("COUNTER_FLUSH_SIZE", "1000"))
+    # Uploaded images: "filesystem" (under BLOB_DIR) or "gridfs"
+    BLOB_STORE = os.getenv("BLOB_STORE", "filesystem")
+    BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "blobs"))
+    # Base of the image URLs handed to clients
+    PUBLIC_URL = os.getenv("PUBLIC_URL", "http://localhost:5000")
+    # Resized WebP variants rendered for every uploaded image, and the size
+    # of the process pool that renders them
+    IMAGE_VARIANT_WIDTHS = [int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",")]
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+    # A render still pending after this long is presumed lost (its worker
+    # died) and the next upload of the image renders it again
+    IMAGE_CLAIM_SECONDS = int(os.getenv("IMAGE_CLAIM_SECONDS", "300"))
+    # Read-through caches for posts and the feed. CACHE_URL adds a shared
+    # tier: "" = none, "local" = in-process stand-in, or a redis:// URL
+    CACHE_URL = os.getenv("CACHE_URL", "")
+    POST_CACHE_SECONDS = float(os.getenv("POST_CACHE_SECONDS", "60"))
+    FEED_CACHE_SECONDS = float(os.getenv("FEED_CACHE_SECONDS", "15"))
+    FEED_POOL_SIZE = int(os.getenv("FEED_POOL_SIZE", "50"))
+    # Hot feed: the top HOT_FEED_SIZE posts by score, where a post
+    # HOT_DECAY_HOURS newer outranks one with 10x the engagement
+    HOT_FEED_SIZE = int(os.getenv("HOT_FEED_SIZE", "100"))
+    HOT_DECAY_HOURS = float(os.getenv("HOT_DECAY_HOURS", "12"))
+    # Most operations (and most posts fetched) in one /api/batch request
+    BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "50"))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    # JSON/text responses at least this large are gzip/brotli compressed
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+    # bcrypt work factor: a number, or "auto" to benchmark the highest cost
+    # that hashes within BCRYPT_TARGET_MS at startup. Hashes stored at another
+    # cost are upgraded on the next successful login.
+    BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS", "12")
+    BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", "250"))
+    # Hashing threads, and how many hashes may run or wait before 429
+    PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+    PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "16"))
+    # Signs session tokens; must be the same in every worker process and
+    # stable across restarts. The app refuses to start without it outside
+    # debug mode. Generate one with: python -c "import secrets; print(secrets.token_hex(32))"
+    SECRET_KEY = os.getenv("SECRET_KEY", "")
+    SESSION_HOURS = float(os.getenv("SESSION_HOURS", "168"))
+    # Reject writes without a session token instead of trusting a userId in
+    # the request (on once every client sends tokens)
+    REQUIRE_SESSION_TOKEN = os.getenv("REQUIRE_SESSION_TOKEN", "0") == "1"
+    # Name/avatar snippets of users acting without a token (or needing more
+    # than their token carries)
+    USER_CACHE_SECONDS = float(os.getenv("USER_CACHE_SECONDS", "300"))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "5000"))
+    # Background jobs (jobs.py): a worker thread in each app process unless
+    # JOB_WORKER=0, in which case run `flask --app app jobs work` separately.
+    # A claimed job is re-offered if its worker goes JOB_LEASE_SECONDS
+    # without reporting progress.
+    JOB_WORKER = os.getenv("JOB_WORKER", "1") == "1"
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "500"))
+    # Live post updates over server-sent events. EVENTS_URL carries events
+    # between worker processes: "" = none (a stream only sees writes handled
+    # by its own process), "local" = in-process stand-in, or a redis:// URL.
+    # A stream EVENTS_MAX_PENDING events behind is dropped and told to resync.
+    # Under WSGI each stream holds a worker thread for as long as the page is
+    # open, so it needs a threaded or async worker class (never gunicorn's
+    # sync workers) and is capped at EVENTS_MAX_STREAMS per process (0 = no
+    # cap); asgi_app.py serves streams on its event loop without the cap.
+    EVENTS_URL = os.getenv("EVENTS_URL", "")
+    EVENTS_MAX_PENDING = int(os.getenv("EVENTS_MAX_PENDING", "100"))
+    EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", "50"))
+    EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+    # Browser origin of the React frontend
+    FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
+    # Connection pool of the async driver used by asgi_app.py; one pool per
+    # worker process is shared by every in-flight request
+    ASYNC_MONGO_POOL_SIZE = int(os.getenv("ASYNC_MONGO_POOL_SIZE", "100"))
+    # MongoClient pool and timeouts (one client per process, opened lazily)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    # How long a request waits for a free pooled connection before failing
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    # 0 = no socket timeout
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+    # Wire compression, e.g. "zstd,zlib" (zstd/snappy need their packages)
+    MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+    # Read preference of the read-only listing routes (profile lists, search,
+    # later comment/reply pages); writes and cache fills always use the
+    # primary. Anything but "primary", e.g. "secondaryPreferred", offloads
+    # those reads at the cost of read-your-writes: a user may briefly not see
+    # their own new post or comment.
+    MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+    # Create the indexes in indexes.py when the app starts (otherwise:
+    # flask --app app indexes apply), and refuse to start if a route's
+    # canonical query would scan a collection (flask --app app indexes check)
+    ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "1") == "1"
+    CHECK_QUERY_PLANS = os.getenv("CHECK_QUERY_PLANS", "0") == "1"
+    # Per-route latency/size histograms and Mongo command timings at /metrics
+    METRICS = os.getenv("METRICS", "1") == "1"
+    # Log requests slower than this (with query shapes and the DB vs
+    # serialization split) to the "slow_requests" logger; 0 = off
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
@@ -0,0 +1,211 @@
+"""Export the blog corpus to NDJSON files and import it back.
+
+  python corpus.py export DIR [--gzip] [--only users,posts]
+  python corpus.py import DIR [--batch-size 1000] [--workers 4] [--restart]
+
+An export directory holds one <collection>.ndjson (or .ndjson.gz) file per
+collection, one document per line in MongoDB extended JSON so ObjectIds and
+dates survive the round trip, plus images.ndjson with every image a user or
+post refers to (base64, keyed by its sha256 digest) and a manifest.json.
+Both directions stream: documents are read from a cursor or a file and
+written one batch at a time, so memory stays flat however large the corpus.
+
+Import replaces documents by _id with batched bulk_write upserts spread over
+--workers threads, so importing the same export twice is safe. Progress is
+checkpointed per file in the migrations collection after every batch that
+has landed, and an interrupted import picks up from there. Imported images
+are handed to the variant pipeline again. Restart the app (or wait for the
+cache TTLs) after importing into a live database.
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from bson import ObjectId, json_util
+from pymongo import ReplaceOne
+from models import (users_collection, posts_collection, comments_collection, replies_collection,
+                    reactions_collection, views_collection, view_sketches_collection, image_store)
+from indexes import apply_indexes
+from migrate_posts import load_checkpoint, save_checkpoint
+
+COLLECTIONS = {
+    "users": users_collection,
+    "posts": posts_collection,
+    "comments": comments_collection,
+    "replies": replies_collection,
+    "reactions": reactions_collection,
+    "views": views_collection,
+    "view_sketches": view_sketches_collection,
+}
+IMAGES = "images"
+# Image references in profile images, cover images and post bodies
+IMAGE_URL_RE = re.compile(r"/api/images/([0-9a-f]{64})")
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+def open_text(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def export_collection(collection, path, batch_size):
+    count = 0
+    with open_text(path, "w") as f:
+        for doc in collection.find({}).sort("_id", 1).batch_size(batch_size):
+            f.write(json_util.dumps(doc, json_options=JSON_OPTIONS) + "\n")
+            count += 1
+    return count
+
+def referenced_images():
+    # Digests of stored images, each once. Only the digests are remembered.
+    seen = set()
+    sources = [
+        (users_collection, {"profileImage": {"$regex": "/api/images/"}}, ["profileImage"]),
+        (posts_collection, {"$or": [
+            {"image": {"$regex": "/api/images/"}},
+            {"content": {"$regex": "/api/images/"}}
+        ]}, ["image", "content"]),
+    ]
+    for collection, query, fields in sources:
+        for doc in collection.find(query, {field: 1 for field in fields}):
+            for field in fields:
+                for digest in IMAGE_URL_RE.findall(doc.get(field) or ""):
+                    if digest not in seen:
+                        seen.add(digest)
+                        yield digest
+
+def export_images(path):
+    count = 0
+    with open_text(path, "w") as f:
+        for digest in referenced_images():
+            blob = image_store.blobs.open(digest)
+            if blob is None:
+                print(f"image {digest} is referenced but missing from the blob store")
+                continue
+            with blob.fileobj:
+                data = blob.fileobj.read()
+            f.write(json.dumps({
+                "digest": digest,
+                "contentType": blob.content_type,
+                "data": base64.b64encode(data).decode("ascii")
+            }) + "\n")
+            count += 1
+    return count
+
+def export_corpus(directory, names, compress, batch_size):
+    os.makedirs(directory, exist_ok=True)
+    suffix = ".ndjson.gz" if compress else ".ndjson"
+    files = {}
+    for name in names:
+        path = os.path.join(directory, name + suffix)
+        if name == IMAGES:
+            count = export_images(path)
+        else:
+            count = export_collection(COLLECTIONS[name], path, batch_size)
+        files[name] = {"file": name + suffix, "count": count}
+        print(f"exported {count} {name}")
+    manifest = {
+        # Import checkpoints are keyed by this, so resuming never mixes exports
+        "exportId": str(ObjectId()),
+        "exportedAt": datetime.utcnow().isoformat(),
+        "files": files
+    }
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"export finished: {directory}")
+
+def write_documents(collection, lines):
+    docs = [json_util.loads(line, json_options=JSON_OPTIONS) for line in lines]
+    collection.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+
+def write_images(lines):
+    for line in lines:
+        image = json.loads(line)
+        data = base64.b64decode(image["data"])
+        digest = image_store.blobs.put(data, image["contentType"])
+        if digest != image["digest"]:
+            raise ValueError(f"image {image['digest']} does not match its content")
+        if image_store.pipeline:
+            image_store.pipeline.submit(digest, data)
+
+def read_batches(path, batch_size, skip):
+    # (line number after the batch, lines) for every batch past `skip` lines
+    batch = []
+    with open_text(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            if number <= skip or not line.strip():
+                continue
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield number, batch
+                batch = []
+        if batch:
+            yield number, batch
+
+def import_file(name, path, checkpoint, batch_size, workers, restart):
+    done_lines = load_checkpoint(checkpoint, restart) or 0
+    write = write_images if name == IMAGES else (lambda lines: write_documents(COLLECTIONS[name], lines))
+    total = 0
+    # Batches in file order; the oldest is awaited before the checkpoint
+    # moves, so a saved checkpoint never skips a batch that has not landed.
+    # At most 2 * workers batches are held in memory.
+    pending = deque()
+
+    def settle():
+        nonlocal total
+        end_line, size, future = pending.popleft()
+        future.result()
+        total += size
+        save_checkpoint(checkpoint, end_line, size)
+        return end_line
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for end_line, lines in read_batches(path, batch_size, done_lines):
+            pending.append((end_line, len(lines), pool.submit(write, lines)))
+            if len(pending) >= 2 * workers:
+                line = settle()
+                print(f"imported {total} {name} (line {line})")
+        while pending:
+            settle()
+    print(f"imported {total} {name}" + (f" (resumed after line {done_lines})" if done_lines else ""))
+
+def import_corpus(directory, names, batch_size, workers, restart):
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+    apply_indexes()
+    # Images first, so no imported document points at a missing blob
+    order = [IMAGES] + list(COLLECTIONS)
+    for name in order:
+        entry = manifest["files"].get(name)
+        if entry is None or (names and name not in names):
+            continue
+        checkpoint = f"import-{manifest['exportId']}-{name}"
+        import_file(name, os.path.join(directory, entry["file"]), checkpoint, batch_size, workers, restart)
+    if image_store.pipeline:
+        # Let queued variant renders finish before exiting
+        image_store.pipeline.shutdown()
+    print("import finished")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import the blog corpus as NDJSON")
+    parser.add_argument("direction", choices=["export", "import"])
+    parser.add_argument("directory")
+    parser.add_argument("--only", help="comma-separated subset of: " + ", ".join(list(COLLECTIONS) + [IMAGES]))
+    parser.add_argument("--gzip", action="store_true", help="compress exported files")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per cursor batch or bulk_write")
+    parser.add_argument("--workers", type=int, default=4, help="parallel bulk_write threads on import")
+    parser.add_argument("--restart", action="store_true", help="ignore saved import checkpoints")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()] if args.only else []
+    unknown = [n for n in names if n not in COLLECTIONS and n != IMAGES]
+    if unknown:
+        parser.error("unknown collections: " + ", ".join(unknown))
+    if args.direction == "export":
+        export_corpus(args.directory, names or list(COLLECTIONS) + [IMAGES], args.gzip, args.batch_size)
+    else:
+        import_corpus(args.directory, names, args.batch_size, args.workers, args.restart)
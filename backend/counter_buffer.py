@@ -0,0 +1,211 @@
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import Config
+from models import posts_collection, views_collection, view_sketches_collection
+from cache import post_cache
+from views import hll_position, hll_estimate, legacy_views
+from hot import refresh_hot
+from events import post_events
+
+logger = logging.getLogger(__name__)
+
+class CounterBuffer:
+    # Write-behind buffer for view and reaction counters. Requests only touch
+    # in-process dicts; a background thread folds everything collected in a
+    # window into a few bulk_write calls. Counters may lag by one window.
+    def __init__(self, posts_collection, views_collection, sketches_collection,
+                 flush_interval=5.0, flush_size=1000, view_mode="exact", on_flush=None):
+        self.posts_collection = posts_collection
+        self.views_collection = views_collection
+        self.sketches_collection = sketches_collection
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.view_mode = view_mode
+        # Called with the postIds whose counters a flush changed
+        self.on_flush = on_flush
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Also the initial state. A forked child starts empty (the parent
+        # flushes what it buffered) and starts its own flush thread on first use.
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self._reset()
+
+    def _reset(self):
+        # postId -> {counter field: delta}
+        self.deltas = {}
+        # (postId, userId) pairs seen this window, deduped before they hit Mongo
+        self.views = {}
+        # postId -> {register index: rank} for approximate view counting
+        self.registers = {}
+        self.size = 0
+
+    def _bump(self):
+        self.size += 1
+        if self.size >= self.flush_size:
+            self.wakeup.set()
+
+    def add_delta(self, post_id, field, amount):
+        self.start()
+        with self.lock:
+            counters = self.deltas.setdefault(post_id, {})
+            counters[field] = counters.get(field, 0) + amount
+            self._bump()
+
+    def add_view(self, post_id, user_id):
+        # False when this reader was already seen in the current window
+        self.start()
+        with self.lock:
+            if self.view_mode == "approximate":
+                index, rank = hll_position(user_id)
+                registers = self.registers.setdefault(post_id, {})
+                if registers.get(index, 0) >= rank:
+                    return False
+                registers[index] = rank
+            else:
+                key = (post_id, user_id)
+                if key in self.views:
+                    return False
+                self.views[key] = datetime.utcnow().isoformat()
+            self._bump()
+            return True
+
+    def pending(self, post_id):
+        with self.lock:
+            return dict(self.deltas.get(post_id, {}))
+
+    def start(self):
+        # Idempotent; called lazily so no thread exists before a fork
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="counter-buffer", daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        # Drain whatever is buffered before the process exits
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=30)
+        self.flush()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            if self.stopping.is_set():
+                break
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Counter flush failed")
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                deltas, views, registers = self.deltas, self.views, self.registers
+                self._reset()
+            if not (deltas or views or registers):
+                return
+            try:
+                self._write(deltas, views, registers)
+            except PyMongoError:
+                # Put the window back so the next flush retries it
+                with self.lock:
+                    self._merge(deltas, views, registers)
+                raise
+            if self.on_flush:
+                self.on_flush(set(deltas) | {post_id for post_id, _ in views} | set(registers))
+
+    def _merge(self, deltas, views, registers):
+        for post_id, counters in deltas.items():
+            current = self.deltas.setdefault(post_id, {})
+            for field, amount in counters.items():
+                current[field] = current.get(field, 0) + amount
+        for key, timestamp in views.items():
+            self.views.setdefault(key, timestamp)
+        for post_id, regs in registers.items():
+            current = self.registers.setdefault(post_id, {})
+            for index, rank in regs.items():
+                current[index] = max(current.get(index, 0), rank)
+        self.size += len(deltas) + len(views) + len(registers)
+
+    def _write(self, deltas, views, registers):
+        touched = {post_id for post_id, _ in views} | set(registers)
+        if touched:
+            # One lookup per window instead of one per view: drop views of
+            # posts that do not exist (anymore)
+            existing = {
+                p["postId"] for p in self.posts_collection.find({"postId": {"$in": list(touched)}}, {"_id": 0, "postId": 1})
+            }
+            views = {key: ts for key, ts in views.items() if key[0] in existing}
+            registers = {post_id: regs for post_id, regs in registers.items() if post_id in existing}
+
+        if views:
+            keys = list(views)
+            ops = [
+                UpdateOne({"postId": post_id, "userId": user_id}, {"$setOnInsert": {"timestamp": views[(post_id, user_id)]}}, upsert=True)
+                for post_id, user_id in keys
+            ]
+            try:
+                upserted = self.views_collection.bulk_write(ops, ordered=False).upserted_ids
+            except BulkWriteError as e:
+                # Duplicate-key races with another process: count only our inserts
+                upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+            first = [keys[index] for index in upserted]
+            legacy = legacy_views(self.posts_collection, first)
+            for post_id, user_id in first:
+                if (post_id, user_id) not in legacy:
+                    counters = deltas.setdefault(post_id, {})
+                    counters["views"] = counters.get("views", 0) + 1
+
+        if registers:
+            self.sketches_collection.bulk_write([
+                UpdateOne({"postId": post_id}, {"$max": {f"registers.{i}": rank for i, rank in regs.items()}}, upsert=True)
+                for post_id, regs in registers.items()
+            ], ordered=False)
+            estimates = [
+                UpdateOne({"postId": sketch["postId"]}, {"$set": {"views": hll_estimate(sketch.get("registers", {}))}, "$inc": {"version": 1}})
+                for sketch in self.sketches_collection.find({"postId": {"$in": list(registers)}}, {"_id": 0})
+            ]
+            if estimates:
+                self.posts_collection.bulk_write(estimates, ordered=False)
+
+        ops = [
+            UpdateOne({"postId": post_id}, {"$inc": dict(counters, version=1)})
+            for post_id, counters in deltas.items()
+            if any(counters.values())
+        ]
+        if ops:
+            self.posts_collection.bulk_write(ops, ordered=False)
+
+def after_flush(post_ids):
+    post_cache.invalidate(*post_ids)
+    # One batched score refresh per window instead of one per event; the
+    # counters it reads go out to the posts' live streams
+    post_events.publish_counters(refresh_hot(posts_collection, post_ids))
+
+counter_buffer = None
+if Config.COUNTER_BUFFER:
+    counter_buffer = CounterBuffer(
+        posts_collection, views_collection, view_sketches_collection,
+        flush_interval=Config.COUNTER_FLUSH_SECONDS,
+        flush_size=Config.COUNTER_FLUSH_SIZE,
+        view_mode=Config.VIEW_COUNTING,
+        on_flush=after_flush
+    )
@@ -0,0 +1,38 @@
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value is None:
+        return default
+    try:
+        return max(1, min(int(value), maximum))
+    except ValueError:
+        raise ValueError("Invalid limit")
+
+# Opaque keyset cursors: the sort key of the last item on a page, encoded so
+# clients pass it back verbatim
+
+def encode_cursor(*values):
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+# Cursor element types for decode_cursor
+NUMBER = (int, float)
+
+def decode_cursor(cursor, *types):
+    # One expected type per value. Values land in query filters, so anything
+    # else (a crafted {"$ne": null}, say) is rejected rather than becoming an
+    # operator.
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    for value, expected in zip(values, types):
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("Invalid cursor")
+    return values
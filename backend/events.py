@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class LocalBroker:
+    # In-process stand-in for a shared broker (same publish/listen surface as
+    # RedisBroker). Messages are delivered synchronously to every listener.
+    def __init__(self):
+        self.listeners = []
+
+    def publish(self, post_id, frame):
+        for listener in list(self.listeners):
+            listener(post_id, frame)
+
+    def listen(self, listener):
+        self.listeners.append(listener)
+
+class RedisBroker:
+    # Redis pub/sub, so an event published in one worker process reaches the
+    # streams held open by every other one
+    PREFIX = "post-events:"
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, post_id, frame):
+        self.client.publish(self.PREFIX + post_id, frame)
+
+    def listen(self, listener):
+        def handle(message):
+            channel, data = message["channel"].decode("utf-8"), message["data"].decode("utf-8")
+            listener(channel[len(self.PREFIX):], data)
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(**{self.PREFIX + "*": handle})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+def make_broker(url):
+    # "" = this process only, "local" = in-process stand-in, redis://... = Redis
+    if not url:
+        return None
+    if url == "local":
+        return LocalBroker()
+    return RedisBroker(url)
+
+def sse_frame(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+class Subscription:
+    def __init__(self, post_id, max_pending, loop=None):
+        self.post_id = post_id
+        self.frames = queue.Queue(max_pending)
+        # Set when the subscriber fell behind and was dropped; it has missed
+        # events and must resync
+        self.evicted = False
+        # A stream served on an asyncio loop waits on `ready`, which the
+        # publishing thread sets through the loop
+        self.loop = loop
+        self.ready = asyncio.Event() if loop is not None else None
+
+    def offer(self, frame):
+        # Raises queue.Full when the subscriber is max_pending frames behind
+        self.frames.put_nowait(frame)
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.ready.set)
+            except RuntimeError:
+                # The loop has shut down; nobody is waiting any more
+                pass
+
+    def next(self, timeout):
+        # The next SSE frame, or None after `timeout` seconds without one
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def next_async(self, timeout):
+        # next() for a subscription made with a loop, without blocking it
+        while True:
+            self.ready.clear()
+            try:
+                return self.frames.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+class EventBus:
+    # Fans a post's events out to the streams open on it. Every subscriber
+    # has a buffer of max_pending frames; one that falls that far behind is
+    # evicted instead of growing its backlog or blocking the publisher. Each
+    # frame is encoded once however many subscribers receive it. With a
+    # broker, events go through it so streams in every process see them.
+    def __init__(self, broker=None, max_pending=100, max_streams=None):
+        self.broker = broker
+        self.max_pending = max_pending
+        # Cap on the blocking streams (subscribed without a loop) open in
+        # this process; None = no cap
+        self.max_streams = max_streams
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked child has no streams and starts its own broker listener
+        # on first use
+        self.lock = threading.Lock()
+        # postId -> set of Subscriptions
+        self.subscribers = {}
+        self.listening = False
+        self.blocking = 0
+        self.stats = {"published": 0, "delivered": 0, "evicted": 0, "refused": 0}
+
+    def subscribe(self, post_id, loop=None):
+        # Pass the running loop for a stream served by async code. Returns
+        # None when max_streams blocking streams are already open.
+        subscription = Subscription(post_id, self.max_pending, loop)
+        with self.lock:
+            if loop is None:
+                if self.max_streams is not None and self.blocking >= self.max_streams:
+                    self.stats["refused"] += 1
+                    return None
+                self.blocking += 1
+            if self.broker is not None and not self.listening:
+                self.broker.listen(self._deliver)
+                self.listening = True
+            self.subscribers.setdefault(post_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.post_id)
+            if subscribers is None or subscription not in subscribers:
+                # Already dropped (evicted, then closed by its stream)
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.post_id]
+            if subscription.loop is None:
+                self.blocking -= 1
+
+    def publish(self, post_id, kind, data):
+        if self.broker is None:
+            # Nothing to encode when no stream is open on the post
+            if post_id not in self.subscribers:
+                return
+            self._deliver(post_id, sse_frame(kind, data))
+        else:
+            try:
+                self.broker.publish(post_id, sse_frame(kind, data))
+            except Exception:
+                # Live updates are best effort; the write itself succeeded
+                logger.exception("Publishing %s for post %s failed", kind, post_id)
+                return
+        with self.lock:
+            self.stats["published"] += 1
+
+    def publish_counters(self, docs):
+        # A counters event per post from documents holding its counters
+        for doc in docs:
+            self.publish(doc["postId"], "counters", {
+                field: doc.get(field) or 0 for field in ("views", "likes", "dislikes", "commentCount")
+            })
+
+    def _deliver(self, post_id, frame):
+        with self.lock:
+            subscribers = list(self.subscribers.get(post_id, ()))
+        evicted = []
+        for subscription in subscribers:
+            try:
+                subscription.offer(frame)
+            except queue.Full:
+                subscription.evicted = True
+                evicted.append(subscription)
+        for subscription in evicted:
+            self.unsubscribe(subscription)
+        with self.lock:
+            self.stats["delivered"] += len(subscribers) - len(evicted)
+            self.stats["evicted"] += len(evicted)
+
+    def info(self):
+        with self.lock:
+            return dict(self.stats, streams=sum(len(s) for s in self.subscribers.values()))
+
+# comment-added, reply-added and counters events, keyed by postId
+post_events = EventBus(make_broker(Config.EVENTS_URL), max_pending=Config.EVENTS_MAX_PENDING,
+                       max_streams=Config.EVENTS_MAX_STREAMS or None)
@@ -0,0 +1,165 @@
+import re
+from cursors import encode_cursor, decode_cursor, NUMBER, DEFAULT_PAGE_SIZE
+from html_text import html_to_text, make_excerpt
+
+FEED_SIZE = 10
+# Only this much of the HTML body leaves the database to build an excerpt
+# for a post written before summaries were stored
+EXCERPT_SOURCE_CHARS = 600
+WORDS_PER_MINUTE = 200
+# First <img src="..."> in a post body
+FIRST_IMAGE_RE = re.compile(r"""<img\b[^>]*?\bsrc=(["'])([^"']+)\1""", re.IGNORECASE)
+
+# Fields a feed card renders; everything else stays in the database
+CARD_PROJECTION = {
+    "_id": 0,
+    "postId": 1,
+    "title": 1,
+    "author": 1,
+    "timestamp": 1,
+    "image": 1,
+    "likes": {"$ifNull": ["$likes", 0]},
+    "dislikes": {"$ifNull": ["$dislikes", 0]},
+    "views": {"$ifNull": ["$views", 0]},
+    "commentCount": {"$ifNull": ["$commentCount", 0]},
+    "excerpt": 1,
+    "wordCount": 1,
+    "readingTime": 1,
+    "thumbnail": 1,
+    # Empty once the post has a stored excerpt
+    "contentHead": {"$substrCP": [
+        {"$cond": [{"$ifNull": ["$excerpt", False]}, "", {"$ifNull": ["$content", ""]}]}, 0, EXCERPT_SOURCE_CHARS
+    ]}
+}
+
+# Fields callers may pick with ?fields= on listing endpoints
+SUMMARY_FIELDS = ["postId", "title", "author", "timestamp", "image", "likes", "dislikes", "views", "commentCount",
+                  "excerpt", "wordCount", "readingTime", "thumbnail"]
+
+def summarize_post(content, image=None):
+    # Derived once when a post is written and stored with it, so listings
+    # never ship or parse the HTML body
+    text = html_to_text(content)
+    word_count = len(text.split())
+    thumbnail = image or None
+    if not thumbnail:
+        match = FIRST_IMAGE_RE.search(content or "")
+        if match and not match.group(2).startswith("data:"):
+            thumbnail = match.group(2)
+    return {
+        "excerpt": make_excerpt(text),
+        "wordCount": word_count,
+        "readingTime": max(1, round(word_count / WORDS_PER_MINUTE)),
+        "thumbnail": thumbnail
+    }
+
+def to_card(doc):
+    head = doc.pop("contentHead", None)
+    if not doc.get("excerpt") and head is not None:
+        doc["excerpt"] = make_excerpt(html_to_text(head))
+    return doc
+
+def parse_fields(value):
+    # "title,image" -> projection restricted to those summary fields; the
+    # postId is always included so clients can link and paginate
+    if not value:
+        return CARD_PROJECTION
+    requested = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in SUMMARY_FIELDS]
+    if unknown:
+        raise ValueError("Unknown fields: " + ", ".join(unknown))
+    projection = {"_id": 0, "postId": 1}
+    for field in requested:
+        projection[field] = CARD_PROJECTION[field]
+        if field == "excerpt":
+            projection["contentHead"] = CARD_PROJECTION["contentHead"]
+    return projection
+
+# The pipelines are built separately from running them so the async
+# server (asgi_app.py) shares them with the blocking driver
+
+def sample_pipeline(size=FEED_SIZE, match=None):
+    # $sample picks documents inside the database, so only `size` projected
+    # cards are ever transferred regardless of corpus size
+    pipeline = [
+        {"$sample": {"size": size}},
+        {"$project": CARD_PROJECTION}
+    ]
+    if match:
+        pipeline.insert(0, {"$match": match})
+    return pipeline
+
+def sample_posts(collection, size=FEED_SIZE, match=None):
+    return [to_card(doc) for doc in collection.aggregate(sample_pipeline(size, match))]
+
+def cards_pipeline(post_ids):
+    return [
+        {"$match": {"postId": {"$in": post_ids}}},
+        {"$project": CARD_PROJECTION}
+    ]
+
+def order_cards(docs, post_ids):
+    # Cards in the order of post_ids, skipping ids that no longer exist
+    by_id = {doc["postId"]: to_card(doc) for doc in docs}
+    return [by_id[post_id] for post_id in post_ids if post_id in by_id]
+
+def fetch_cards(collection, post_ids):
+    if not post_ids:
+        return []
+    return order_cards(collection.aggregate(cards_pipeline(post_ids)), post_ids)
+
+def hot_pipeline(size):
+    # The top of the (hot, postId) index; the whole list is cached and pages
+    # are cut from it, so serving a page never touches the database
+    return [
+        {"$sort": {"hot": -1, "postId": -1}},
+        {"$limit": size},
+        {"$project": dict(CARD_PROJECTION, hot=1)}
+    ]
+
+def top_posts(collection, size):
+    return [to_card(doc) for doc in collection.aggregate(hot_pipeline(size))]
+
+def hot_page(cards, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    # Keyset on (hot, postId), so a page boundary stays put when the cached
+    # list is refreshed between requests
+    start = 0
+    if cursor:
+        last_hot, last_id = decode_cursor(cursor, NUMBER, str)
+        while start < len(cards) and (cards[start].get("hot", 0), cards[start]["postId"]) >= (last_hot, last_id):
+            start += 1
+    page = cards[start:start + limit]
+    next_cursor = None
+    if start + limit < len(cards):
+        next_cursor = encode_cursor(page[-1].get("hot", 0), page[-1]["postId"])
+    return page, next_cursor
+
+def user_posts_pipeline(user_id, limit=DEFAULT_PAGE_SIZE, cursor=None, projection=CARD_PROJECTION):
+    # Newest first, keyset-paginated on (timestamp, postId) so every page is
+    # an index range scan on (userId, timestamp, postId)
+    match = {"userId": user_id}
+    if cursor:
+        last_timestamp, last_id = decode_cursor(cursor, str, str)
+        match["$or"] = [
+            {"timestamp": {"$lt": last_timestamp}},
+            {"timestamp": last_timestamp, "postId": {"$lt": last_id}}
+        ]
+    projection = dict(projection, timestamp=1, postId=1)
+    return [
+        {"$match": match},
+        {"$sort": {"timestamp": -1, "postId": -1}},
+        {"$limit": limit + 1},
+        {"$project": projection}
+    ]
+
+def user_posts_page(docs, limit):
+    # `docs` holds up to limit + 1 results; the extra one only signals a next page
+    docs = [to_card(doc) for doc in docs]
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["timestamp"], docs[-1]["postId"])
+    return docs, next_cursor
+
+def list_user_posts(collection, user_id, limit=DEFAULT_PAGE_SIZE, cursor=None, projection=CARD_PROJECTION):
+    return user_posts_page(collection.aggregate(user_posts_pipeline(user_id, limit, cursor, projection)), limit)
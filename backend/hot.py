@@ -0,0 +1,44 @@
+import math
+from datetime import datetime
+from pymongo import UpdateOne
+from config import Config
+
+# How much each counter contributes to a post's engagement
+WEIGHTS = {
+    "likes": 1.0,
+    "dislikes": -1.0,
+    "commentCount": 2.0,
+    "views": 0.1,
+}
+EPOCH = datetime(2024, 1, 1)
+DECAY_SECONDS = Config.HOT_DECAY_HOURS * 3600
+
+# hot = log10(1 + engagement) + age term. The age term grows with the post's
+# creation time, so a post DECAY_SECONDS newer outranks one with 10x the
+# engagement. Scores never need recomputing as time passes: a post's score
+# changes only when its own counters do, and newer posts simply start higher.
+
+def hot_score(doc):
+    engagement = sum(weight * (doc.get(field) or 0) for field, weight in WEIGHTS.items())
+    try:
+        created = datetime.fromisoformat(doc.get("timestamp") or "")
+    except ValueError:
+        created = EPOCH
+    return round(math.log10(1 + max(engagement, 0.0)) + (created - EPOCH).total_seconds() / DECAY_SECONDS, 6)
+
+HOT_PROJECTION = {"_id": 0, "postId": 1, "timestamp": 1, **{field: 1 for field in WEIGHTS}}
+
+def refresh_hot(posts_collection, post_ids):
+    # Recompute the score of just the posts whose counters moved: one read
+    # and one bulk write however many posts changed. Two refreshes racing on
+    # one post may leave the older score behind until its next event.
+    # Returns the documents read, which hold the posts' current counters.
+    post_ids = list(post_ids)
+    if not post_ids:
+        return []
+    docs = list(posts_collection.find({"postId": {"$in": post_ids}}, HOT_PROJECTION))
+    if docs:
+        posts_collection.bulk_write([
+            UpdateOne({"postId": doc["postId"]}, {"$set": {"hot": hot_score(doc)}}) for doc in docs
+        ], ordered=False)
+    return docs
@@ -0,0 +1,51 @@
+from html.parser import HTMLParser
+import html
+
+# Tags whose text is never shown to readers
+SKIPPED_TAGS = {"script", "style"}
+# Tags that separate words even when there is no whitespace around them
+BLOCK_TAGS = {"p", "div", "br", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "tr", "td"}
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+def html_to_text(content):
+    if not content:
+        return ""
+    # Drop a tag left dangling by truncation, e.g. half of an <img src="data:...">
+    last_open = content.rfind("<")
+    if last_open > content.rfind(">"):
+        content = content[:last_open]
+    parser = _TextExtractor()
+    try:
+        parser.feed(content)
+        parser.close()
+    except Exception:
+        # Fall back to the raw string for markup the parser chokes on
+        return " ".join(html.unescape(content).split())
+    return " ".join("".join(parser.parts).split())
+
+def make_excerpt(text, length=160):
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(" ", 1)[0]
+    return cut + "..."
@@ -0,0 +1,83 @@
+import gzip
+from flask import request
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+
+def post_etag(post_id, version, reaction=None, with_reaction=False):
+    # Strong validator for a post representation. The reader's own reaction
+    # is part of the body when ?userId= is given, so it is part of the tag.
+    tag = f"{post_id}.{version or 0}"
+    if with_reaction:
+        tag += f".{reaction or 'none'}"
+    return tag
+
+def _encoded_tags(etag):
+    # A compressed body is a different representation, so compress() appends
+    # the coding to the tag; either form validates the resource
+    return (etag, f"{etag}-gzip", f"{etag}-br")
+
+def matching_tag(etag, if_none_match):
+    # The tag from a parsed If-None-Match (werkzeug ETags) matching `etag`
+    for tag in _encoded_tags(etag):
+        if tag in if_none_match:
+            return tag
+    return None
+
+def not_modified(etag):
+    return matching_tag(etag, request.if_none_match)
+
+def add_validators(response):
+    # GET JSON responses without a version-based ETag get one hashed from
+    # the body: no saving in database work, but repeat views cost a 304
+    if request.method != "GET" or response.status_code != 200 or response.direct_passthrough:
+        return response
+    if response.mimetype != "application/json":
+        return response
+    if not response.get_etag()[0]:
+        response.add_etag()
+    etag = response.get_etag()[0]
+    if response.cache_control.max_age is None:
+        # Revalidate on every use instead of trusting heuristic freshness
+        response.cache_control.no_cache = True
+    matched = not_modified(etag)
+    if matched:
+        response.set_etag(matched)
+        response.status_code = 304
+        response.set_data(b"")
+        response.headers.pop("Content-Length", None)
+    return response
+
+def choose_encoding(accept_encodings):
+    # Best coding we can produce for a parsed Accept-Encoding, or None
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return accept_encodings.best_match(offered)
+
+def encode_body(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=Config.GZIP_LEVEL)
+
+def compress(response):
+    if (response.status_code != 200 or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < Config.COMPRESS_MIN_BYTES:
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+    response.set_data(encode_body(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
@@ -0,0 +1,153 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMAT = "WEBP"
+VARIANT_CONTENT_TYPE = "image/webp"
+VARIANT_QUALITY = 80
+
+def render_variants(data, widths):
+    # Runs in a worker process: one downscaled WebP per requested width that
+    # is smaller than the original. Returns {width: bytes}.
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        variants = {}
+        for width in widths:
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            resized.save(out, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            variants[width] = out.getvalue()
+        return variants
+
+def pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class ImagePipeline:
+    # Hands freshly stored images to a process pool and records the resulting
+    # variants in `variants_collection` ({digest, variants: {width: digest}}).
+    # Nothing here runs on the request thread beyond queueing the job.
+    # A claim that failed, or is still pending after claim_seconds (its
+    # worker died), is taken over by the next upload of the same image.
+    def __init__(self, blob_store, variants_collection, widths, max_workers=2, claim_seconds=300):
+        self.blob_store = blob_store
+        self.variants_collection = variants_collection
+        self.widths = tuple(sorted(widths))
+        self.max_workers = max_workers
+        self.claim_seconds = claim_seconds
+        self.executor = None
+        self.lock = threading.Lock()
+        self.enabled = pillow_available()
+        if not self.enabled:
+            logger.warning("Pillow is not installed; responsive image variants are disabled")
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A pool inherited across fork has no live workers in the child
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # spawn: workers never inherit the parent's Mongo connections
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self.executor
+
+    def _discard_executor(self, executor):
+        # A pool whose worker died is broken for good: drop it so the next
+        # submit starts a fresh one
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+
+    def _claim(self, digest):
+        # Claim the digest first so identical uploads are rendered only once.
+        # Returns the claim token, or None when a live claim or the finished
+        # variants already exist (the unique digest index rejects the upsert).
+        now = datetime.utcnow()
+        claim = ObjectId()
+        try:
+            self.variants_collection.update_one(
+                {"digest": digest, "$or": [
+                    {"status": "failed"},
+                    {"status": "pending", "claimedAt": {"$not": {"$gte": now - timedelta(seconds=self.claim_seconds)}}}
+                ]},
+                {"$set": {"status": "pending", "claim": claim, "claimedAt": now}, "$setOnInsert": {"variants": {}}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return None
+        return claim
+
+    def submit(self, digest, data):
+        if not self.enabled:
+            return
+        claim = self._claim(digest)
+        if claim is None:
+            return
+        for _ in range(2):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(render_variants, data, self.widths)
+            except RuntimeError:
+                # BrokenProcessPool, or a pool shut down under us
+                self._discard_executor(executor)
+                continue
+            future.add_done_callback(lambda f, executor=executor: self._store(digest, claim, executor, f))
+            return
+        logger.error("Rendering variants for %s failed: no image worker pool", digest)
+        self._fail(digest, claim)
+
+    def _fail(self, digest, claim):
+        # Only our own claim: a takeover may have re-claimed it meanwhile
+        self.variants_collection.update_one({"digest": digest, "claim": claim}, {"$set": {"status": "failed"}})
+
+    def _store(self, digest, claim, executor, future):
+        try:
+            rendered = future.result()
+            variants = {
+                str(width): self.blob_store.put(payload, VARIANT_CONTENT_TYPE)
+                for width, payload in rendered.items()
+            }
+            self.variants_collection.update_one(
+                {"digest": digest, "claim": claim},
+                {"$set": {"status": "done", "variants": variants}}
+            )
+        except Exception as e:
+            logger.exception("Rendering variants for %s failed", digest)
+            if isinstance(e, BrokenProcessPool):
+                self._discard_executor(executor)
+            self._fail(digest, claim)
+
+    def variant_digest(self, digest, width):
+        doc = self.variants_collection.find_one({"digest": digest}, {"_id": 0, "variants": 1})
+        if not doc:
+            return None
+        return doc.get("variants", {}).get(str(width))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,111 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from models import get_db
+
+# Every index the app relies on, per collection. apply_indexes() creates
+# them; creating an index that already exists with the same spec is a no-op.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "posts": [
+        IndexModel([("postId", ASCENDING)], unique=True),
+        # Profile pages: a user's posts, newest first, keyset-paginated
+        IndexModel([("userId", ASCENDING), ("timestamp", DESCENDING), ("postId", DESCENDING)]),
+        IndexModel([("timestamp", DESCENDING)]),
+        # Hot feed: the top of this index is the ranking
+        IndexModel([("hot", DESCENDING), ("postId", DESCENDING)]),
+    ],
+    "reactions": [
+        IndexModel([("postId", ASCENDING), ("userId", ASCENDING)], unique=True),
+    ],
+    "views": [
+        IndexModel([("postId", ASCENDING), ("userId", ASCENDING)], unique=True),
+    ],
+    "view_sketches": [
+        IndexModel([("postId", ASCENDING)], unique=True),
+    ],
+    "image_variants": [
+        IndexModel([("digest", ASCENDING)], unique=True),
+    ],
+    "comments": [
+        IndexModel([("commentId", ASCENDING)], unique=True),
+        IndexModel([("postId", ASCENDING), ("timestamp", ASCENDING), ("commentId", ASCENDING)]),
+        # Renames rewrite a user's comments
+        IndexModel([("userId", ASCENDING)]),
+    ],
+    "replies": [
+        IndexModel([("replyId", ASCENDING)], unique=True),
+        IndexModel([("commentId", ASCENDING), ("timestamp", ASCENDING), ("replyId", ASCENDING)]),
+        # Deleting a post removes its replies by postId
+        IndexModel([("postId", ASCENDING)]),
+        IndexModel([("userId", ASCENDING)]),
+    ],
+    "jobs": [
+        # Claims take the earliest runAt among queued jobs and expired leases
+        IndexModel([("state", ASCENDING), ("runAt", ASCENDING)]),
+        # Finished jobs are kept for a week
+        IndexModel([("finishedAt", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+}
+
+# The queries behind each route, as (what, collection, filter, sort). The
+# check explains each one and fails on any collection scan. The search index
+# build and the migration phases read whole collections on purpose and are
+# not listed.
+CURSOR = {"$or": [
+    {"timestamp": {"$lt": "2000-01-01"}},
+    {"timestamp": "2000-01-01", "postId": {"$lt": "0"}}
+]}
+CANONICAL_QUERIES = [
+    ("register/login by email", "users", {"email": "someone@example.com"}, None),
+    ("post by id", "posts", {"postId": "0"}, None),
+    ("profile posts, first page", "posts", {"userId": "0"}, [("timestamp", -1), ("postId", -1)]),
+    ("profile posts, next page", "posts", dict(CURSOR, userId="0"), [("timestamp", -1), ("postId", -1)]),
+    ("hot feed", "posts", {}, [("hot", -1), ("postId", -1)]),
+    ("reader's reaction", "reactions", {"postId": "0", "userId": "0"}, None),
+    ("reactions of a deleted post", "reactions", {"postId": "0"}, None),
+    ("view dedupe", "views", {"postId": "0", "userId": "0"}, None),
+    ("views of a deleted post", "views", {"postId": "0"}, None),
+    ("view sketch", "view_sketches", {"postId": "0"}, None),
+    ("image variants", "image_variants", {"digest": "0"}, None),
+    ("comment page", "comments", {"postId": "0"}, [("timestamp", 1), ("commentId", 1)]),
+    ("comment for a reply", "comments", {"commentId": "0", "postId": "0"}, None),
+    ("reply page", "replies", {"commentId": "0"}, [("timestamp", 1), ("replyId", 1)]),
+    ("replies of a deleted post", "replies", {"postId": "0"}, None),
+    ("rename: a user's posts", "posts", {"userId": "0", "author": {"$ne": "x"}}, None),
+    ("rename: a user's comments", "comments", {"userId": "0", "commenter": {"$ne": "x"}}, None),
+    ("rename: a user's replies", "replies", {"userId": "0", "replyCommenter": {"$ne": "x"}}, None),
+    ("job claim", "jobs", {"state": {"$in": ["queued", "running"]}, "runAt": {"$lte": "2000-01-01"}}, [("runAt", 1)]),
+]
+
+def apply_indexes(db=None):
+    db = db if db is not None else get_db()
+    for name, models in INDEXES.items():
+        db[name].create_indexes(models)
+
+def _stages(plan):
+    # Every "stage" name anywhere in an explain plan tree
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+def check_query_plans(db=None):
+    # Returns a list of problems (empty when every canonical query uses an index)
+    db = db if db is not None else get_db()
+    problems = []
+    for what, name, query, sort in CANONICAL_QUERIES:
+        cursor = db[name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = set(_stages(plan))
+        if "COLLSCAN" in stages:
+            problems.append(f"{what}: {name}.find({query}) does a collection scan")
+        elif sort and "SORT" in stages:
+            problems.append(f"{what}: {name}.find({query}) sorts in memory")
+    return problems
@@ -0,0 +1,179 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config import Config
+from models import jobs_collection
+
+logger = logging.getLogger(__name__)
+
+class LeaseLost(Exception):
+    # The job's lease expired and another worker claimed it
+    pass
+
+class Job:
+    def __init__(self, queue, doc):
+        self.queue = queue
+        self.id = doc["_id"]
+        self.kind = doc["kind"]
+        self.payload = doc.get("payload", {})
+        self.attempts = doc.get("attempts", 0)
+        self.lease = doc["lease"]
+
+    def progress(self, **counts):
+        # Adds to the job's progress counters and extends its lease. Long
+        # handlers call this after every batch.
+        self.queue._heartbeat(self, counts)
+
+class JobQueue:
+    # Durable queue in a Mongo collection. A job is claimed by moving its
+    # runAt past the end of a lease; a worker that dies simply lets the lease
+    # run out and the job becomes claimable again. Failed jobs are retried
+    # with exponential backoff up to max_attempts. Handlers must be safe to
+    # run more than once.
+    def __init__(self, collection, lease_seconds=60, max_attempts=5, poll_seconds=2.0):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.handlers = {}
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked child starts its own worker thread on first use
+        self.start_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def handler(self, kind):
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    def enqueue(self, kind, payload):
+        now = datetime.utcnow()
+        job_id = self.collection.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "state": "queued",
+            "runAt": now,
+            "attempts": 0,
+            "progress": {},
+            "createdAt": now
+        }).inserted_id
+        # Let a local worker pick it up without waiting for the next poll
+        self.wakeup.set()
+        return str(job_id)
+
+    def claim(self):
+        now = datetime.utcnow()
+        doc = self.collection.find_one_and_update(
+            {"state": {"$in": ["queued", "running"]}, "runAt": {"$lte": now}},
+            {
+                "$set": {
+                    "state": "running",
+                    "runAt": now + timedelta(seconds=self.lease_seconds),
+                    "lease": ObjectId(),
+                    "worker": self.worker_id,
+                    "startedAt": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("runAt", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        return Job(self, doc) if doc else None
+
+    def _heartbeat(self, job, counts):
+        update = {"$set": {"runAt": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+        if counts:
+            update["$inc"] = {f"progress.{name}": amount for name, amount in counts.items()}
+        result = self.collection.update_one({"_id": job.id, "lease": job.lease}, update)
+        if result.matched_count == 0:
+            raise LeaseLost()
+
+    def _finish(self, job, update):
+        # Only the current lease holder may record an outcome
+        self.collection.update_one({"_id": job.id, "lease": job.lease}, update)
+
+    def run(self, job):
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job.kind!r}")
+            handler(job)
+        except LeaseLost:
+            logger.warning("Lost the lease on job %s (%s)", job.id, job.kind)
+            return
+        except Exception as e:
+            logger.exception("Job %s (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+            error = "".join(traceback.format_exception_only(type(e), e)).strip()
+            if job.attempts >= self.max_attempts:
+                self._finish(job, {"$set": {"state": "failed", "lastError": error, "finishedAt": datetime.utcnow()}})
+            else:
+                delay = min(2 ** job.attempts, 300)
+                self._finish(job, {"$set": {
+                    "state": "queued",
+                    "lastError": error,
+                    "runAt": datetime.utcnow() + timedelta(seconds=delay)
+                }})
+            return
+        self._finish(job, {"$set": {"state": "done", "finishedAt": datetime.utcnow()}})
+
+    def run_pending(self, limit=None):
+        # Runs claimable jobs until none are left (or `limit` ran)
+        ran = 0
+        while limit is None or ran < limit:
+            job = self.claim()
+            if job is None:
+                break
+            self.run(job)
+            ran += 1
+        return ran
+
+    def start(self):
+        # Idempotent; called lazily so no thread exists before a fork
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.work, name="job-worker", daemon=True)
+            self.thread.start()
+
+    def work(self):
+        while not self.stopping.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception("Job worker iteration failed")
+            self.wakeup.wait(self.poll_seconds)
+            self.wakeup.clear()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+    def status(self):
+        counts = {doc["_id"]: doc["count"] for doc in self.collection.aggregate([
+            {"$group": {"_id": "$state", "count": {"$sum": 1}}}
+        ])}
+        failed = list(self.collection.find(
+            {"state": "failed"}, {"kind": 1, "payload": 1, "lastError": 1, "finishedAt": 1}
+        ).sort("finishedAt", -1).limit(10))
+        return counts, failed
+
+job_queue = JobQueue(
+    jobs_collection,
+    lease_seconds=Config.JOB_LEASE_SECONDS,
+    max_attempts=Config.JOB_MAX_ATTEMPTS,
+    poll_seconds=Config.JOB_POLL_SECONDS
+)
@@ -0,0 +1,230 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from flask import Response, g, request
+from flask.json.provider import DefaultJSONProvider
+from pymongo import monitoring
+from config import Config
+
+slow_log = logging.getLogger("slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+
+def _format_labels(labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels)
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # label values -> [count per bucket..., +Inf count, sum]
+        self.series = {}
+
+    def observe(self, label_values, value):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted(self.series.items())
+        for label_values, series in items:
+            labels = list(zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{{{_format_labels(labels + [('le', bound)])}}} {count}")
+            lines.append(f"{self.name}_bucket{{{_format_labels(labels + [('le', '+Inf')])}}} {series[-2]}")
+            lines.append(f"{self.name}_sum{{{_format_labels(labels)}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{_format_labels(labels)}}} {series[-2]}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{{{_format_labels(zip(self.label_names, label_values))}}} {value}")
+        return lines
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request", ("route", "method", "status"), LATENCY_BUCKETS
+)
+request_size = Histogram("http_request_size_bytes", "Request body size", ("route", "method"), SIZE_BUCKETS)
+response_size = Histogram("http_response_size_bytes", "Response body size as sent", ("route", "method"), SIZE_BUCKETS)
+request_db_time = Histogram(
+    "http_request_mongo_seconds", "Time a request spent waiting on MongoDB", ("route", "method"), LATENCY_BUCKETS
+)
+request_db_commands = Histogram(
+    "http_request_mongo_commands", "MongoDB commands issued per request", ("route", "method"), COUNT_BUCKETS
+)
+command_latency = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round trip", ("command", "collection"), LATENCY_BUCKETS
+)
+command_failures = Counter("mongo_command_failures_total", "Failed MongoDB commands", ("command", "collection"))
+METRICS = (request_latency, request_size, response_size, request_db_time, request_db_commands,
+           command_latency, command_failures)
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.db_commands = 0
+        self.serialize_seconds = 0.0
+        self.compress_seconds = 0.0
+        # Query shapes, only collected when the slow-request log is on
+        self.shapes = [] if Config.SLOW_REQUEST_MS else None
+
+# The stats of the request running in this thread (or task)
+current_stats = contextvars.ContextVar("request_stats", default=None)
+
+def shape(value):
+    # Replace literal values with "?" so queries group by structure
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [shape(item) for item in value]
+    return "?"
+
+def command_shape(command_name, command):
+    collection = command.get(command_name)
+    if command_name == "aggregate":
+        detail = [shape(stage) for stage in command.get("pipeline", [])]
+    elif command_name in ("update", "delete"):
+        detail = [shape(op.get("q", {})) for op in command.get("updates", command.get("deletes", []))]
+    elif command_name == "findAndModify":
+        detail = shape(command.get("query", {}))
+    else:
+        detail = shape(command.get("filter", {}))
+    return f"{command_name} {collection} {json.dumps(detail, default=str)}"
+
+class CommandTimer(monitoring.CommandListener):
+    # Driver command-monitoring hook: global per-command histograms plus
+    # per-request totals for whichever request issued the command
+    def __init__(self):
+        self.collections = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        with self.lock:
+            self.collections[event.request_id] = collection if isinstance(collection, str) else ""
+        stats = current_stats.get()
+        if stats is not None and stats.shapes is not None:
+            stats.shapes.append(command_shape(event.command_name, event.command))
+
+    def _finished(self, event):
+        with self.lock:
+            collection = self.collections.pop(event.request_id, "")
+        seconds = event.duration_micros / 1e6
+        command_latency.observe((event.command_name, collection), seconds)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.db_seconds += seconds
+            stats.db_commands += 1
+        return collection
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        collection = self._finished(event)
+        command_failures.inc((event.command_name, collection))
+
+command_timer = CommandTimer()
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # jsonify() goes through dumps(); time spent here is serialization
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats = current_stats.get()
+            if stats is not None:
+                stats.serialize_seconds += time.perf_counter() - started
+
+def route_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+def start_request():
+    g.metrics_token = current_stats.set(RequestStats())
+
+def finish_request(response):
+    stats = current_stats.get()
+    if stats is None:
+        return response
+    route, method = route_label(), request.method
+    if route == "/metrics":
+        return response
+    elapsed = time.perf_counter() - stats.started
+    request_latency.observe((route, method, str(response.status_code)), elapsed)
+    request_size.observe((route, method), request.content_length or 0)
+    response_size.observe((route, method), response.content_length or 0)
+    request_db_time.observe((route, method), stats.db_seconds)
+    request_db_commands.observe((route, method), stats.db_commands)
+    if Config.SLOW_REQUEST_MS and elapsed * 1000 >= Config.SLOW_REQUEST_MS:
+        slow_log.warning(json.dumps({
+            "route": route,
+            "method": method,
+            "status": response.status_code,
+            "totalMs": round(elapsed * 1000, 1),
+            "dbMs": round(stats.db_seconds * 1000, 1),
+            "dbCommands": stats.db_commands,
+            "serializeMs": round(stats.serialize_seconds * 1000, 1),
+            "compressMs": round(stats.compress_seconds * 1000, 1),
+            "queries": stats.shapes,
+        }))
+    return response
+
+def time_compression(compress, response):
+    stats = current_stats.get()
+    started = time.perf_counter()
+    response = compress(response)
+    if stats is not None:
+        stats.compress_seconds += time.perf_counter() - started
+    return response
+
+def end_request(exc=None):
+    token = g.pop("metrics_token", None)
+    if token is not None:
+        current_stats.reset(token)
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+def init_metrics(app):
+    # Register before the app's own after_request hooks: Flask runs them in
+    # reverse order, so finish_request sees the final (compressed) response
+    app.json = TimedJSONProvider(app)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(end_request)
+    app.add_url_rule("/metrics", "metrics", render_metrics)
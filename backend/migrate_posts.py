@@ -0,0 +1,418 @@
+"""Move posts embedded in users.posts into the posts collection.
+
+Online rollout:
+  1. python migrate_posts.py copy            (old code still serving)
+  2. deploy the code that reads/writes the posts collection
+  3. python migrate_posts.py copy --restart  (catch posts written in between)
+  4. python migrate_posts.py prune           (drop the embedded arrays)
+  5. python migrate_posts.py reactions       (move likedBy/dislikedBy/viewedBy
+                                              into the reactions/views store;
+                                              until then toggles and views
+                                              treat the legacy arrays as the
+                                              reader's previous state, so
+                                              counters are not bumped twice)
+  6. python migrate_posts.py images          (move inline base64 images into
+                                              the blob store)
+  7. python migrate_posts.py comments        (move posts.comments threads into
+                                              the comments/replies collections;
+                                              until it has run, legacy threads
+                                              do not show on the paged comment
+                                              endpoints)
+  8. python migrate_posts.py summaries       (store excerpt, word count,
+                                              reading time and thumbnail on
+                                              posts written before they were
+                                              computed at write time;
+                                              --refresh recomputes every post)
+  9. python migrate_posts.py hot             (score every post for the hot
+                                              feed; later changes are scored
+                                              as they happen)
+ 10. python migrate_posts.py authors         (after comments: store the userId
+                                              of comments/replies written
+                                              before it was recorded, so
+                                              renames reach them; resolved by
+                                              name, and skipped when no user
+                                              or several users have that name)
+ 11. python migrate_posts.py recount         (set likes/dislikes from the
+                                              reactions store; a toggle writes
+                                              the reaction and the counters
+                                              separately, so a crash between
+                                              the two leaves them apart. Safe
+                                              to run any time: posts with a
+                                              reaction changed in the last
+                                              --settle-seconds are skipped.
+                                              The reactions phase recounts the
+                                              posts it moves the same way.)
+
+Every phase works in batches and checkpoints the last processed _id in the
+migrations collection, so an interrupted run picks up where
+it stopped. Copies are upserts keyed on postId and prune only removes posts
+that are already present in the posts collection, so re-running is safe.
+"""
+import argparse
+from datetime import datetime, timedelta
+from pymongo import UpdateOne, ReplaceOne
+from config import Config
+from models import (users_collection, posts_collection, reactions_collection, views_collection,
+                    view_sketches_collection, comments_collection, replies_collection,
+                    migrations_collection, image_store)
+from indexes import apply_indexes
+from views import hll_position
+from reactions import COUNT_FIELDS
+from feed import summarize_post
+from hot import refresh_hot
+
+def load_checkpoint(name, restart):
+    if restart:
+        migrations_collection.delete_one({"_id": name})
+        return None
+    checkpoint = migrations_collection.find_one({"_id": name})
+    return checkpoint.get("lastId") if checkpoint else None
+
+def save_checkpoint(name, last_id, processed):
+    migrations_collection.update_one(
+        {"_id": name},
+        {
+            "$set": {"lastId": last_id, "updatedAt": datetime.utcnow().isoformat()},
+            "$inc": {"processed": processed}
+        },
+        upsert=True
+    )
+
+def iter_user_batches(last_user_id, batch_size):
+    # Walk users that still carry embedded posts in _id order
+    while True:
+        query = {"posts.0": {"$exists": True}}
+        if last_user_id is not None:
+            query["_id"] = {"$gt": last_user_id}
+        batch = list(users_collection.find(query, {"name": 1, "posts": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return
+        yield batch
+        last_user_id = batch[-1]["_id"]
+
+def copy_posts(batch_size, refresh, restart):
+    name = "posts-copy"
+    last_user_id = load_checkpoint(name, restart)
+    total = 0
+    for users in iter_user_batches(last_user_id, batch_size):
+        ops = []
+        for user in users:
+            for post in user.get("posts", []):
+                if not post.get("postId"):
+                    continue
+                doc = dict(post)
+                doc["userId"] = str(user["_id"])
+                doc.setdefault("author", user.get("name"))
+                if refresh:
+                    ops.append(ReplaceOne({"postId": doc["postId"]}, doc, upsert=True))
+                else:
+                    # Never clobber a post the new code has already written to
+                    ops.append(UpdateOne({"postId": doc["postId"]}, {"$setOnInsert": doc}, upsert=True))
+        if ops:
+            posts_collection.bulk_write(ops, ordered=False)
+        total += len(ops)
+        save_checkpoint(name, users[-1]["_id"], len(ops))
+        print(f"copied {total} posts (last user {users[-1]['_id']})")
+    print(f"copy finished: {total} posts")
+
+def prune_posts(batch_size, restart):
+    name = "posts-prune"
+    last_user_id = load_checkpoint(name, restart)
+    total = 0
+    for users in iter_user_batches(last_user_id, batch_size):
+        post_ids = [p.get("postId") for u in users for p in u.get("posts", []) if p.get("postId")]
+        copied = {
+            p["postId"] for p in posts_collection.find({"postId": {"$in": post_ids}}, {"postId": 1})
+        }
+        ops = []
+        for user in users:
+            present = [p["postId"] for p in user.get("posts", []) if p.get("postId") in copied]
+            if present:
+                ops.append(UpdateOne({"_id": user["_id"]}, {"$pull": {"posts": {"postId": {"$in": present}}}}))
+        if ops:
+            users_collection.bulk_write(ops, ordered=False)
+        users_collection.update_many(
+            {"_id": {"$in": [u["_id"] for u in users]}, "posts": {"$size": 0}},
+            {"$unset": {"posts": ""}}
+        )
+        total += len(copied)
+        save_checkpoint(name, users[-1]["_id"], len(copied))
+        print(f"pruned {total} posts (last user {users[-1]['_id']})")
+    print(f"prune finished: {total} posts")
+
+def iter_post_batches(last_post_id, batch_size):
+    # Posts that still carry inline reaction/view member lists
+    while True:
+        query = {"$or": [
+            {"likedBy": {"$exists": True}},
+            {"dislikedBy": {"$exists": True}},
+            {"viewedBy": {"$exists": True}}
+        ]}
+        if last_post_id is not None:
+            query["_id"] = {"$gt": last_post_id}
+        projection = {"postId": 1, "likes": 1, "dislikes": 1, "likedBy": 1, "dislikedBy": 1, "viewedBy": 1}
+        batch = list(posts_collection.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return
+        yield batch
+        last_post_id = batch[-1]["_id"]
+
+def recount_posts(posts, settle_seconds):
+    # Set likes/dislikes on `posts` (with their current likes/dislikes) to
+    # what the reactions store holds. A toggle writes the reaction and the
+    # post's counters separately, so a crash in between leaves them apart.
+    # Posts with a reaction changed in the last settle_seconds are skipped:
+    # their counter change may still be on its way (or in a counter buffer).
+    # The update only applies if the counters did not move since they were
+    # read. Returns the postIds whose counters changed.
+    post_ids = [post["postId"] for post in posts]
+    counts = {post_id: {"likes": 0, "dislikes": 0} for post_id in post_ids}
+    for row in reactions_collection.aggregate([
+        {"$match": {"postId": {"$in": post_ids}, "kind": {"$in": list(COUNT_FIELDS)}}},
+        {"$group": {"_id": {"postId": "$postId", "kind": "$kind"}, "count": {"$sum": 1}}}
+    ]):
+        counts[row["_id"]["postId"]][COUNT_FIELDS[row["_id"]["kind"]]] = row["count"]
+    # Checked after counting, so a toggle that slipped in between is seen
+    settled_before = (datetime.utcnow() - timedelta(seconds=settle_seconds)).isoformat()
+    unsettled = set(reactions_collection.distinct(
+        "postId", {"postId": {"$in": post_ids}, "timestamp": {"$gt": settled_before}}
+    ))
+    ops, changed = [], []
+    for post in posts:
+        post_id = post["postId"]
+        stored = {"likes": post.get("likes", 0), "dislikes": post.get("dislikes", 0)}
+        if post_id in unsettled or counts[post_id] == stored:
+            continue
+        ops.append(UpdateOne(
+            {"_id": post["_id"], "likes": post.get("likes"), "dislikes": post.get("dislikes")},
+            {"$set": counts[post_id], "$inc": {"version": 1}}
+        ))
+        changed.append(post_id)
+    if ops:
+        posts_collection.bulk_write(ops, ordered=False)
+        refresh_hot(posts_collection, changed)
+    return changed
+
+def move_reactions(batch_size, restart, settle_seconds):
+    name = "posts-reactions"
+    last_post_id = load_checkpoint(name, restart)
+    approximate = Config.VIEW_COUNTING == "approximate"
+    migrated_at = datetime.utcnow().isoformat()
+    total = 0
+    for posts in iter_post_batches(last_post_id, batch_size):
+        reaction_ops, view_ops, sketch_ops = [], [], []
+        for post in posts:
+            post_id = post["postId"]
+            for kind, field in (("like", "likedBy"), ("dislike", "dislikedBy")):
+                for user_id in post.get(field) or []:
+                    reaction_ops.append(UpdateOne(
+                        {"postId": post_id, "userId": user_id},
+                        {"$setOnInsert": {"kind": kind}},
+                        upsert=True
+                    ))
+            for user_id in post.get("viewedBy") or []:
+                view_ops.append(UpdateOne({"postId": post_id, "userId": user_id}, {"$setOnInsert": {"timestamp": migrated_at}}, upsert=True))
+                if approximate:
+                    index, rank = hll_position(user_id)
+                    sketch_ops.append(UpdateOne(
+                        {"postId": post_id},
+                        {"$max": {f"registers.{index}": rank}},
+                        upsert=True
+                    ))
+        if reaction_ops:
+            reactions_collection.bulk_write(reaction_ops, ordered=False)
+        if view_ops:
+            views_collection.bulk_write(view_ops, ordered=False)
+        if sketch_ops:
+            view_sketches_collection.bulk_write(sketch_ops, ordered=False)
+        # Counters already match the list lengths; only the lists go away.
+        # The version bump changes the posts' ETags.
+        posts_collection.update_many(
+            {"_id": {"$in": [p["_id"] for p in posts]}},
+            {"$unset": {"likedBy": "", "dislikedBy": "", "viewedBy": ""}, "$inc": {"version": 1}}
+        )
+        # Unless a toggle fell between its two writes since the deploy
+        recount_posts(posts, settle_seconds)
+        moved = len(reaction_ops) + len(view_ops)
+        total += moved
+        save_checkpoint(name, posts[-1]["_id"], moved)
+        print(f"moved {total} reactions/views (last post {posts[-1]['_id']})")
+    print(f"reactions finished: {total} reactions/views")
+
+def iter_batches(collection, query, projection, last_id, batch_size):
+    while True:
+        page_query = dict(query)
+        if last_id is not None:
+            page_query["_id"] = {"$gt": last_id}
+        batch = list(collection.find(page_query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]["_id"]
+
+def move_images(batch_size, restart):
+    # Data URLs in users.profileImage, posts.image and <img> tags inside
+    # posts.content become blob-store URLs
+    total = 0
+    jobs = [
+        ("users-images", users_collection, {"profileImage": {"$regex": "^data:"}}, ["profileImage"]),
+        ("posts-images", posts_collection, {"$or": [
+            {"image": {"$regex": "^data:"}},
+            {"content": {"$regex": "src=[\"']data:"}}
+        ]}, ["image", "content"]),
+    ]
+    for name, collection, query, fields in jobs:
+        last_id = load_checkpoint(name, restart)
+        projection = {field: 1 for field in fields}
+        for docs in iter_batches(collection, query, projection, last_id, batch_size):
+            ops = []
+            for doc in docs:
+                update = {}
+                for field in fields:
+                    value = doc.get(field)
+                    try:
+                        new_value = image_store.save_inline(value) if field == "content" else image_store.save(value)
+                    except ValueError:
+                        print(f"skipping undecodable {field} on {doc['_id']}")
+                        continue
+                    if new_value != value:
+                        update[field] = new_value
+                if update:
+                    change = {"$set": update}
+                    if collection is posts_collection:
+                        # New ETag, so cached copies of the post pick up the URLs
+                        change["$inc"] = {"version": 1}
+                    ops.append(UpdateOne({"_id": doc["_id"]}, change))
+            if ops:
+                collection.bulk_write(ops, ordered=False)
+            total += len(ops)
+            save_checkpoint(name, docs[-1]["_id"], len(ops))
+            print(f"moved images of {total} documents (last {docs[-1]['_id']})")
+    print(f"images finished: {total} documents")
+
+def move_comments(batch_size, restart):
+    name = "posts-comments"
+    last_id = load_checkpoint(name, restart)
+    total = 0
+    query = {"comments": {"$exists": True}}
+    for posts in iter_batches(posts_collection, query, {"postId": 1, "comments": 1}, last_id, batch_size):
+        comment_ops, reply_ops, post_ops = [], [], []
+        for post in posts:
+            thread = post.get("comments") or []
+            for comment in thread:
+                replies = comment.get("replies") or []
+                doc = {k: v for k, v in comment.items() if k != "replies"}
+                doc.update(postId=post["postId"], replyCount=len(replies))
+                comment_ops.append(UpdateOne({"commentId": doc["commentId"]}, {"$setOnInsert": doc}, upsert=True))
+                for reply in replies:
+                    reply_doc = dict(reply, postId=post["postId"], commentId=comment["commentId"])
+                    reply_ops.append(UpdateOne({"replyId": reply_doc["replyId"]}, {"$setOnInsert": reply_doc}, upsert=True))
+            # $inc, not $set: the deployed code has been counting comments
+            # added since then on top of the legacy thread
+            post_ops.append(UpdateOne(
+                {"_id": post["_id"]},
+                {"$inc": {"commentCount": len(thread), "version": 1}, "$unset": {"comments": ""}}
+            ))
+        if comment_ops:
+            comments_collection.bulk_write(comment_ops, ordered=False)
+        if reply_ops:
+            replies_collection.bulk_write(reply_ops, ordered=False)
+        posts_collection.bulk_write(post_ops, ordered=False)
+        total += len(comment_ops) + len(reply_ops)
+        save_checkpoint(name, posts[-1]["_id"], len(comment_ops) + len(reply_ops))
+        print(f"moved {total} comments/replies (last post {posts[-1]['_id']})")
+    print(f"comments finished: {total} comments/replies")
+
+def link_authors(batch_size, restart):
+    total = 0
+    for collection, field in ((comments_collection, "commenter"), (replies_collection, "replyCommenter")):
+        name = f"{collection.name}-authors"
+        last_id = load_checkpoint(name, restart)
+        query = {"userId": {"$exists": False}}
+        for docs in iter_batches(collection, query, {field: 1}, last_id, batch_size):
+            names = list({doc.get(field) for doc in docs if doc.get(field)})
+            owners = {}
+            for user in users_collection.find({"name": {"$in": names}}, {"name": 1}):
+                owners.setdefault(user["name"], []).append(str(user["_id"]))
+            ops = [
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"userId": owners[doc[field]][0]}})
+                for doc in docs
+                if len(owners.get(doc.get(field), [])) == 1
+            ]
+            if ops:
+                collection.bulk_write(ops, ordered=False)
+            total += len(ops)
+            save_checkpoint(name, docs[-1]["_id"], len(ops))
+            print(f"linked {total} comments/replies to their authors (last {docs[-1]['_id']})")
+    print(f"authors finished: {total} comments/replies")
+
+def store_summaries(batch_size, refresh, restart):
+    name = "posts-summaries"
+    last_id = load_checkpoint(name, restart)
+    query = {} if refresh else {"wordCount": {"$exists": False}}
+    total = 0
+    for posts in iter_batches(posts_collection, query, {"content": 1, "image": 1}, last_id, batch_size):
+        ops = [
+            UpdateOne(
+                {"_id": post["_id"]},
+                {"$set": summarize_post(post.get("content"), post.get("image")), "$inc": {"version": 1}}
+            )
+            for post in posts
+        ]
+        posts_collection.bulk_write(ops, ordered=False)
+        total += len(ops)
+        save_checkpoint(name, posts[-1]["_id"], len(ops))
+        print(f"summarized {total} posts (last post {posts[-1]['_id']})")
+    print(f"summaries finished: {total} posts")
+
+def recount_reactions(batch_size, restart, settle_seconds):
+    name = "posts-recount"
+    last_id = load_checkpoint(name, restart)
+    total = fixed = 0
+    for posts in iter_batches(posts_collection, {}, {"postId": 1, "likes": 1, "dislikes": 1}, last_id, batch_size):
+        fixed += len(recount_posts(posts, settle_seconds))
+        total += len(posts)
+        save_checkpoint(name, posts[-1]["_id"], len(posts))
+        print(f"recounted {total} posts, corrected {fixed} (last post {posts[-1]['_id']})")
+    print(f"recount finished: {total} posts, {fixed} corrected")
+
+def score_posts(batch_size, restart):
+    name = "posts-hot"
+    last_id = load_checkpoint(name, restart)
+    total = 0
+    for posts in iter_batches(posts_collection, {}, {"postId": 1}, last_id, batch_size):
+        refresh_hot(posts_collection, [post["postId"] for post in posts])
+        total += len(posts)
+        save_checkpoint(name, posts[-1]["_id"], len(posts))
+        print(f"scored {total} posts (last post {posts[-1]['_id']})")
+    print(f"hot finished: {total} posts")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate embedded post data into dedicated collections")
+    parser.add_argument("phase", choices=["copy", "prune", "reactions", "images", "comments", "summaries", "hot", "authors", "recount"])
+    parser.add_argument("--batch-size", type=int, default=100, help="users (or posts) per batch")
+    parser.add_argument("--refresh", action="store_true", help="overwrite posts that were already copied (or summarized)")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    parser.add_argument("--settle-seconds", type=int, default=60,
+                        help="reactions/recount: skip posts with a reaction changed this recently")
+    args = parser.parse_args()
+
+    apply_indexes()
+    if args.phase == "copy":
+        copy_posts(args.batch_size, args.refresh, args.restart)
+    elif args.phase == "prune":
+        prune_posts(args.batch_size, args.restart)
+    elif args.phase == "reactions":
+        move_reactions(args.batch_size, args.restart, args.settle_seconds)
+    elif args.phase == "images":
+        move_images(args.batch_size, args.restart)
+    elif args.phase == "comments":
+        move_comments(args.batch_size, args.restart)
+    elif args.phase == "summaries":
+        store_summaries(args.batch_size, args.refresh, args.restart)
+    elif args.phase == "hot":
+        score_posts(args.batch_size, args.restart)
+    elif args.phase == "authors":
+        link_authors(args.batch_size, args.restart)
+    else:
+        recount_reactions(args.batch_size, args.restart, args.settle_seconds)
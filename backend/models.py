@@ -1,6 +1,93 @@
-from pymongo import MongoClient
+import os
+import threading
+from pymongo import MongoClient, ReadPreference
 from config import Config
+from metrics import command_timer
+from blobstore import make_blob_store, ImageStore
+from imaging import ImagePipeline
 
-client = MongoClient(Config.MONGO_URI)
-db = client["blogdb"]
-users_collection = db["users"]
+DB_NAME = "blogdb"
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+def client_options(config):
+    # Shared by the blocking client here and the async one in asgi_app.py
+    options = {
+        "maxPoolSize": config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": config.MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": config.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": config.MONGO_SOCKET_TIMEOUT_MS or None,
+        "appname": "webx-blog",
+    }
+    if config.MONGO_COMPRESSORS:
+        options["compressors"] = config.MONGO_COMPRESSORS
+    if config.METRICS:
+        options["event_listeners"] = [command_timer]
+    return options
+
+# One client per process, opened on first use. Nothing connects at import
+# time, and a child forked by a pre-forking server opens its own client
+# instead of sharing the parent's sockets and monitor threads.
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(Config.MONGO_URI, **client_options(Config))
+    return _client
+
+def get_db():
+    return get_client()[DB_NAME]
+
+def _after_fork():
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+class LazyCollection:
+    # Module-level handle that resolves to the collection on the current
+    # process's client each time it is used
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def reads(self):
+        # The same collection with the read-only routes' read preference
+        return get_db().get_collection(self.name, read_preference=READ_PREFERENCES[Config.MONGO_READ_PREFERENCE])
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+users_collection = LazyCollection("users")
+# Posts live in their own collection (one document per post) instead of an
+# array embedded in the author's user document
+posts_collection = LazyCollection("posts")
+# Reactions and views keyed by (postId, userId); posts keep only counters
+reactions_collection = LazyCollection("reactions")
+views_collection = LazyCollection("views")
+view_sketches_collection = LazyCollection("view_sketches")
+# Comment threads: one document per comment and per reply
+comments_collection = LazyCollection("comments")
+replies_collection = LazyCollection("replies")
+migrations_collection = LazyCollection("migrations")
+image_variants_collection = LazyCollection("image_variants")
+jobs_collection = LazyCollection("jobs")
+blob_store = make_blob_store(Config, get_db)
+image_pipeline = ImagePipeline(
+    blob_store, image_variants_collection, Config.IMAGE_VARIANT_WIDTHS,
+    max_workers=Config.IMAGE_WORKERS, claim_seconds=Config.IMAGE_CLAIM_SECONDS
+)
+image_store = ImageStore(blob_store, Config.PUBLIC_URL, pipeline=image_pipeline)
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+class PasswordPoolBusy(Exception):
+    # Raised instead of queueing when the hashing pool is saturated
+    pass
+
+def benchmark_rounds(target_ms):
+    # Highest bcrypt cost whose hash time stays within target_ms on this
+    # machine. Each extra round doubles the work, so one timed hash at the
+    # minimum cost is enough to extrapolate.
+    started = time.perf_counter()
+    bcrypt.hashpw(b"benchmark", bcrypt.gensalt(rounds=MIN_ROUNDS))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    rounds = MIN_ROUNDS
+    while rounds < MAX_ROUNDS and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+def hash_rounds(hashed):
+    # "$2b$12$..." -> 12
+    try:
+        return int(hashed.split(b"$")[2])
+    except (IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    # bcrypt runs on a small dedicated thread pool (bcrypt releases the GIL
+    # while hashing). At most max_pending hashes may be running or queued;
+    # beyond that callers get PasswordPoolBusy so a login burst cannot tie up
+    # every request thread.
+    def __init__(self, rounds, max_workers, max_pending, target_ms=250):
+        self.setting = rounds
+        self.target_ms = target_ms
+        self.rounds = None
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._after_fork()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Fresh pool per process: threads do not survive fork
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.lock = threading.Lock()
+
+    def calibrate(self):
+        with self.lock:
+            if self.rounds is None:
+                if self.setting == "auto":
+                    self.rounds = benchmark_rounds(self.target_ms)
+                    logger.info("bcrypt cost %d (benchmarked for %d ms)", self.rounds, self.target_ms)
+                else:
+                    self.rounds = int(self.setting)
+            return self.rounds
+
+    def _submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordPoolBusy()
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        return future
+
+    def hash(self, password):
+        rounds = self.calibrate()
+        return self._submit(lambda: bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds))).result()
+
+    def verify(self, password, hashed):
+        if isinstance(hashed, str):
+            hashed = hashed.encode("utf-8")
+        return self._submit(bcrypt.checkpw, password.encode("utf-8"), hashed).result()
+
+    def needs_rehash(self, hashed):
+        if isinstance(hashed, str):
+            hashed = hashed.encode("utf-8")
+        return hash_rounds(hashed) != self.calibrate()
+
+    def rehash_later(self, password, store):
+        # Re-hash at the current cost in the background and hand the result
+        # to store(); skipped when the pool is busy (the next login retries)
+        rounds = self.calibrate()
+        try:
+            future = self._submit(lambda: bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)))
+        except PasswordPoolBusy:
+            return
+        def done(f):
+            try:
+                store(f.result())
+            except Exception:
+                logger.exception("Password rehash failed")
+        future.add_done_callback(done)
+
+password_hasher = PasswordHasher(
+    Config.BCRYPT_ROUNDS, Config.PASSWORD_WORKERS, Config.PASSWORD_MAX_PENDING, Config.BCRYPT_TARGET_MS
+)
@@ -0,0 +1,101 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Counter field on the post for each reaction kind
+COUNT_FIELDS = {
+    "like": "likes",
+    "dislike": "dislikes",
+}
+
+def get_reaction(reactions_collection, post_id, user_id):
+    doc = reactions_collection.find_one({"postId": post_id, "userId": user_id}, {"_id": 0, "kind": 1})
+    return doc.get("kind") if doc else None
+
+def legacy_reaction(posts_collection, post_id, user_id):
+    # A reaction still listed in the post's likedBy/dislikedBy arrays, which
+    # `migrate_posts.py reactions` has not moved yet. Consulted only for a
+    # reader's first reaction on record.
+    for doc in posts_collection.aggregate([
+        {"$match": {"postId": post_id, "$or": [{"likedBy": user_id}, {"dislikedBy": user_id}]}},
+        {"$project": {"_id": 0, "liked": {"$in": [user_id, {"$ifNull": ["$likedBy", []]}]}}}
+    ]):
+        return "like" if doc["liked"] else "dislike"
+    return None
+
+def reaction_state(counters, kind):
+    return {
+        "likes": counters.get("likes", 0),
+        "dislikes": counters.get("dislikes", 0),
+        "liked": kind == "like",
+        "disliked": kind == "dislike",
+    }
+
+def _flip(reactions_collection, post_id, user_id, kind):
+    # One (postId, userId) document per reader, unique-indexed. The pipeline
+    # clears the reaction when it already is `kind` and sets it otherwise; the
+    # previous value tells the caller which counters to move.
+    pipeline = [{"$set": {
+        "kind": {"$cond": [{"$eq": ["$kind", kind]}, None, kind]},
+        "timestamp": datetime.utcnow().isoformat()
+    }}]
+    try:
+        return reactions_collection.find_one_and_update(
+            {"postId": post_id, "userId": user_id},
+            pipeline,
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # Lost an upsert race with a concurrent click; the document exists now
+        return reactions_collection.find_one_and_update(
+            {"postId": post_id, "userId": user_id},
+            pipeline,
+            return_document=ReturnDocument.BEFORE
+        )
+
+def toggle_reaction(posts_collection, reactions_collection, post_id, user_id, kind, buffer=None):
+    # Returns the post's new counters and the caller's reaction state, or
+    # None if the post does not exist. With a counter buffer the counter
+    # change is queued and the response is the stored value plus pending deltas.
+    # The reaction and the counters are separate writes, not one atomic
+    # update: a crash between them leaves the counters off by one until
+    # `migrate_posts.py recount` sets them from the reactions store.
+    previous = _flip(reactions_collection, post_id, user_id, kind)
+    if previous is not None:
+        previous_kind = previous.get("kind")
+    else:
+        # Before the reactions migration has run, the counters already
+        # include reactions held only in the legacy arrays
+        previous_kind = legacy_reaction(posts_collection, post_id, user_id)
+    if previous_kind == kind:
+        new_kind = None
+        delta = {COUNT_FIELDS[kind]: -1}
+        if previous is None:
+            # _flip just recorded `kind`; this click takes the legacy one back
+            reactions_collection.update_one({"postId": post_id, "userId": user_id}, {"$set": {"kind": None}})
+    else:
+        new_kind = kind
+        delta = {COUNT_FIELDS[kind]: 1}
+        if previous_kind:
+            delta[COUNT_FIELDS[previous_kind]] = -1
+    projection = {"_id": 0, "likes": 1, "dislikes": 1}
+    if buffer is None:
+        counters = posts_collection.find_one_and_update(
+            {"postId": post_id},
+            {"$inc": dict(delta, version=1)},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+    else:
+        counters = posts_collection.find_one({"postId": post_id}, projection)
+    if counters is None:
+        # No such post: undo the reaction we just recorded
+        reactions_collection.delete_one({"postId": post_id, "userId": user_id})
+        return None
+    if buffer is not None:
+        for field, amount in delta.items():
+            buffer.add_delta(post_id, field, amount)
+        for field, amount in buffer.pending(post_id).items():
+            counters[field] = counters.get(field, 0) + amount
+    return reaction_state(counters, new_kind)
@@ -1,28 +1,43 @@
 from flask import Blueprint, request, jsonify
-import bcrypt
-from bson import ObjectId
-from models import users_collection
+from pymongo.errors import DuplicateKeyError
+from models import users_collection, image_store
+from passwords import password_hasher, PasswordPoolBusy
+from sessions import session_tokens
 
 auth_bp = Blueprint("auth", __name__)
 
+@auth_bp.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    response = jsonify({"message": "Too many sign-in requests, please retry shortly"})
+    response.status_code = 429
+    response.headers["Retry-After"] = "1"
+    return response
+
 @auth_bp.route("/register", methods=["POST"])
 def register():
     data = request.get_json()
+    # Basic required fields
     name = data.get("name")
     email = data.get("email")
     password = data.get("password")
+    # Additional fields from multi-step form
     phone = data.get("phone")
     education = data.get("education")
     occupation = data.get("occupation")
-    profileImage = data.get("profileImage")
-    
+    profileImage = data.get("profileImage")  # Base64 string for profile image
+
     if not name or not email or not password:
         return jsonify({"message": "Missing required fields: name, email, and password"}), 400
 
     if users_collection.find_one({"email": email}):
         return jsonify({"message": "User already exists"}), 400
 
-    hashed_pw = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    try:
+        profileImage = image_store.save(profileImage)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    hashed_pw = password_hasher.hash(password)
     user_doc = {
         "name": name,
         "email": email,
@@ -30,10 +45,13 @@ def register():
         "phone": phone,
         "education": education,
         "occupation": occupation,
-        "profileImage": profileImage,
-        "posts": []
+        "profileImage": profileImage  # May be None
     }
-    users_collection.insert_one(user_doc)
+    try:
+        users_collection.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration (unique email index)
+        return jsonify({"message": "User already exists"}), 400
     return jsonify({"message": "User registered successfully"}), 201
 
 @auth_bp.route("/login", methods=["POST"])
@@ -41,7 +59,7 @@ def login():
     data = request.get_json()
     email = data.get("email")
     password = data.get("password")
-    
+
     if not email or not password:
         return jsonify({"message": "Missing email or password"}), 400
 
@@ -49,10 +67,18 @@ def login():
     if not user:
         return jsonify({"message": "Invalid email or password"}), 401
 
-    if bcrypt.hashpw(password.encode("utf-8"), user["password"]) == user["password"]:
+    if password_hasher.verify(password, user["password"]):
+        if password_hasher.needs_rehash(user["password"]):
+            # Cost setting changed since this hash was made
+            password_hasher.rehash_later(password, lambda hashed: users_collection.update_one(
+                {"_id": user["_id"], "password": user["password"]}, {"$set": {"password": hashed}}
+            ))
         return jsonify({
             "message": "Login successful",
-            "userId": str(user["_id"])
+            "userId": str(user["_id"]),
+            "userName": user["name"],
+            # Sent back as "Authorization: Bearer <token>" on writes
+            "token": session_tokens.issue(str(user["_id"]), user["name"])
         }), 200
     else:
         return jsonify({"message": "Invalid email or password"}), 401
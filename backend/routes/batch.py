@@ -0,0 +1,200 @@
+from flask import Blueprint, request, jsonify
+from bson import ObjectId
+from datetime import datetime
+from config import Config
+from models import (posts_collection, reactions_collection, views_collection,
+                    view_sketches_collection, comments_collection, image_store)
+from cache import post_cache, comments_cache
+from hot import refresh_hot
+import comments
+from reactions import toggle_reaction
+from views import record_exact_views, record_view
+from counter_buffer import counter_buffer
+from sessions import acting_user, token_user
+from events import post_events
+
+batch_bp = Blueprint("batch", __name__)
+
+TOGGLES = {"toggle-like": "like", "toggle-dislike": "dislike"}
+WRITE_OPS = {"add-view", "add-comment", *TOGGLES}
+
+def result(status, **body):
+    return {"status": status, "body": body}
+
+# POST /api/batch {"userId": ..., "operations": [{"op": ..., ...}, ...]}
+#   get-posts       {"postIds": [...]}
+#   add-view        {"postId": ...}
+#   toggle-like     {"postId": ...}
+#   toggle-dislike  {"postId": ...}
+#   add-comment     {"postId": ..., "content": ...}
+# Responds with one {status, body} per operation, in order, where body is
+# what the single-operation route returns. Writes are applied before reads,
+# so get-posts sees the batch's own writes. Work is grouped across
+# operations: one $in lookup per collection and one bulk write per kind.
+@batch_bp.route("/batch", methods=["POST"])
+def run_batch():
+    data = request.get_json() or {}
+    operations = data.get("operations")
+    if not isinstance(operations, list) or not operations or not all(isinstance(op, dict) for op in operations):
+        return jsonify({"message": "operations must be a non-empty list of objects"}), 400
+    if len(operations) > Config.BATCH_MAX_OPERATIONS:
+        return jsonify({"message": f"At most {Config.BATCH_MAX_OPERATIONS} operations per batch"}), 400
+    if data.get("userId") is not None and not isinstance(data["userId"], str):
+        return jsonify({"message": "userId must be a string"}), 400
+    results = [None] * len(operations)
+    writes, reads = [], []
+    for index, op in enumerate(operations):
+        kind = op.get("op")
+        # Ids are hashed and used in filters, so only strings get that far
+        if kind in WRITE_OPS:
+            if isinstance(op.get("postId"), str):
+                writes.append((index, kind, op))
+            else:
+                results[index] = result(400, message="postId must be a string")
+        elif kind == "get-posts":
+            post_ids = op.get("postIds")
+            if isinstance(post_ids, list) and all(isinstance(post_id, str) for post_id in post_ids):
+                reads.append((index, post_ids))
+            else:
+                results[index] = result(400, message="postIds must be a list of strings")
+        else:
+            results[index] = result(400, message=f"Unknown operation: {kind}")
+    if sum(len(post_ids) for _, post_ids in reads) > Config.BATCH_MAX_OPERATIONS:
+        return jsonify({"message": f"At most {Config.BATCH_MAX_OPERATIONS} posts per batch"}), 400
+
+    if writes:
+        user = acting_user(data.get("userId"), lookup=any(kind == "add-comment" for _, kind, _ in writes))
+    else:
+        # Reads only use the reader's id for their own reactions
+        user = token_user() or ({"userId": data["userId"]} if data.get("userId") else None)
+    if writes:
+        apply_writes(writes, user, results)
+    if reads:
+        apply_reads(reads, user, results)
+    return jsonify({"results": results}), 200
+
+def apply_writes(writes, user, results):
+    # One existence lookup for every post written to
+    existing = {
+        doc["postId"]: doc.get("commentCount", 0)
+        for doc in posts_collection.find(
+            {"postId": {"$in": list({op.get("postId") for _, _, op in writes})}},
+            {"_id": 0, "postId": 1, "commentCount": 1}
+        )
+    }
+    views, new_comments = [], []
+    # Posts whose cached copy is stale, and those whose hot score moved
+    changed, rescore = set(), set()
+    for index, kind, op in writes:
+        post_id = op.get("postId")
+        if not user:
+            results[index] = result(400, message="Missing user ID")
+        elif post_id not in existing:
+            results[index] = result(404, message="Post not found")
+        elif kind == "add-view":
+            views.append((index, post_id))
+        elif kind == "add-comment":
+            if not op.get("content"):
+                results[index] = result(400, message="Missing user ID or comment content")
+                continue
+            new_comments.append((index, post_id, {
+                "commentId": str(ObjectId()),
+                "userId": user["userId"],
+                "commenter": user["name"],
+                "content": op["content"],
+                "timestamp": datetime.utcnow().isoformat()
+            }))
+        else:
+            # A toggle depends on the reader's previous reaction, so toggles
+            # run one at a time
+            reaction = TOGGLES[kind]
+            state = toggle_reaction(posts_collection, reactions_collection, post_id, user["userId"], reaction, counter_buffer)
+            if not state:
+                results[index] = result(404, message="Post not found")
+                continue
+            if reaction == "like":
+                message = "Post liked" if state["liked"] else "Like removed"
+            else:
+                message = "Post disliked" if state["disliked"] else "Dislike removed"
+            results[index] = result(200, message=message, **state)
+            if counter_buffer:
+                # The stored post changes (and is invalidated) at flush time
+                post_events.publish(post_id, "counters", {"likes": state["likes"], "dislikes": state["dislikes"]})
+            else:
+                changed.add(post_id)
+                rescore.add(post_id)
+
+    if counter_buffer:
+        # Deduped per window here, against the views store at flush time
+        for index, post_id in views:
+            if counter_buffer.add_view(post_id, user["userId"]):
+                results[index] = result(202, message="View recorded")
+            else:
+                results[index] = result(200, message="View already counted")
+    elif Config.VIEW_COUNTING == "exact":
+        counted = record_exact_views(posts_collection, views_collection, [(post_id, user["userId"]) for _, post_id in views])
+        for index, post_id in views:
+            # A repeat within the batch counts as already seen
+            first = (post_id, user["userId"]) in counted
+            counted.discard((post_id, user["userId"]))
+            results[index] = result(200, message="View added" if first else "View already counted")
+            if first:
+                changed.add(post_id)
+                rescore.add(post_id)
+    else:
+        for index, post_id in views:
+            counted = record_view(
+                posts_collection, views_collection, view_sketches_collection,
+                post_id, user["userId"], mode=Config.VIEW_COUNTING
+            )
+            if counted is None:
+                results[index] = result(404, message="Post not found")
+                continue
+            results[index] = result(200, message="View added" if counted else "View already counted")
+            if counted:
+                changed.add(post_id)
+                rescore.add(post_id)
+
+    if new_comments:
+        comments.add_comments(posts_collection, comments_collection, [(post_id, c) for _, post_id, c in new_comments])
+        for index, post_id, comment in new_comments:
+            existing[post_id] += 1
+            added = {"comment": dict(comment, replyCount=0), "commentCount": existing[post_id]}
+            results[index] = result(201, message="Comment added successfully", **added)
+            changed.add(post_id)
+            rescore.add(post_id)
+            post_events.publish(post_id, "comment-added", added)
+        comments_cache.invalidate(*{post_id for _, post_id, _ in new_comments})
+
+    if rescore:
+        # The counters read for the scores go out to the posts' live streams
+        post_events.publish_counters(refresh_hot(posts_collection, rescore))
+    if changed:
+        post_cache.invalidate(*changed)
+
+def apply_reads(reads, user, results):
+    # One $in lookup for every requested post and one for the reader's
+    # reactions to them
+    wanted = list({post_id for _, post_ids in reads for post_id in post_ids})
+    posts = {
+        doc["postId"]: doc
+        for doc in posts_collection.find({"postId": {"$in": wanted}}, {"_id": 0, "comments": 0, "hot": 0})
+    } if wanted else {}
+    reactions = {}
+    if user and posts:
+        reactions = {
+            doc["postId"]: doc.get("kind")
+            for doc in reactions_collection.find(
+                {"postId": {"$in": list(posts)}, "userId": user["userId"]}, {"_id": 0, "postId": 1, "kind": 1}
+            )
+        }
+    for index, post_ids in reads:
+        found = []
+        for post_id in post_ids:
+            if post_id in posts:
+                post = dict(posts[post_id])
+                if user:
+                    post["reaction"] = reactions.get(post_id)
+                found.append(image_store.add_variants(post))
+        missing = [post_id for post_id in post_ids if post_id not in posts]
+        results[index] = result(200, posts=found, missing=missing)
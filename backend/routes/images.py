@@ -0,0 +1,38 @@
+from flask import Blueprint, Response, request, jsonify, redirect
+from werkzeug.wsgi import wrap_file
+from models import image_store
+from blobstore import DIGEST_RE
+
+images_bp = Blueprint("images", __name__)
+
+# Content-addressed image blobs: the URL never changes meaning, so clients
+# and proxies may cache them forever
+def send_blob(digest):
+    blob = image_store.blobs.open(digest)
+    if not blob:
+        return jsonify({"message": "Image not found"}), 404
+    response = Response(wrap_file(request.environ, blob.fileobj), mimetype=blob.content_type, direct_passthrough=True)
+    response.content_length = blob.length
+    response.set_etag(digest)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=blob.length)
+
+@images_bp.route("/images/<digest>", methods=["GET"])
+def get_image(digest):
+    if not DIGEST_RE.match(digest):
+        return jsonify({"message": "Image not found"}), 404
+    return send_blob(digest)
+
+@images_bp.route("/images/<digest>/w/<int:width>", methods=["GET"])
+def get_image_variant(digest, width):
+    if not DIGEST_RE.match(digest):
+        return jsonify({"message": "Image not found"}), 404
+    variant = image_store.pipeline.variant_digest(digest, width) if image_store.pipeline else None
+    if variant:
+        return send_blob(variant)
+    # Not rendered (yet), or the original is narrower than `width`
+    response = redirect(image_store.url_for(digest), code=302)
+    response.cache_control.no_store = True
+    return response
@@ -1,155 +1,405 @@
-from flask import Blueprint, request, jsonify
-import random
-from datetime import datetime
+from flask import Blueprint, Response, request, jsonify
 from bson import ObjectId
-from models import users_collection
+from datetime import datetime  # For timestamps
+import random
+from config import Config
+from models import (posts_collection, reactions_collection, views_collection,
+                    view_sketches_collection, comments_collection, replies_collection, image_store)
+from feed import sample_posts, fetch_cards, summarize_post, top_posts, hot_page, FEED_SIZE
+from hot import hot_score, refresh_hot
+from search import search_index
+from cursors import parse_limit, DEFAULT_PAGE_SIZE
+from cache import post_cache, comments_cache, feed_cache
+from httpcache import post_etag, not_modified
+import comments
+from reactions import toggle_reaction, get_reaction
+from views import record_view
+from counter_buffer import counter_buffer
+from sessions import acting_user
+from jobs import job_queue
+from events import post_events, sse_frame
 
 posts_bp = Blueprint("posts", __name__)
 
+def feed_cards():
+    # Each request draws from a cached pool of sampled cards instead of
+    # running $sample against the collection every time
+    pool = feed_cache.get_or_load("pool", lambda: sample_posts(posts_collection, size=Config.FEED_POOL_SIZE))
+    cards = random.sample(pool, min(FEED_SIZE, len(pool)))
+    return [image_store.add_variants(card) for card in cards]
+
 @posts_bp.route("/posts", methods=["GET"])
 def get_random_posts():
-    users = list(users_collection.find({}, {"posts": 1}))
-    all_posts = []
-    for user in users:
-        all_posts.extend(user.get("posts", []))
-    random.shuffle(all_posts)
-    max_posts = min(10, len(all_posts))
-    return jsonify(all_posts[:max_posts]), 200
+    return jsonify(feed_cards()), 200
+
+@posts_bp.route("/posts/hot", methods=["GET"])
+def get_hot_posts():
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        cards = feed_cache.get_or_load("hot", lambda: top_posts(posts_collection, Config.HOT_FEED_SIZE))
+        page, next_cursor = hot_page(cards, limit, request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"posts": [image_store.add_variants(dict(card)) for card in page], "nextCursor": next_cursor}), 200
 
 @posts_bp.route("/search", methods=["GET"])
 def search_posts():
-    title_query = request.args.get("title", "")
-    if not title_query:
-        return get_random_posts()
-    users = list(users_collection.find({}, {"posts": 1}))
-    matching_posts = []
-    for user in users:
-        for post in user.get("posts", []):
-            if title_query.lower() in post.get("title", "").lower():
-                matching_posts.append(post)
-    random.shuffle(matching_posts)
-    max_posts = min(10, len(matching_posts))
-    return jsonify(matching_posts[:max_posts]), 200
+    # `title` is the original parameter name; the index also covers bodies
+    query = request.args.get("q") or request.args.get("title", "")
+    if not query.strip():
+        return jsonify({"results": feed_cards(), "nextCursor": None}), 200
+    search_index.ensure_loaded(posts_collection.reads)
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        hits, next_cursor = search_index.search(query, limit, request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    results = [image_store.add_variants(card) for card in fetch_cards(posts_collection.reads, [post_id for post_id, _ in hits])]
+    return jsonify({"results": results, "nextCursor": next_cursor}), 200
+
+def load_post(post_id):
+    # The comment thread is served separately by /comments; the hot score
+    # moves without a version bump, so it stays out of the ETagged body
+    return post_cache.get_or_load(
+        post_id, lambda: posts_collection.find_one({"postId": post_id}, {"_id": 0, "comments": 0, "hot": 0})
+    )
 
 @posts_bp.route("/post/<post_id>", methods=["GET"])
 def get_single_post(post_id):
-    user = users_collection.find_one({"posts.postId": post_id})
-    if not user:
+    userId = request.args.get("userId")
+    reaction = None
+    if request.if_none_match:
+        # Revalidation reads only the version stamp, never the body
+        stamp = posts_collection.find_one({"postId": post_id}, {"_id": 0, "version": 1})
+        if stamp is not None:
+            if userId:
+                reaction = get_reaction(reactions_collection, post_id, userId)
+            etag = post_etag(post_id, stamp.get("version"), reaction, bool(userId))
+            matched = not_modified(etag)
+            if matched:
+                response = Response(status=304)
+                response.set_etag(matched)
+                response.cache_control.no_cache = True
+                return response
+    post = load_post(post_id)
+    if not post:
         return jsonify({"message": "Post not found"}), 404
-
-    for post in user.get("posts", []):
-        if post.get("postId") == post_id:
-            return jsonify(post), 200
-    return jsonify({"message": "Post not found"}), 404
+    # Optional: the reader's own reaction, a single indexed lookup
+    if userId:
+        if reaction is None:
+            reaction = get_reaction(reactions_collection, post_id, userId)
+        post["reaction"] = reaction
+    response = jsonify(image_store.add_variants(post))
+    response.set_etag(post_etag(post_id, post.get("version"), reaction, bool(userId)))
+    return response
 
 @posts_bp.route("/user/<user_id>/create-post", methods=["POST"])
 def create_post(user_id):
     try:
-        user_object_id = ObjectId(user_id)
+        ObjectId(user_id)
     except Exception:
         return jsonify({"message": "Invalid user ID format"}), 400
-
-    user = users_collection.find_one({"_id": user_object_id})
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-
+    # Author id and name come from the session token when one is sent
+    user = acting_user(user_id)
     data = request.get_json()
     title = data.get("title")
-    content = data.get("content")
+    content = data.get("content")  # Full HTML content
     image = data.get("image")
 
     if not title or not content:
         return jsonify({"message": "Title and content are required"}), 400
 
+    try:
+        image = image_store.save(image)
+        content = image_store.save_inline(content)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     new_post = {
         "postId": str(ObjectId()),
+        "userId": user["userId"],
         "title": title,
-        "content": content,
+        "content": content,  # Store full HTML content
         "image": image,
         "timestamp": datetime.utcnow().isoformat(),
         "author": user["name"],
-        "comments": []
+        "likes": 0,
+        "dislikes": 0,
+        "views": 0,
+        "commentCount": 0,
+        # Bumped by every write to the post; drives its ETag
+        "version": 1,
+        **summarize_post(content, image)
     }
+    new_post["hot"] = hot_score(new_post)
+
+    posts_collection.insert_one(new_post)
+    search_index.add_post(new_post["postId"], title, content)
 
-    users_collection.update_one(
-        {"_id": user_object_id},
-        {"$push": {"posts": new_post}}
-    )
     return jsonify({"message": "Post created successfully", "postId": new_post["postId"]}), 201
 
+# Updated add-comment endpoint that uses userId to auto-fetch username
 @posts_bp.route("/post/<post_id>/add-comment", methods=["POST"])
 def add_comment(post_id):
-    user = users_collection.find_one({"posts.postId": post_id})
-    if not user:
-        return jsonify({"message": "Post not found"}), 404
-
     data = request.get_json()
-    commenter = data.get("commenter")
+    user = acting_user(data.get("userId"))
     comment_content = data.get("content")
-
-    if not commenter or not comment_content:
-        return jsonify({"message": "Commenter and comment content are required"}), 400
-
+    if not user or not comment_content:
+        return jsonify({"message": "Missing user ID or comment content"}), 400
+    commenter = user["name"]
     new_comment = {
         "commentId": str(ObjectId()),
+        "userId": user["userId"],
         "commenter": commenter,
         "content": comment_content,
-        "timestamp": datetime.utcnow().isoformat(),
-        "replies": []
+        "timestamp": datetime.utcnow().isoformat()
     }
+    comment_count = comments.add_comment(posts_collection, comments_collection, post_id, new_comment)
+    if comment_count is None:
+        return jsonify({"message": "Post not found"}), 404
+    refresh_hot(posts_collection, [post_id])
+    post_cache.invalidate(post_id)
+    comments_cache.invalidate(post_id)
+    new_comment["replyCount"] = 0
+    post_events.publish(post_id, "comment-added", {"comment": new_comment, "commentCount": comment_count})
+    # Enough for the client to patch its state without refetching the post
+    return jsonify({
+        "message": "Comment added successfully",
+        "comment": new_comment,
+        "commentCount": comment_count
+    }), 201
 
-    result = users_collection.update_one(
-        {"posts.postId": post_id},
-        {"$push": {"posts.$.comments": new_comment}}
-    )
-    if result.modified_count > 0:
-        return jsonify({"message": "Comment added successfully", "comment": new_comment}), 201
-    else:
-        return jsonify({"message": "Failed to add comment"}), 400
-
+# Updated add-reply endpoint that uses userId to auto-fetch username
 @posts_bp.route("/post/<post_id>/add-reply", methods=["POST"])
 def add_reply(post_id):
-    user = users_collection.find_one({"posts.postId": post_id})
-    if not user:
-        return jsonify({"message": "Post not found"}), 404
-
     data = request.get_json()
+    user = acting_user(data.get("userId"))
     comment_id = data.get("commentId")
-    replyCommenter = data.get("replyCommenter")
     replyContent = data.get("replyContent")
-
-    if not comment_id or not replyCommenter or not replyContent:
-        return jsonify({"message": "Comment ID, reply commenter, and reply content are required"}), 400
-
+    if not user or not comment_id or not replyContent:
+        return jsonify({"message": "Missing required fields: user ID, comment ID, or reply content"}), 400
+    replyCommenter = user["name"]
     new_reply = {
         "replyId": str(ObjectId()),
+        "userId": user["userId"],
         "replyCommenter": replyCommenter,
         "replyContent": replyContent,
         "timestamp": datetime.utcnow().isoformat()
     }
+    reply_count = comments.add_reply(comments_collection, replies_collection, post_id, comment_id, new_reply)
+    if reply_count is None:
+        return jsonify({"message": "Comment not found"}), 404
+    # The comment's replyCount may be on the cached first page
+    comments_cache.invalidate(post_id)
+    new_reply["commentId"] = comment_id
+    post_events.publish(post_id, "reply-added", {"reply": new_reply, "replyCount": reply_count})
+    return jsonify({
+        "message": "Reply added successfully",
+        "reply": new_reply,
+        "replyCount": reply_count
+    }), 201
 
-    result = users_collection.update_one(
-        {"posts.postId": post_id},
-        {"$push": {"posts.$[post].comments.$[comment].replies": new_reply}},
-        array_filters=[{"post.postId": post_id}, {"comment.commentId": comment_id}]
-    )
-    if result.modified_count > 0:
-        return jsonify({"message": "Reply added successfully", "reply": new_reply}), 201
-    else:
-        return jsonify({"message": "Failed to add reply"}), 400
+@posts_bp.route("/post/<post_id>/comments", methods=["GET"])
+def get_comments(post_id):
+    cursor = request.args.get("cursor")
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        if not cursor and limit == DEFAULT_PAGE_SIZE:
+            # The first page is what every post view asks for
+            page, next_cursor = comments_cache.get_or_load(
+                post_id, lambda: comments.list_comments(comments_collection, post_id, limit)
+            )
+        else:
+            page, next_cursor = comments.list_comments(comments_collection.reads, post_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"comments": page, "nextCursor": next_cursor}), 200
+
+@posts_bp.route("/post/<post_id>/comments/<comment_id>/replies", methods=["GET"])
+def get_replies(post_id, comment_id):
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        page, next_cursor = comments.list_replies(replies_collection.reads, comment_id, limit, request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"replies": page, "nextCursor": next_cursor}), 200
+
+# Server-sent events for one post: comment-added, reply-added and counters
+# deltas, so an open page stays current without refetching. A stream that
+# falls too far behind gets a resync event and is closed; the client
+# refetches and reconnects.
+@posts_bp.route("/post/<post_id>/events", methods=["GET"])
+def post_event_stream(post_id):
+    if not posts_collection.find_one({"postId": post_id}, {"_id": 1}):
+        return jsonify({"message": "Post not found"}), 404
+    subscription = post_events.subscribe(post_id)
+    if subscription is None:
+        # Every stream pins a worker thread; leave the rest for requests
+        response = jsonify({"message": "Too many live streams open, please retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(int(Config.EVENTS_HEARTBEAT_SECONDS))
+        return response
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                frame = subscription.next(Config.EVENTS_HEARTBEAT_SECONDS)
+                if subscription.evicted:
+                    yield sse_frame("resync", {})
+                    return
+                # The keepalive comment also tells the server when the
+                # client has gone away
+                yield frame if frame is not None else ": keepalive\n\n"
+        finally:
+            post_events.unsubscribe(subscription)
+
+    response = Response(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
-@posts_bp.route("/api/user/<user_id>/delete-post/<post_id>", methods=["DELETE"])
+# Toggle Like endpoint with toggle functionality
+@posts_bp.route("/post/<post_id>/toggle-like", methods=["POST"])
+def toggle_like(post_id):
+    data = request.get_json()
+    user = acting_user(data.get("userId"), lookup=False)
+    if not user:
+        return jsonify({"message": "Missing user ID"}), 400
+    userId = user["userId"]
+    state = toggle_reaction(posts_collection, reactions_collection, post_id, userId, "like", counter_buffer)
+    if not state:
+        return jsonify({"message": "Post not found"}), 404
+    if not counter_buffer:
+        # Buffered counters refresh the score and the cached post when they
+        # are flushed; until then the stored post has not changed
+        refresh_hot(posts_collection, [post_id])
+        post_cache.invalidate(post_id)
+    post_events.publish(post_id, "counters", {"likes": state["likes"], "dislikes": state["dislikes"]})
+    message = "Post liked" if state["liked"] else "Like removed"
+    return jsonify({"message": message, **state}), 200
+
+# Toggle Dislike endpoint with toggle functionality
+@posts_bp.route("/post/<post_id>/toggle-dislike", methods=["POST"])
+def toggle_dislike(post_id):
+    data = request.get_json()
+    user = acting_user(data.get("userId"), lookup=False)
+    if not user:
+        return jsonify({"message": "Missing user ID"}), 400
+    userId = user["userId"]
+    state = toggle_reaction(posts_collection, reactions_collection, post_id, userId, "dislike", counter_buffer)
+    if not state:
+        return jsonify({"message": "Post not found"}), 404
+    if not counter_buffer:
+        # Buffered counters refresh the score and the cached post when they
+        # are flushed; until then the stored post has not changed
+        refresh_hot(posts_collection, [post_id])
+        post_cache.invalidate(post_id)
+    post_events.publish(post_id, "counters", {"likes": state["likes"], "dislikes": state["dislikes"]})
+    message = "Post disliked" if state["disliked"] else "Dislike removed"
+    return jsonify({"message": message, **state}), 200
+
+@posts_bp.route("/user/<user_id>/delete-post/<post_id>", methods=["DELETE"])
 def delete_post(user_id, post_id):
     try:
         user_object_id = ObjectId(user_id)
     except Exception:
         return jsonify({"message": "Invalid user ID format"}), 400
+    # Rejects a session token that belongs to someone else
+    acting_user(user_id, lookup=False)
+    result = posts_collection.delete_one({"postId": post_id, "userId": str(user_object_id)})
+    if result.deleted_count > 0:
+        search_index.remove_post(post_id)
+        post_cache.invalidate(post_id)
+        comments_cache.invalidate(post_id)
+        feed_cache.invalidate("pool", "hot")
+        # Reactions, views and the comment thread are removed in the background
+        job_id = job_queue.enqueue("cleanup-post", {"postId": post_id})
+        return jsonify({"message": "Post deleted successfully", "jobId": job_id}), 200
+    else:
+        return jsonify({"message": "Failed to delete post"}), 400
 
-    result = users_collection.update_one(
-        {"_id": user_object_id},
-        {"$pull": {"posts": {"postId": post_id}}}
+#Increment view count only if user hasn't viewed before
+@posts_bp.route("/post/<post_id>/add-view", methods=["POST"])
+def add_view(post_id):
+    data = request.get_json()
+    user = acting_user(data.get("userId"), lookup=False)
+    if not user:
+        return jsonify({"message": "Missing user ID"}), 400
+    userId = user["userId"]
+    if counter_buffer:
+        # A view of a missing post would only be dropped at flush time. The
+        # page's own GET has usually just put the post in the cache.
+        if load_post(post_id) is None:
+            return jsonify({"message": "Post not found"}), 404
+        # Deduped per window here, against the views store at flush time
+        if counter_buffer.add_view(post_id, userId):
+            return jsonify({"message": "View recorded"}), 202
+        return jsonify({"message": "View already counted"}), 200
+    counted = record_view(
+        posts_collection, views_collection, view_sketches_collection,
+        post_id, userId, mode=Config.VIEW_COUNTING
+    )
+    if counted is None:
+        return jsonify({"message": "Post not found"}), 404
+    if counted:
+        post_events.publish_counters(refresh_hot(posts_collection, [post_id]))
+        post_cache.invalidate(post_id)
+        return jsonify({"message": "View added"}), 200
+    return jsonify({"message": "View already counted"}), 200
+
+# Endpoint to update a specific post
+@posts_bp.route("/user/<user_id>/update-post/<post_id>", methods=["PUT"])
+def update_post(user_id, post_id):
+    try:
+        user_object_id = ObjectId(user_id)
+    except Exception:
+        return jsonify({"message": "Invalid user ID format"}), 400
+    # Rejects a session token that belongs to someone else
+    acting_user(user_id, lookup=False)
+    data = request.get_json()
+    update_fields = {}
+    if "title" in data:
+        update_fields["title"] = data["title"]
+    try:
+        if "content" in data:
+            update_fields["content"] = image_store.save_inline(data["content"])
+        if "image" in data:
+            update_fields["image"] = image_store.save(data["image"])
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if not update_fields:
+        return jsonify({"message": "No fields to update"}), 400
+
+    if "content" in update_fields or "image" in update_fields:
+        # The summary depends on both, so fetch whichever one is unchanged
+        current = {}
+        if "content" not in update_fields or "image" not in update_fields:
+            current = posts_collection.find_one(
+                {"postId": post_id, "userId": str(user_object_id)}, {"_id": 0, "content": 1, "image": 1}
+            ) or {}
+        update_fields.update(summarize_post(
+            update_fields.get("content", current.get("content")), update_fields.get("image", current.get("image"))
+        ))
+
+    result = posts_collection.update_one(
+        {"postId": post_id, "userId": str(user_object_id)},
+        {"$set": update_fields, "$inc": {"version": 1}}
     )
     if result.modified_count > 0:
-        return jsonify({"message": "Post deleted successfully"}), 200
+        post_cache.invalidate(post_id)
+        # Cards carry the title, image and an excerpt of the content
+        feed_cache.invalidate("pool", "hot")
+        if "title" in update_fields or "content" in update_fields:
+            post = posts_collection.find_one({"postId": post_id}, {"title": 1, "content": 1})
+            if post:
+                search_index.add_post(post_id, post.get("title", ""), post.get("content", ""))
+        return jsonify({"message": "Post updated successfully"}), 200
     else:
-        return jsonify({"message": "Failed to delete post"}), 400
+        return jsonify({"message": "No changes made or post not found"}), 200
+
+@posts_bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify({cache.name: cache.info() for cache in (post_cache, comments_cache, feed_cache)}), 200
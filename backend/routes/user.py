@@ -1,6 +1,11 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify
 from bson import ObjectId
-from models import users_collection
+from models import users_collection, posts_collection, image_store
+from feed import list_user_posts, parse_fields
+from cursors import parse_limit
+from cache import user_cache
+from sessions import acting_user, token_user, session_tokens
+from jobs import job_queue
 
 user_bp = Blueprint("user", __name__)
 
@@ -10,11 +15,15 @@ def get_user(user_id):
         user_object_id = ObjectId(user_id)
     except Exception:
         return jsonify({"message": "Invalid user ID format"}), 400
-
-    user = users_collection.find_one({"_id": user_object_id})
+    user = users_collection.reads.find_one({"_id": user_object_id})
     if not user:
         return jsonify({"message": "User not found"}), 404
-
+    try:
+        projection = parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    # Only the first page of post summaries; the rest via /posts?cursor=
+    posts, next_cursor = list_user_posts(posts_collection.reads, str(user["_id"]), projection=projection)
     return jsonify({
         "id": str(user["_id"]),
         "name": user["name"],
@@ -23,5 +32,75 @@ def get_user(user_id):
         "education": user.get("education"),
         "occupation": user.get("occupation"),
         "profileImage": user.get("profileImage"),
-        "posts": user.get("posts", [])
+        "profileImageVariants": image_store.variant_urls(user.get("profileImage")),
+        "posts": [image_store.add_variants(post) for post in posts],
+        "nextCursor": next_cursor
+    }), 200
+
+@user_bp.route("/user/<user_id>/posts", methods=["GET"])
+def get_user_posts(user_id):
+    try:
+        ObjectId(user_id)
+    except Exception:
+        return jsonify({"message": "Invalid user ID format"}), 400
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        projection = parse_fields(request.args.get("fields"))
+        posts, next_cursor = list_user_posts(
+            posts_collection.reads, user_id, limit, request.args.get("cursor"), projection
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({
+        "posts": [image_store.add_variants(post) for post in posts],
+        "nextCursor": next_cursor
     }), 200
+
+@user_bp.route("/user/<user_id>/update", methods=["PUT"])
+def update_user(user_id):
+    try:
+        user_object_id = ObjectId(user_id)
+    except Exception:
+        return jsonify({"message": "Invalid user ID format"}), 400
+    # Rejects a session token that belongs to someone else
+    acting_user(user_id, lookup=False)
+
+    data = request.get_json()
+    # Only update these fields (email is not allowed to change)
+    update_fields = {}
+    if "name" in data:
+        update_fields["name"] = data["name"]
+    if "phone" in data:
+        update_fields["phone"] = data["phone"]
+    if "education" in data:
+        update_fields["education"] = data["education"]
+    if "occupation" in data:
+        update_fields["occupation"] = data["occupation"]
+    if "profileImage" in data:
+        try:
+            update_fields["profileImage"] = image_store.save(data["profileImage"])
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+    if not update_fields:
+        return jsonify({"message": "No fields to update"}), 400
+
+    result = users_collection.update_one({"_id": user_object_id}, {"$set": update_fields})
+    if result.modified_count > 0:
+        user_cache.invalidate(user_id)
+        body = {"message": "User updated successfully"}
+        if "profileImage" in update_fields:
+            # The stored URL replaces the uploaded data URL on the client,
+            # along with the variants to render from
+            body["profileImage"] = update_fields["profileImage"]
+            body["profileImageVariants"] = image_store.variant_urls(update_fields["profileImage"])
+        if "name" in update_fields:
+            # Posts and comments carry a copy of the name; rewrite them in
+            # the background
+            body["jobId"] = job_queue.enqueue("rename-author", {"userId": user_id})
+            if token_user():
+                # The old token still carries the old name the client shows
+                body["token"] = session_tokens.issue(user_id, update_fields["name"])
+        return jsonify(body), 200
+    else:
+        return jsonify({"message": "No changes made"}), 200
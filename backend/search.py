@@ -0,0 +1,177 @@
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from config import Config
+from cursors import encode_cursor, decode_cursor, NUMBER, DEFAULT_PAGE_SIZE
+from html_text import html_to_text
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# A title hit counts as this many body hits
+TITLE_BOOST = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Cap on how many index terms a search-as-you-type prefix may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+class SearchIndex:
+    # In-process inverted index over post titles and plain-text bodies.
+    # Postings map term -> {postId: weighted term frequency}; a sorted term
+    # list serves prefix lookups with bisect.
+    def __init__(self, refresh_seconds=0):
+        self.lock = threading.RLock()
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at = None
+        self.refreshing = False
+        self._reset()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A refresh thread running in the parent does not exist in the child
+        self.lock = threading.RLock()
+        self.refreshing = False
+
+    def _reset(self):
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_len = {}
+        self.total_len = 0
+        self.sorted_terms = []
+
+    def _add(self, post_id, title, content):
+        freqs = {}
+        for term in tokenize(title):
+            freqs[term] = freqs.get(term, 0) + TITLE_BOOST
+        for term in tokenize(html_to_text(content)):
+            freqs[term] = freqs.get(term, 0) + 1
+        for term, tf in freqs.items():
+            bucket = self.postings.get(term)
+            if bucket is None:
+                bucket = self.postings[term] = {}
+                bisect.insort(self.sorted_terms, term)
+            bucket[post_id] = tf
+        length = sum(freqs.values())
+        self.doc_terms[post_id] = list(freqs)
+        self.doc_len[post_id] = length
+        self.total_len += length
+
+    def _remove(self, post_id):
+        terms = self.doc_terms.pop(post_id, None)
+        if terms is None:
+            return
+        self.total_len -= self.doc_len.pop(post_id, 0)
+        for term in terms:
+            bucket = self.postings.get(term)
+            if bucket is None:
+                continue
+            bucket.pop(post_id, None)
+            if not bucket:
+                del self.postings[term]
+                i = bisect.bisect_left(self.sorted_terms, term)
+                if i < len(self.sorted_terms) and self.sorted_terms[i] == term:
+                    del self.sorted_terms[i]
+
+    def add_post(self, post_id, title, content):
+        with self.lock:
+            self._remove(post_id)
+            self._add(post_id, title, content)
+
+    def remove_post(self, post_id):
+        with self.lock:
+            self._remove(post_id)
+
+    def build(self, collection):
+        fresh = SearchIndex()
+        for post in collection.find({}, {"_id": 0, "postId": 1, "title": 1, "content": 1}):
+            fresh._add(post["postId"], post.get("title", ""), post.get("content", ""))
+        with self.lock:
+            self.postings = fresh.postings
+            self.doc_terms = fresh.doc_terms
+            self.doc_len = fresh.doc_len
+            self.total_len = fresh.total_len
+            self.sorted_terms = fresh.sorted_terms
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self, collection):
+        # The first query builds the index; with refresh_seconds set, later
+        # queries rebuild it in the background so writes made by other worker
+        # processes eventually show up here too
+        if self.loaded_at is None:
+            with self.lock:
+                if self.loaded_at is None:
+                    self.build(collection)
+            return
+        if not self.refresh_seconds or self.refreshing:
+            return
+        if time.monotonic() - self.loaded_at < self.refresh_seconds:
+            return
+        self.refreshing = True
+
+        def refresh():
+            try:
+                self.build(collection)
+            finally:
+                self.refreshing = False
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _expand_prefix(self, prefix):
+        start = bisect.bisect_left(self.sorted_terms, prefix)
+        matches = []
+        for term in self.sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        if len(matches) > MAX_PREFIX_EXPANSIONS:
+            # Keep the most common completions
+            matches = heapq.nlargest(MAX_PREFIX_EXPANSIONS, matches, key=lambda t: len(self.postings[t]))
+        return matches
+
+    def _bm25(self, term, scores_for_token):
+        bucket = self.postings.get(term)
+        if not bucket:
+            return
+        n_docs = len(self.doc_len)
+        avg_len = self.total_len / n_docs if n_docs else 0
+        idf = math.log(1 + (n_docs - len(bucket) + 0.5) / (len(bucket) + 0.5))
+        for post_id, tf in bucket.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[post_id] / avg_len) if avg_len else BM25_K1
+            score = idf * tf * (BM25_K1 + 1) / (tf + norm)
+            # A prefix token scores as its best-matching completion
+            if score > scores_for_token.get(post_id, 0):
+                scores_for_token[post_id] = score
+
+    def search(self, query, limit=DEFAULT_PAGE_SIZE, cursor=None, prefix=True):
+        tokens = tokenize(query)
+        if not tokens:
+            return [], None
+        with self.lock:
+            totals = {}
+            for i, token in enumerate(tokens):
+                scores_for_token = {}
+                if prefix and i == len(tokens) - 1:
+                    for term in self._expand_prefix(token):
+                        self._bm25(term, scores_for_token)
+                else:
+                    self._bm25(token, scores_for_token)
+                for post_id, score in scores_for_token.items():
+                    totals[post_id] = totals.get(post_id, 0) + score
+
+        ranked = ((-score, post_id) for post_id, score in totals.items())
+        if cursor:
+            last_score, last_id = decode_cursor(cursor, NUMBER, str)
+            after = (-last_score, last_id)
+            ranked = (item for item in ranked if item > after)
+        page = heapq.nsmallest(limit + 1, ranked)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(-page[-1][0], page[-1][1])
+        return [(post_id, -neg_score) for neg_score, post_id in page], next_cursor
+
+search_index = SearchIndex(refresh_seconds=Config.SEARCH_REFRESH_SECONDS)
@@ -0,0 +1,80 @@
+import secrets
+from bson import ObjectId
+from flask import g, request
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from config import Config
+from models import users_collection
+from cache import user_cache
+
+class SessionError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class SessionTokens:
+    # Compact signed token carrying the user id (and, for the client, the
+    # display name at login), issued at login. Verifying it is an HMAC check
+    # plus an age check: no database round trip.
+    def __init__(self, secret, max_age):
+        self.serializer = URLSafeTimedSerializer(secret, salt="session")
+        self.max_age = max_age
+
+    def issue(self, user_id, name):
+        return self.serializer.dumps({"uid": user_id, "name": name})
+
+    def verify(self, token):
+        try:
+            data = self.serializer.loads(token, max_age=self.max_age)
+        except SignatureExpired:
+            raise SessionError("Session expired, please log in again", 401)
+        except BadSignature:
+            raise SessionError("Invalid session token", 401)
+        return {"userId": data["uid"], "name": data["name"]}
+
+# Without SECRET_KEY (debug only, see create_app) tokens are signed with a
+# throwaway key that no other process shares
+session_tokens = SessionTokens(Config.SECRET_KEY or secrets.token_hex(32), int(Config.SESSION_HOURS * 3600))
+
+def token_user():
+    # Identity of the request's bearer token, or None when none was sent
+    if "session_user" not in g:
+        header = request.headers.get("Authorization", "")
+        g.session_user = session_tokens.verify(header[7:]) if header.startswith("Bearer ") else None
+    return g.session_user
+
+def user_snippet(user_id):
+    # {userId, name, profileImage}, or None for an unknown user
+    try:
+        object_id = ObjectId(user_id)
+    except Exception:
+        return None
+    def load():
+        user = users_collection.find_one({"_id": object_id}, {"name": 1, "profileImage": 1})
+        if user is None:
+            return None
+        return {"userId": user_id, "name": user.get("name"), "profileImage": user.get("profileImage")}
+    return user_cache.get_or_load(user_id, load)
+
+def acting_user(claimed_id, lookup=True):
+    # The user a write acts as. With a token that is the token's identity,
+    # which must agree with claimed_id when the route names a user. Without
+    # one (clients from before tokens) it is claimed_id. When the route needs
+    # the name it comes from the snippet cache, never the token: a token
+    # keeps the name its user had at login, and the rename job would not
+    # catch writes made under it later. None if no user was given.
+    user = token_user()
+    if user is not None:
+        if claimed_id and claimed_id != user["userId"]:
+            raise SessionError("Session does not match this user", 403)
+        claimed_id = user["userId"]
+    elif Config.REQUIRE_SESSION_TOKEN:
+        raise SessionError("Login required", 401)
+    if not claimed_id:
+        return None
+    if not lookup:
+        return {"userId": claimed_id, "name": None}
+    snippet = user_snippet(claimed_id)
+    if snippet is None:
+        raise SessionError("User not found", 404)
+    return snippet
@@ -0,0 +1,70 @@
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import Config
+from models import (users_collection, posts_collection, reactions_collection, views_collection,
+                    view_sketches_collection, comments_collection, replies_collection)
+from cache import post_cache, comments_cache, feed_cache
+from jobs import job_queue
+
+# Fan-out work queued by the request path. Every handler works in batches,
+# reports progress per batch, and is idempotent: a retried or re-claimed job
+# redoes only what is still left.
+
+# (collection, name field) pairs that copy a user's display name
+NAME_COPIES = [
+    (posts_collection, "author"),
+    (comments_collection, "commenter"),
+    (replies_collection, "replyCommenter"),
+]
+
+@job_queue.handler("rename-author")
+def rename_author(job):
+    user_id = job.payload["userId"]
+    user = users_collection.find_one({"_id": ObjectId(user_id)}, {"name": 1})
+    if user is None:
+        return
+    # Comments and replies are matched by userId. Those written before it was
+    # stored only carry one once `migrate_posts.py authors` has linked them;
+    # ones it could not resolve (no user or several users with the name)
+    # keep the name they were written under.
+    # Always the current name, so an older job that runs late cannot undo a
+    # newer rename
+    name = user.get("name")
+    for collection, field in NAME_COPIES:
+        while True:
+            docs = list(collection.find(
+                {"userId": user_id, field: {"$ne": name}}, {"_id": 1, "postId": 1}
+            ).limit(Config.JOB_BATCH_SIZE))
+            if not docs:
+                break
+            update = {"$set": {field: name}}
+            if collection is posts_collection:
+                update["$inc"] = {"version": 1}
+            collection.bulk_write([UpdateOne({"_id": doc["_id"], field: {"$ne": name}}, update) for doc in docs], ordered=False)
+            post_ids = {doc["postId"] for doc in docs}
+            post_cache.invalidate(*post_ids)
+            comments_cache.invalidate(*post_ids)
+            job.progress(**{field: len(docs)})
+    feed_cache.invalidate("pool", "hot")
+
+# Collections holding per-post data that outlives a deleted post
+POST_DATA = [
+    reactions_collection,
+    views_collection,
+    view_sketches_collection,
+    replies_collection,
+    comments_collection,
+]
+
+@job_queue.handler("cleanup-post")
+def cleanup_post(job):
+    post_id = job.payload["postId"]
+    for collection in POST_DATA:
+        while True:
+            ids = [doc["_id"] for doc in collection.find({"postId": post_id}, {"_id": 1}).limit(Config.JOB_BATCH_SIZE)]
+            if not ids:
+                break
+            collection.delete_many({"_id": {"$in": ids}})
+            job.progress(**{collection.name: len(ids)})
+    post_cache.invalidate(post_id)
+    comments_cache.invalidate(post_id)
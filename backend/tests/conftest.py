@@ -0,0 +1,12 @@
+import os
+import sys
+import pytest
+
+# Run from anywhere: the backend modules import each other top-level
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def db():
+    # A fresh in-memory database per test (mongomock, as used by bench/)
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().db
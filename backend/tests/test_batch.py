@@ -0,0 +1,80 @@
+import pytest
+from bson import ObjectId
+from flask import Flask, jsonify
+from config import Config
+import sessions
+import routes.batch
+
+@pytest.fixture
+def client(db, monkeypatch):
+    # The batch blueprint on the test db, writing counters straight through
+    for attr, collection in list(vars(routes.batch).items()):
+        if attr.endswith("_collection"):
+            monkeypatch.setattr(routes.batch, attr, db[collection.name])
+    monkeypatch.setattr(sessions, "users_collection", db.users)
+    monkeypatch.setattr(routes.batch, "counter_buffer", None)
+    monkeypatch.setattr(Config, "VIEW_COUNTING", "exact")
+    app = Flask(__name__)
+    app.register_blueprint(routes.batch.batch_bp, url_prefix="/api")
+    app.register_error_handler(sessions.SessionError, lambda e: (jsonify({"message": e.message}), e.status))
+    return app.test_client()
+
+def run(client, operations, user_id=None):
+    response = client.post("/api/batch", json={"userId": user_id, "operations": operations})
+    return response.status_code, response.get_json()
+
+def statuses(body):
+    return [r["status"] for r in body["results"]]
+
+@pytest.mark.parametrize("operations", [None, [], ["add-view"], {"op": "get-posts"}])
+def test_operations_must_be_a_list_of_objects(client, operations):
+    assert run(client, operations)[0] == 400
+
+def test_batch_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(Config, "BATCH_MAX_OPERATIONS", 2)
+    assert run(client, [{"op": "get-posts", "postIds": []}] * 3)[0] == 400
+    assert run(client, [{"op": "get-posts", "postIds": ["a", "b", "c"]}])[0] == 400
+
+def test_bad_operations_fail_alone(client, db):
+    db.posts.insert_one({"postId": "p", "title": "t"})
+    status, body = run(client, [
+        {"op": "shout"},
+        {"op": "get-posts", "postIds": "p"},
+        {"op": "add-view", "postId": "p"},
+        {"op": "get-posts", "postIds": ["p", "gone"]},
+    ])
+    assert status == 200
+    assert statuses(body) == [400, 400, 400, 200]
+    assert body["results"][3]["body"]["missing"] == ["gone"]
+
+def test_writes_apply_before_reads(client, db):
+    user_id = str(db.users.insert_one({"name": "Ada"}).inserted_id)
+    db.posts.insert_one({"postId": "p", "likes": 0, "dislikes": 0, "views": 0, "commentCount": 0})
+    status, body = run(client, [
+        {"op": "get-posts", "postIds": ["p"]},
+        {"op": "add-view", "postId": "p"},
+        {"op": "add-view", "postId": "p"},
+        {"op": "toggle-like", "postId": "p"},
+        {"op": "add-comment", "postId": "p", "content": "hi"},
+        {"op": "add-comment", "postId": "gone", "content": "hi"},
+    ], user_id=user_id)
+    assert statuses(body) == [200, 200, 200, 200, 201, 404]
+    assert [r["body"]["message"] for r in body["results"][1:3]] == ["View added", "View already counted"]
+    post = body["results"][0]["body"]["posts"][0]
+    assert (post["views"], post["likes"], post["commentCount"], post["reaction"]) == (1, 1, 1, "like")
+    assert db.comments.find_one({"postId": "p"})["commenter"] == "Ada"
+
+def test_writes_need_a_user(client, db):
+    db.posts.insert_one({"postId": "p"})
+    assert statuses(run(client, [{"op": "add-view", "postId": "p"}])[1]) == [400]
+    assert run(client, [{"op": "add-comment", "postId": "p", "content": "hi"}], user_id=str(ObjectId()))[0] == 404
+
+def test_ids_must_be_strings(client, db):
+    db.posts.insert_one({"postId": "p"})
+    status, body = run(client, [
+        {"op": "add-view", "postId": {"$ne": None}},
+        {"op": "toggle-like", "postId": ["p"]},
+        {"op": "get-posts", "postIds": ["p", {"$gt": ""}]},
+    ], user_id=str(ObjectId()))
+    assert statuses(body) == [400, 400, 400]
+    assert run(client, [{"op": "add-view", "postId": "p"}], user_id={"$ne": None})[0] == 400
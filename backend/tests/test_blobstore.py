@@ -0,0 +1,42 @@
+import base64
+import pytest
+from blobstore import FilesystemBlobStore, ImageStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 32
+
+def data_url(content_type, data):
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(FilesystemBlobStore(str(tmp_path)), "http://blog.test")
+
+def test_image_is_stored_under_its_digest(store):
+    url = store.save(data_url("image/png", PNG))
+    digest = store.digest_of(url)
+    blob = store.blobs.open(digest)
+    with blob.fileobj:
+        assert blob.fileobj.read() == PNG
+    assert blob.content_type == "image/png"
+    # Identical uploads share the blob
+    assert store.save(data_url("image/png", PNG)) == url
+
+def test_content_type_comes_from_the_bytes(store):
+    blob = store.blobs.open(store.digest_of(store.save(data_url("image/png", JPEG))))
+    blob.fileobj.close()
+    assert blob.content_type == "image/jpeg"
+
+@pytest.mark.parametrize("value", [
+    "data:image/png;base64,@@@",
+    "data:image/png;base64,",
+    data_url("image/png", b"<svg onload=alert(1)>"),
+    data_url("text/html", PNG),
+])
+def test_malformed_or_non_image_uploads_are_rejected(store, value):
+    with pytest.raises(ValueError):
+        store.save(value)
+
+def test_urls_and_empty_values_pass_through(store):
+    assert store.save("http://blog.test/api/images/" + "a" * 64) == "http://blog.test/api/images/" + "a" * 64
+    assert store.save(None) is None
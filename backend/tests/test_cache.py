@@ -0,0 +1,105 @@
+import threading
+import time
+import pytest
+from cache import Cache, LocalBackend
+
+@pytest.fixture
+def cache():
+    return Cache("test", ttl=60, max_entries=100, max_bytes=1 << 20)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def test_concurrent_misses_share_one_load(cache):
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return {"value": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.info()["coalesced"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == [{"value": 1}] * 5
+    assert cache.get_or_load("k", lambda: pytest.fail("should be cached")) == {"value": 1}
+
+def test_load_error_reaches_every_waiter_and_is_not_cached(cache):
+    release = threading.Event()
+
+    def loader():
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load("k", loader)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.info()["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 3
+    assert cache.get_or_load("k", lambda: {"value": 2}) == {"value": 2}
+
+def test_invalidation_during_a_load_keeps_its_result_out(cache):
+    started, release = threading.Event(), threading.Event()
+
+    def stale_loader():
+        started.set()
+        release.wait(5)
+        return {"value": "stale"}
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(cache.get_or_load("k", stale_loader)))
+    thread.start()
+    started.wait(5)
+    cache.invalidate("k")
+    release.set()
+    thread.join(5)
+    # The caller still gets what it loaded, but nobody else does
+    assert result == [{"value": "stale"}]
+    assert cache.get_or_load("k", lambda: {"value": "fresh"}) == {"value": "fresh"}
+
+def test_none_is_returned_but_not_cached(cache):
+    assert cache.get_or_load("k", lambda: None) is None
+    assert cache.get_or_load("k", lambda: {"value": 1}) == {"value": 1}
+
+def test_least_recently_used_entry_is_evicted():
+    cache = Cache("test", ttl=60, max_entries=2, max_bytes=1 << 20)
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("b", lambda: 2)
+    cache.get_or_load("a", lambda: pytest.fail("should be cached"))
+    cache.get_or_load("c", lambda: 3)
+    assert cache.get_or_load("b", lambda: "reloaded") == "reloaded"
+    assert cache.info()["evictions"] >= 1
+
+def test_expired_entries_are_reloaded():
+    cache = Cache("test", ttl=0, max_entries=100, max_bytes=1 << 20)
+    cache.get_or_load("k", lambda: 1)
+    assert cache.get_or_load("k", lambda: 2) == 2
+
+def test_shared_backend_serves_other_processes_and_sees_invalidation():
+    backend = LocalBackend()
+    first, second, third = (Cache("test", ttl=60, max_entries=100, max_bytes=1 << 20, backend=backend) for _ in range(3))
+    first.get_or_load("k", lambda: {"value": 1})
+    assert second.get_or_load("k", lambda: pytest.fail("should come from the backend")) == {"value": 1}
+    first.invalidate("k")
+    assert third.get_or_load("k", lambda: {"value": 2}) == {"value": 2}
@@ -0,0 +1,99 @@
+import pytest
+from pymongo.errors import PyMongoError
+from counter_buffer import CounterBuffer
+
+class FailingWrites:
+    # Collection wrapper whose next `failures` bulk_write calls raise
+    def __init__(self, collection, failures):
+        self.collection = collection
+        self.failures = failures
+
+    def bulk_write(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise PyMongoError("simulated outage")
+        return self.collection.bulk_write(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self.collection, attr)
+
+@pytest.fixture
+def buffer(db):
+    # The tests flush by hand; the interval keeps the thread out of the way
+    buffer = CounterBuffer(db.posts, db.views, db.view_sketches, flush_interval=3600)
+    yield buffer
+    buffer.stop()
+
+def test_flush_folds_a_window_into_the_counters(db, buffer):
+    db.posts.insert_many([{"postId": "a", "likes": 0, "views": 0}, {"postId": "b", "likes": 5, "views": 0}])
+    buffer.add_delta("a", "likes", 1)
+    buffer.add_delta("a", "likes", 1)
+    buffer.add_delta("b", "likes", -1)
+    assert buffer.add_view("a", "u1") is True
+    assert buffer.add_view("a", "u1") is False
+    assert buffer.pending("a") == {"likes": 2}
+    buffer.flush()
+    a, b = db.posts.find_one({"postId": "a"}), db.posts.find_one({"postId": "b"})
+    assert (a["likes"], a["views"], b["likes"]) == (2, 1, 4)
+    assert db.views.count_documents({}) == 1
+    assert buffer.pending("a") == {}
+
+def test_views_are_deduped_against_earlier_windows(db, buffer):
+    db.posts.insert_one({"postId": "a", "views": 0})
+    buffer.add_view("a", "u1")
+    buffer.flush()
+    # A new window accepts the reader again; the views store rejects it
+    assert buffer.add_view("a", "u1") is True
+    buffer.flush()
+    assert db.posts.find_one({"postId": "a"})["views"] == 1
+
+def test_views_of_missing_posts_are_dropped(db, buffer):
+    buffer.add_view("gone", "u1")
+    buffer.flush()
+    assert db.views.count_documents({}) == 0
+
+def test_legacy_viewers_are_not_counted_again(db, buffer):
+    db.posts.insert_one({"postId": "a", "views": 1, "viewedBy": ["u1"]})
+    buffer.add_view("a", "u1")
+    buffer.add_view("a", "u2")
+    buffer.flush()
+    assert db.posts.find_one({"postId": "a"})["views"] == 2
+
+def test_failed_flush_requeues_the_window(db):
+    db.posts.insert_one({"postId": "a", "likes": 0, "views": 0})
+    buffer = CounterBuffer(FailingWrites(db.posts, failures=1), db.views, db.view_sketches, flush_interval=3600)
+    buffer.add_delta("a", "likes", 3)
+    buffer.add_view("a", "u1")
+    with pytest.raises(PyMongoError):
+        buffer.flush()
+    assert db.posts.find_one({"postId": "a"})["likes"] == 0
+    assert buffer.pending("a")["likes"] == 3
+    # The view record landed before the failure; the retry still counts it
+    # exactly once
+    buffer.add_delta("a", "likes", 1)
+    buffer.flush()
+    post = db.posts.find_one({"postId": "a"})
+    assert (post["likes"], post["views"]) == (4, 1)
+    assert buffer.pending("a") == {}
+    buffer.stop()
+    assert db.posts.find_one({"postId": "a"})["views"] == 1
+
+def test_approximate_mode_merges_registers(db):
+    db.posts.insert_one({"postId": "a", "views": 0})
+    buffer = CounterBuffer(db.posts, db.views, db.view_sketches, flush_interval=3600, view_mode="approximate")
+    assert buffer.add_view("a", "u1") is True
+    assert buffer.add_view("a", "u1") is False
+    buffer.add_view("a", "u2")
+    buffer.stop()
+    assert db.posts.find_one({"postId": "a"})["views"] == 2
+
+def test_flush_reports_the_posts_it_changed(db):
+    flushed = []
+    buffer = CounterBuffer(db.posts, db.views, db.view_sketches, flush_interval=3600, on_flush=flushed.append)
+    db.posts.insert_many([{"postId": "a", "views": 0}, {"postId": "b", "likes": 0}])
+    buffer.add_view("a", "u1")
+    buffer.add_delta("b", "likes", 1)
+    buffer.flush()
+    # Nothing buffered, nothing reported
+    buffer.stop()
+    assert flushed == [{"a", "b"}]
@@ -0,0 +1,34 @@
+import base64
+import json
+import pytest
+from cursors import parse_limit, encode_cursor, decode_cursor, MAX_PAGE_SIZE, NUMBER
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+def test_cursor_round_trips():
+    cursor = encode_cursor("2024-01-01T00:00:00", "post-1")
+    assert decode_cursor(cursor, str, str) == ["2024-01-01T00:00:00", "post-1"]
+    assert decode_cursor(encode_cursor(1.5, "p"), NUMBER, str) == [1.5, "p"]
+
+@pytest.mark.parametrize("cursor", ["not base64!", raw_cursor({"a": 1}), raw_cursor(["only one"]), ""])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, str, str)
+
+@pytest.mark.parametrize("values", [[{"$ne": None}, "p"], ["t", {"$gt": ""}], [True, "p"], [1, "p"]])
+def test_values_of_the_wrong_type_are_rejected(values):
+    # Anything but the expected scalars could act as a query operator
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor(values), str, str)
+
+def test_booleans_are_not_numbers():
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor([True, "p"]), NUMBER, str)
+
+def test_limit_is_clamped():
+    assert parse_limit(None) == 10
+    assert parse_limit("0") == 1
+    assert parse_limit("1000") == MAX_PAGE_SIZE
+    with pytest.raises(ValueError):
+        parse_limit("ten")
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+from events import EventBus
+
+def test_async_stream_is_woken_by_a_publish_from_another_thread():
+    bus = EventBus()
+
+    async def listen():
+        subscription = bus.subscribe("a", loop=asyncio.get_running_loop())
+        # The publisher is a request thread, as with the mounted Flask app
+        threading.Timer(0.05, bus.publish, ("a", "counters", {"likes": 1})).start()
+        try:
+            return await subscription.next_async(5), await subscription.next_async(0.05)
+        finally:
+            bus.unsubscribe(subscription)
+
+    frame, idle = asyncio.run(listen())
+    assert frame == 'event: counters\ndata: {"likes":1}\n\n'
+    assert idle is None
+    assert bus.info()["streams"] == 0
+
+def test_blocking_streams_are_capped_per_process():
+    bus = EventBus(max_streams=1)
+    first = bus.subscribe("a")
+    assert bus.subscribe("b") is None
+    # Streams on a loop do not hold a thread and are not counted
+    loop = asyncio.new_event_loop()
+    assert bus.subscribe("b", loop=loop) is not None
+    loop.close()
+    bus.unsubscribe(first)
+    bus.unsubscribe(first)
+    assert bus.subscribe("b") is not None
+    assert bus.info()["refused"] == 1
+
+def test_a_lagging_subscriber_is_evicted_once():
+    bus = EventBus(max_pending=1, max_streams=1)
+    subscription = bus.subscribe("a")
+    bus.publish("a", "counters", {"likes": 1})
+    bus.publish("a", "counters", {"likes": 2})
+    assert subscription.evicted and bus.info()["evicted"] == 1
+    # The stream closing afterwards does not free a second slot
+    bus.unsubscribe(subscription)
+    assert bus.subscribe("a") is not None
+    assert bus.subscribe("b") is None
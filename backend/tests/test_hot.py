@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+import pytest
+from cache import feed_cache
+from cursors import encode_cursor
+from feed import hot_page
+from hot import hot_score, refresh_hot, DECAY_SECONDS
+
+def card(post_id, hot):
+    return {"postId": post_id, "hot": hot}
+
+def test_newer_post_outranks_ten_times_the_engagement():
+    then = datetime(2025, 1, 1)
+    old = {"likes": 99, "timestamp": then.isoformat()}
+    new = {"likes": 9, "timestamp": (then + timedelta(seconds=DECAY_SECONDS + 60)).isoformat()}
+    assert hot_score(new) > hot_score(old)
+
+def test_refresh_rescores_only_the_given_posts(db):
+    db.posts.insert_many([{"postId": "a", "likes": 5}, {"postId": "b", "likes": 5}])
+    refresh_hot(db.posts, ["a"])
+    assert db.posts.find_one({"postId": "a"})["hot"] == hot_score({"likes": 5})
+    assert "hot" not in db.posts.find_one({"postId": "b"})
+
+def test_pages_stay_put_when_the_list_is_refreshed():
+    cards = [card("e", 5), card("d", 4), card("c", 3), card("b", 2), card("a", 1)]
+    first, cursor = hot_page(cards, limit=2)
+    assert [c["postId"] for c in first] == ["e", "d"]
+    # A new post jumps to the top between requests
+    second, cursor = hot_page([card("f", 9)] + cards, limit=2, cursor=cursor)
+    assert [c["postId"] for c in second] == ["c", "b"]
+    last, cursor = hot_page(cards, limit=2, cursor=cursor)
+    assert [c["postId"] for c in last] == ["a"] and cursor is None
+
+@pytest.mark.parametrize("values", [("x", "a"), (1, 2), (True, "a")])
+def test_mistyped_cursor_is_invalid(values):
+    with pytest.raises(ValueError):
+        hot_page([card("a", 1)], cursor=encode_cursor(*values))
+
+def test_feed_pool_and_hot_list_do_not_evict_each_other():
+    feed_cache.get_or_load("pool", lambda: [card("p", 0)])
+    feed_cache.get_or_load("hot", lambda: [card("h", 1)])
+    assert feed_cache.get_or_load("pool", lambda: None) == [card("p", 0)]
+    feed_cache.invalidate("pool", "hot")
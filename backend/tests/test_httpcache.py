@@ -0,0 +1,54 @@
+import gzip
+import json
+import pytest
+from flask import Flask, jsonify
+from httpcache import add_validators, compress, post_etag, not_modified
+
+BIG = {"content": "word " * 1000}
+
+@pytest.fixture
+def client():
+    # The app's response hooks on two stand-in routes
+    app = Flask(__name__)
+
+    @app.route("/big")
+    def big():
+        return jsonify(BIG)
+
+    @app.route("/post")
+    def post():
+        etag = post_etag("p", 3)
+        if not_modified(etag):
+            return "", 304
+        response = jsonify({"postId": "p"})
+        response.set_etag(etag)
+        return response
+
+    app.after_request(lambda response: compress(add_validators(response)))
+    return app.test_client()
+
+def test_repeat_get_with_the_etag_is_a_304(client):
+    first = client.get("/big")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get("/big", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
+
+def test_version_etag_revalidates_without_building_the_body(client):
+    first = client.get("/post")
+    assert first.headers["ETag"] == '"p.3"'
+    assert client.get("/post", headers={"If-None-Match": '"p.3"'}).status_code == 304
+    assert client.get("/post", headers={"If-None-Match": '"p.2"'}).status_code == 200
+
+def test_large_bodies_are_gzipped_and_tagged_per_coding(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.data)) == BIG
+    assert response.headers["ETag"].endswith('-gzip"')
+    # The compressed tag still validates the resource
+    again = client.get("/big", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+
+def test_small_or_unaccepted_bodies_are_sent_as_is(client):
+    assert "Content-Encoding" not in client.get("/post", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/big").headers
@@ -0,0 +1,69 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import pytest
+from blobstore import FilesystemBlobStore
+from imaging import ImagePipeline
+
+Image = pytest.importorskip("PIL.Image")
+
+def png(width):
+    out = io.BytesIO()
+    Image.new("RGB", (width, width // 2), "teal").save(out, "PNG")
+    return out.getvalue()
+
+@pytest.fixture
+def pipeline(db, tmp_path):
+    # The unique digest index is what turns a lost claim race into "skip"
+    db.image_variants.create_index("digest", unique=True)
+    pipeline = ImagePipeline(FilesystemBlobStore(str(tmp_path)), db.image_variants, [32], max_workers=1, claim_seconds=60)
+    yield pipeline
+    pipeline.shutdown()
+
+def wait_for_status(db, digest, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        doc = db.image_variants.find_one({"digest": digest})
+        if doc and doc["status"] != "pending":
+            return doc
+        assert time.monotonic() < deadline, "render did not finish"
+        time.sleep(0.05)
+
+def test_variants_are_rendered_once_per_digest(db, pipeline):
+    pipeline.submit("a" * 64, png(64))
+    doc = wait_for_status(db, "a" * 64)
+    assert doc["status"] == "done" and pipeline.variant_digest("a" * 64, 32)
+    pipeline.submit("a" * 64, b"not rendered again")
+    assert wait_for_status(db, "a" * 64)["variants"] == doc["variants"]
+
+def test_a_broken_pool_is_replaced(db, pipeline):
+    broken = ProcessPoolExecutor(max_workers=1)
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+    pipeline.executor = broken
+    pipeline.submit("b" * 64, png(64))
+    assert wait_for_status(db, "b" * 64)["status"] == "done"
+    assert pipeline.executor is not broken
+
+def test_failed_and_abandoned_claims_are_taken_over(db, pipeline):
+    db.image_variants.insert_many([
+        {"digest": "c" * 64, "status": "failed", "variants": {}},
+        {"digest": "d" * 64, "status": "pending", "variants": {}, "claimedAt": datetime.utcnow() - timedelta(hours=1)},
+        {"digest": "e" * 64, "status": "pending", "variants": {}, "claimedAt": datetime.utcnow()},
+    ])
+    for digest in ("c" * 64, "d" * 64, "e" * 64):
+        pipeline.submit(digest, png(64))
+    assert wait_for_status(db, "c" * 64)["status"] == "done"
+    assert wait_for_status(db, "d" * 64)["status"] == "done"
+    # A live claim is left to its owner
+    assert db.image_variants.find_one({"digest": "e" * 64})["status"] == "pending"
+
+def test_unreadable_image_marks_the_claim_failed(db, pipeline):
+    pipeline.submit("f" * 64, b"not an image")
+    assert wait_for_status(db, "f" * 64)["status"] == "failed"
+    # Re-uploading retries the render
+    pipeline.submit("f" * 64, png(64))
+    assert wait_for_status(db, "f" * 64)["status"] == "done"
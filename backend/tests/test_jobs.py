@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+import pytest
+from jobs import JobQueue, LeaseLost
+
+def make_due(db, job_id):
+    # Fast-forward past a lease or backoff
+    db.jobs.update_one({"_id": job_id}, {"$set": {"runAt": datetime.utcnow() - timedelta(seconds=1)}})
+
+def test_enqueued_job_runs_once_and_records_progress(db):
+    queue = JobQueue(db.jobs)
+    seen = []
+
+    @queue.handler("echo")
+    def echo(job):
+        seen.append(job.payload)
+        job.progress(items=2)
+        job.progress(items=3)
+
+    queue.enqueue("echo", {"n": 1})
+    assert queue.run_pending() == 1
+    assert queue.run_pending() == 0
+    doc = db.jobs.find_one()
+    assert seen == [{"n": 1}]
+    assert (doc["state"], doc["attempts"], doc["progress"]) == ("done", 1, {"items": 5})
+
+def test_claimed_job_is_not_offered_again_while_leased(db):
+    queue = JobQueue(db.jobs, lease_seconds=60)
+    queue.enqueue("noop", {})
+    assert queue.claim() is not None
+    assert queue.claim() is None
+
+def test_expired_lease_is_reclaimed_and_the_old_holder_is_fenced_off(db):
+    queue = JobQueue(db.jobs, lease_seconds=60)
+    queue.handler("noop")(lambda job: None)
+    queue.enqueue("noop", {})
+    stale = queue.claim()
+    # The first worker stalls past its lease
+    make_due(db, stale.id)
+    fresh = queue.claim()
+    assert fresh.id == stale.id and fresh.lease != stale.lease
+    assert fresh.attempts == 2
+    with pytest.raises(LeaseLost):
+        stale.progress(items=1)
+    queue.run(fresh)
+    # A late outcome from the old holder is ignored
+    queue._finish(stale, {"$set": {"state": "failed"}})
+    doc = db.jobs.find_one()
+    assert doc["state"] == "done"
+    assert doc["progress"] == {}
+
+def test_lease_lost_mid_handler_leaves_the_job_to_its_new_holder(db):
+    queue = JobQueue(db.jobs, lease_seconds=60)
+
+    @queue.handler("slow")
+    def slow(job):
+        make_due(db, job.id)
+        queue.claim()
+        job.progress(items=1)
+
+    queue.enqueue("slow", {})
+    queue.run(queue.claim())
+    doc = db.jobs.find_one()
+    assert doc["state"] == "running" and doc["attempts"] == 2
+
+def test_failures_back_off_then_give_up(db):
+    queue = JobQueue(db.jobs, max_attempts=2)
+
+    @queue.handler("flaky")
+    def flaky(job):
+        raise ValueError("nope")
+
+    job_id = queue.enqueue("flaky", {})
+    queue.run_pending()
+    doc = db.jobs.find_one()
+    assert doc["state"] == "queued" and "nope" in doc["lastError"]
+    assert doc["runAt"] > datetime.utcnow()
+    assert queue.run_pending() == 0
+    make_due(db, doc["_id"])
+    queue.run_pending()
+    doc = db.jobs.find_one()
+    assert (doc["state"], doc["attempts"]) == ("failed", 2)
+    counts, failed = queue.status()
+    assert counts == {"failed": 1}
+    assert str(failed[0]["_id"]) == job_id
+
+def test_unknown_kind_fails_like_a_handler_error(db):
+    queue = JobQueue(db.jobs, max_attempts=1)
+    queue.enqueue("missing", {})
+    queue.run_pending()
+    assert "No handler" in db.jobs.find_one()["lastError"]
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+import pytest
+
+@pytest.fixture
+def migration(db, monkeypatch):
+    # migrate_posts with every collection it imported pointed at the test db
+    import migrate_posts
+    for attr, collection in list(vars(migrate_posts).items()):
+        if attr.endswith("_collection"):
+            monkeypatch.setattr(migrate_posts, attr, db[collection.name])
+    return migrate_posts
+
+def add_user(db, name, posts):
+    return db.users.insert_one({"name": name, "posts": posts}).inserted_id
+
+def test_copy_then_prune_moves_embedded_posts(db, migration):
+    alice = add_user(db, "alice", [{"postId": "a1", "title": "one"}, {"postId": "a2", "title": "two"}])
+    add_user(db, "bob", [{"postId": "b1", "title": "three", "author": "Bob B."}])
+    migration.copy_posts(batch_size=1, refresh=False, restart=False)
+    a1 = db.posts.find_one({"postId": "a1"})
+    assert (a1["userId"], a1["author"]) == (str(alice), "alice")
+    assert db.posts.find_one({"postId": "b1"})["author"] == "Bob B."
+    migration.prune_posts(batch_size=1, restart=False)
+    assert db.posts.count_documents({}) == 3
+    assert db.users.count_documents({"posts": {"$exists": True}}) == 0
+
+def test_copy_keeps_posts_the_new_code_wrote_unless_refreshing(db, migration):
+    add_user(db, "alice", [{"postId": "a1", "title": "old"}])
+    db.posts.insert_one({"postId": "a1", "title": "edited"})
+    migration.copy_posts(batch_size=10, refresh=False, restart=False)
+    assert db.posts.find_one({"postId": "a1"})["title"] == "edited"
+    migration.copy_posts(batch_size=10, refresh=True, restart=True)
+    assert db.posts.find_one({"postId": "a1"})["title"] == "old"
+
+def test_copy_resumes_after_the_checkpoint(db, migration):
+    add_user(db, "alice", [{"postId": "a1"}])
+    migration.copy_posts(batch_size=10, refresh=False, restart=False)
+    add_user(db, "bob", [{"postId": "b1"}])
+    db.posts.delete_one({"postId": "a1"})
+    # Users before the checkpoint are not walked again without --restart
+    migration.copy_posts(batch_size=10, refresh=False, restart=False)
+    assert {p["postId"] for p in db.posts.find()} == {"b1"}
+    migration.copy_posts(batch_size=10, refresh=False, restart=True)
+    assert {p["postId"] for p in db.posts.find()} == {"a1", "b1"}
+
+def test_prune_only_drops_posts_that_were_copied(db, migration):
+    alice = add_user(db, "alice", [{"postId": "a1"}, {"postId": "a2"}])
+    db.posts.insert_one({"postId": "a1"})
+    migration.prune_posts(batch_size=10, restart=False)
+    assert [p["postId"] for p in db.users.find_one({"_id": alice})["posts"]] == ["a2"]
+
+def test_reactions_phase_moves_member_lists_into_the_stores(db, migration):
+    db.posts.insert_one({
+        "postId": "p", "likes": 1, "dislikes": 1, "views": 2,
+        "likedBy": ["u1"], "dislikedBy": ["u2"], "viewedBy": ["u1", "u2"]
+    })
+    migration.move_reactions(batch_size=10, restart=False, settle_seconds=60)
+    post = db.posts.find_one({"postId": "p"})
+    assert not {"likedBy", "dislikedBy", "viewedBy"} & set(post)
+    # The body changed, so cached copies and ETags must too
+    assert post["version"] == 1
+    assert {(r["userId"], r["kind"]) for r in db.reactions.find()} == {("u1", "like"), ("u2", "dislike")}
+    assert db.views.count_documents({"postId": "p"}) == 2
+
+def test_comments_phase_moves_threads_into_their_collections(db, migration):
+    db.posts.insert_one({"postId": "p", "comments": [
+        {"commentId": "c1", "comment": "first", "replies": [{"replyId": "r1", "reply": "re"}]},
+        {"commentId": "c2", "comment": "second"},
+    ]})
+    migration.move_comments(batch_size=10, restart=False)
+    post = db.posts.find_one({"postId": "p"})
+    assert "comments" not in post and post["commentCount"] == 2
+    assert post["version"] == 1
+    assert db.comments.find_one({"commentId": "c1"})["replyCount"] == 1
+    assert db.replies.find_one({"replyId": "r1"})["commentId"] == "c1"
+
+def test_comments_phase_adds_to_counts_of_comments_made_since_deploy(db, migration):
+    # One comment arrived through the new code before the phase ran
+    db.posts.insert_one({"postId": "p", "commentCount": 1, "comments": [{"commentId": "c1"}, {"commentId": "c2"}]})
+    migration.move_comments(batch_size=10, restart=False)
+    assert db.posts.find_one({"postId": "p"})["commentCount"] == 3
+
+def test_authors_phase_links_comments_to_unambiguous_names(db, migration):
+    ada = str(db.users.insert_one({"name": "Ada"}).inserted_id)
+    db.users.insert_many([{"name": "Sam"}, {"name": "Sam"}])
+    db.comments.insert_many([{"commenter": "Ada"}, {"commenter": "Sam"}, {"commenter": "Nobody"}])
+    db.replies.insert_one({"replyCommenter": "Ada"})
+    migration.link_authors(batch_size=1, restart=False)
+    assert {c["commenter"]: c.get("userId") for c in db.comments.find()} == {"Ada": ada, "Sam": None, "Nobody": None}
+    assert db.replies.find_one()["userId"] == ada
+
+def reacted(minutes_ago):
+    return (datetime.utcnow() - timedelta(minutes=minutes_ago)).isoformat()
+
+def test_recount_sets_counters_from_the_reactions_store(db, migration):
+    db.posts.insert_many([{"postId": "p", "likes": 5, "dislikes": 0}, {"postId": "q", "likes": 1, "dislikes": 0}])
+    db.reactions.insert_many([
+        {"postId": "p", "userId": "u1", "kind": "like", "timestamp": reacted(10)},
+        {"postId": "p", "userId": "u2", "kind": "dislike", "timestamp": reacted(10)},
+        {"postId": "p", "userId": "u3", "kind": None, "timestamp": reacted(10)},
+        {"postId": "q", "userId": "u1", "kind": "like", "timestamp": reacted(10)},
+    ])
+    migration.recount_reactions(batch_size=1, restart=False, settle_seconds=60)
+    p, q = db.posts.find_one({"postId": "p"}), db.posts.find_one({"postId": "q"})
+    assert (p["likes"], p["dislikes"], p["version"]) == (1, 1, 1)
+    assert "version" not in q
+
+def test_recount_leaves_recently_toggled_posts_alone(db, migration):
+    # The toggle's counter change may still be in flight
+    db.posts.insert_one({"postId": "p", "likes": 0, "dislikes": 0})
+    db.reactions.insert_one({"postId": "p", "userId": "u1", "kind": "like", "timestamp": reacted(0)})
+    migration.recount_reactions(batch_size=10, restart=False, settle_seconds=60)
+    assert db.posts.find_one({"postId": "p"})["likes"] == 0
+
+def test_reactions_phase_recounts_what_it_moves(db, migration):
+    # u2's like reached the store, then the process died before the counters
+    # moved; the legacy u1 like is counted already
+    db.posts.insert_one({"postId": "p", "likes": 1, "dislikes": 0, "likedBy": ["u1"]})
+    db.reactions.insert_one({"postId": "p", "userId": "u2", "kind": "like", "timestamp": reacted(10)})
+    migration.move_reactions(batch_size=10, restart=False, settle_seconds=60)
+    assert db.posts.find_one({"postId": "p"})["likes"] == 2
@@ -0,0 +1,42 @@
+import threading
+import pytest
+from passwords import PasswordHasher, PasswordPoolBusy
+
+@pytest.fixture
+def hasher():
+    # bcrypt's lowest cost keeps the tests fast
+    return PasswordHasher("4", max_workers=1, max_pending=2)
+
+def test_hash_verifies_and_reports_its_cost(hasher):
+    hashed = hasher.hash("secret")
+    assert hasher.verify("secret", hashed)
+    assert not hasher.verify("wrong", hashed)
+    assert not hasher.needs_rehash(hashed)
+    assert PasswordHasher("5", 1, 1).needs_rehash(hashed)
+
+def test_saturated_pool_refuses_instead_of_queueing(hasher):
+    release = threading.Event()
+    # One hash running, one waiting: the pool is full
+    blocked = [hasher._submit(release.wait, 5) for _ in range(2)]
+    with pytest.raises(PasswordPoolBusy):
+        hasher.hash("secret")
+    release.set()
+    for future in blocked:
+        future.result()
+
+def test_login_answers_429_while_the_pool_is_full(db, hasher, monkeypatch):
+    from flask import Flask
+    import routes.auth
+    monkeypatch.setattr(routes.auth, "users_collection", db.users)
+    monkeypatch.setattr(routes.auth, "password_hasher", hasher)
+    db.users.insert_one({"email": "a@example.com", "password": hasher.hash("secret")})
+    app = Flask(__name__)
+    app.register_blueprint(routes.auth.auth_bp, url_prefix="/api")
+    release = threading.Event()
+    blocked = [hasher._submit(release.wait, 5) for _ in range(2)]
+    response = app.test_client().post("/api/login", json={"email": "a@example.com", "password": "secret"})
+    release.set()
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    for future in blocked:
+        future.result()
@@ -0,0 +1,39 @@
+import pytest
+from flask import Flask
+import routes.posts
+from counter_buffer import CounterBuffer
+from events import EventBus
+
+@pytest.fixture
+def buffer(db, monkeypatch):
+    # The posts blueprint on the test db, with buffered counters
+    for attr, collection in list(vars(routes.posts).items()):
+        if attr.endswith("_collection"):
+            monkeypatch.setattr(routes.posts, attr, db[collection.name])
+    buffer = CounterBuffer(db.posts, db.views, db.view_sketches, flush_interval=3600)
+    monkeypatch.setattr(routes.posts, "counter_buffer", buffer)
+    yield buffer
+    buffer.stop()
+
+@pytest.fixture
+def client(buffer):
+    app = Flask(__name__)
+    app.register_blueprint(routes.posts.posts_bp, url_prefix="/api")
+    return app.test_client()
+
+def test_buffered_view_of_a_missing_post_is_a_404(client, buffer):
+    response = client.post("/api/post/no-such-post/add-view", json={"userId": "u1"})
+    assert response.status_code == 404
+    assert buffer.views == {}
+
+def test_buffered_view_is_accepted_then_deduped(client, db):
+    db.posts.insert_one({"postId": "buffered-view", "views": 0})
+    assert client.post("/api/post/buffered-view/add-view", json={"userId": "u1"}).status_code == 202
+    again = client.post("/api/post/buffered-view/add-view", json={"userId": "u1"})
+    assert (again.status_code, again.get_json()["message"]) == (200, "View already counted")
+
+def test_stream_over_the_cap_is_refused(client, db, monkeypatch):
+    db.posts.insert_one({"postId": "live"})
+    monkeypatch.setattr(routes.posts, "post_events", EventBus(max_streams=0))
+    response = client.get("/api/post/live/events")
+    assert response.status_code == 503 and response.headers["Retry-After"]
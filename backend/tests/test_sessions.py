@@ -0,0 +1,67 @@
+import pytest
+from bson import ObjectId
+from flask import Flask
+from config import Config
+import sessions
+from sessions import SessionError, acting_user, session_tokens
+
+@pytest.fixture
+def users(db, monkeypatch):
+    monkeypatch.setattr(sessions, "users_collection", db.users)
+    return db.users
+
+@pytest.fixture
+def request_as():
+    app = Flask(__name__)
+
+    def request_as(token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return app.test_request_context("/", headers=headers)
+    return request_as
+
+def test_token_identity_is_used_without_a_lookup(request_as):
+    user_id = str(ObjectId())
+    with request_as(session_tokens.issue(user_id, "Ada")):
+        assert acting_user(user_id, lookup=False) == {"userId": user_id, "name": None}
+        assert acting_user(None, lookup=False)["userId"] == user_id
+
+def test_writes_use_the_current_name_not_the_token_name(users, request_as):
+    user_id = str(users.insert_one({"name": "Ada L."}).inserted_id)
+    # Issued before the rename
+    with request_as(session_tokens.issue(user_id, "Ada")):
+        assert acting_user(None)["name"] == "Ada L."
+
+def test_token_for_another_user_is_forbidden(request_as):
+    with request_as(session_tokens.issue(str(ObjectId()), "Ada")):
+        with pytest.raises(SessionError) as error:
+            acting_user(str(ObjectId()))
+    assert error.value.status == 403
+
+def test_tampered_token_is_rejected(request_as):
+    token = session_tokens.issue(str(ObjectId()), "Ada")
+    with request_as(token[:-2] + "xx"):
+        with pytest.raises(SessionError) as error:
+            acting_user(None)
+    assert error.value.status == 401
+
+def test_without_a_token_the_claimed_user_is_looked_up(users, request_as):
+    user_id = str(users.insert_one({"name": "Grace"}).inserted_id)
+    with request_as():
+        assert acting_user(user_id)["name"] == "Grace"
+        assert acting_user(user_id, lookup=False) == {"userId": user_id, "name": None}
+        with pytest.raises(SessionError) as error:
+            acting_user(str(ObjectId()))
+    assert error.value.status == 404
+
+def test_tokens_can_be_required(request_as, monkeypatch):
+    monkeypatch.setattr(Config, "REQUIRE_SESSION_TOKEN", True)
+    with request_as():
+        with pytest.raises(SessionError) as error:
+            acting_user(str(ObjectId()))
+    assert error.value.status == 401
+
+def test_app_refuses_to_start_without_a_secret_key(monkeypatch):
+    from app import create_app
+    monkeypatch.setattr(Config, "SECRET_KEY", "")
+    with pytest.raises(RuntimeError):
+        create_app()
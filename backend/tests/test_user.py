@@ -0,0 +1,36 @@
+import base64
+import pytest
+from flask import Flask
+import routes.user
+from blobstore import FilesystemBlobStore, ImageStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+class Pipeline:
+    # Renders nothing; the variant URLs only depend on the widths
+    widths = [320]
+
+    def submit(self, digest, data):
+        pass
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(routes.user, "users_collection", db.users)
+    store = ImageStore(FilesystemBlobStore(str(tmp_path)), "http://blog.test", pipeline=Pipeline())
+    monkeypatch.setattr(routes.user, "image_store", store)
+    app = Flask(__name__)
+    app.register_blueprint(routes.user.user_bp, url_prefix="/api")
+    return app.test_client()
+
+def test_new_profile_image_comes_back_with_its_variants(client, db):
+    user_id = db.users.insert_one({"name": "Ada", "profileImage": None}).inserted_id
+    upload = "data:image/png;base64," + base64.b64encode(PNG).decode("ascii")
+    body = client.put(f"/api/user/{user_id}/update", json={"profileImage": upload}).get_json()
+    stored = db.users.find_one({"_id": user_id})["profileImage"]
+    assert body["profileImage"] == stored and stored.startswith("http://blog.test/api/images/")
+    assert body["profileImageVariants"] == {"320": f"{stored}/w/320"}
+
+def test_update_without_an_image_leaves_it_out(client, db):
+    user_id = db.users.insert_one({"name": "Ada"}).inserted_id
+    body = client.put(f"/api/user/{user_id}/update", json={"occupation": "engineer"}).get_json()
+    assert body == {"message": "User updated successfully"}
@@ -0,0 +1,60 @@
+from reactions import toggle_reaction, get_reaction
+from views import hll_estimate, record_view, record_exact_views
+
+def test_approximate_views_count_each_reader_once(db):
+    db.posts.insert_one({"postId": "p", "views": 0})
+    assert record_view(db.posts, db.views, db.view_sketches, "p", "u1", mode="approximate") is True
+    assert record_view(db.posts, db.views, db.view_sketches, "p", "u1", mode="approximate") is False
+    assert db.posts.find_one({"postId": "p"})["views"] == 1
+
+def test_approximate_view_of_missing_post(db):
+    assert record_view(db.posts, db.views, db.view_sketches, "nope", "u1", mode="approximate") is None
+
+def test_hll_estimate_is_close_for_many_readers(db):
+    db.posts.insert_one({"postId": "p", "views": 0})
+    for i in range(2000):
+        record_view(db.posts, db.views, db.view_sketches, "p", f"user-{i}", mode="approximate")
+    for i in range(500):
+        # Repeat readers leave the estimate alone
+        record_view(db.posts, db.views, db.view_sketches, "p", f"user-{i}", mode="approximate")
+    assert abs(db.posts.find_one({"postId": "p"})["views"] - 2000) < 2000 * 0.05
+    assert hll_estimate({}) == 0
+
+def test_exact_views_dedupe_and_missing_post(db):
+    db.posts.insert_one({"postId": "p", "views": 0})
+    assert record_view(db.posts, db.views, db.view_sketches, "p", "u1") is True
+    assert record_view(db.posts, db.views, db.view_sketches, "p", "u1") is False
+    assert record_view(db.posts, db.views, db.view_sketches, "nope", "u1") is None
+    assert db.posts.find_one({"postId": "p"})["views"] == 1
+    assert db.views.count_documents({"postId": "nope"}) == 0
+
+def test_toggle_sets_clears_and_switches_a_reaction(db):
+    db.posts.insert_one({"postId": "p", "likes": 0, "dislikes": 0})
+    state = toggle_reaction(db.posts, db.reactions, "p", "u1", "like")
+    assert (state["likes"], state["liked"]) == (1, True)
+    state = toggle_reaction(db.posts, db.reactions, "p", "u1", "dislike")
+    assert (state["likes"], state["dislikes"], state["disliked"]) == (0, 1, True)
+    state = toggle_reaction(db.posts, db.reactions, "p", "u1", "dislike")
+    assert (state["dislikes"], state["disliked"]) == (0, False)
+    assert get_reaction(db.reactions, "p", "u1") is None
+
+def test_toggle_on_a_missing_post_records_nothing(db):
+    assert toggle_reaction(db.posts, db.reactions, "nope", "u1", "like") is None
+    assert db.reactions.count_documents({}) == 0
+
+def test_legacy_viewers_are_not_counted_again(db):
+    db.posts.insert_one({"postId": "p", "views": 2, "viewedBy": ["old", "older"]})
+    assert record_view(db.posts, db.views, db.view_sketches, "p", "old") is False
+    assert record_exact_views(db.posts, db.views, [("p", "older"), ("p", "new")]) == {("p", "new")}
+    assert db.posts.find_one({"postId": "p"})["views"] == 3
+
+def test_toggle_takes_back_a_legacy_like(db):
+    db.posts.insert_one({"postId": "p", "likes": 1, "dislikes": 0, "likedBy": ["u1"]})
+    state = toggle_reaction(db.posts, db.reactions, "p", "u1", "like")
+    assert (state["likes"], state["liked"]) == (0, False)
+    assert get_reaction(db.reactions, "p", "u1") is None
+
+def test_toggle_switches_a_legacy_dislike(db):
+    db.posts.insert_one({"postId": "p", "likes": 0, "dislikes": 1, "dislikedBy": ["u1"]})
+    state = toggle_reaction(db.posts, db.reactions, "p", "u1", "like")
+    assert (state["likes"], state["dislikes"], state["liked"]) == (1, 0, True)
@@ -0,0 +1,125 @@
+import hashlib
+import math
+from collections import Counter
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# HyperLogLog sketch with 2**12 registers: ~1.6% standard error in 4096
+# small integers per post, however many readers it has
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+def hll_position(user_id):
+    h = int.from_bytes(hashlib.sha1(user_id.encode("utf-8")).digest()[:8], "big")
+    index = h >> (64 - HLL_PRECISION)
+    rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+    # Rank = position of the first set bit in the remaining bits
+    rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+    return index, rank
+
+def hll_estimate(registers):
+    m = HLL_REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    total = 0.0
+    for value in registers.values():
+        total += 2.0 ** -value
+    zeros = m - len(registers)
+    total += zeros
+    estimate = alpha * m * m / total
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction (linear counting)
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+def legacy_views(posts_collection, pairs):
+    # The (postId, userId) pairs still listed in their post's legacy viewedBy
+    # array, which `migrate_posts.py reactions` has not moved yet. Those views
+    # are already in the counter.
+    if not pairs:
+        return set()
+    user_ids = list({user_id for _, user_id in pairs})
+    listed = set()
+    for doc in posts_collection.aggregate([
+        {"$match": {"postId": {"$in": list({post_id for post_id, _ in pairs})}, "viewedBy": {"$in": user_ids}}},
+        {"$project": {"_id": 0, "postId": 1, "viewedBy": {"$filter": {"input": "$viewedBy", "cond": {"$in": ["$$this", user_ids]}}}}}
+    ]):
+        listed.update((doc["postId"], user_id) for user_id in doc["viewedBy"])
+    return listed & set(pairs)
+
+def record_exact_view(posts_collection, views_collection, post_id, user_id):
+    # Unique (postId, userId) index makes the upsert the dedupe check.
+    # Returns True for a first view, False for a repeat, None for no post.
+    try:
+        result = views_collection.update_one(
+            {"postId": post_id, "userId": user_id},
+            {"$setOnInsert": {"timestamp": datetime.utcnow().isoformat()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    if result.upserted_id is None:
+        return False
+    # A reader still in the legacy viewedBy array is already counted
+    counted = posts_collection.update_one(
+        {"postId": post_id, "viewedBy": {"$ne": user_id}}, {"$inc": {"views": 1, "version": 1}}
+    )
+    if counted.matched_count == 0:
+        if posts_collection.find_one({"postId": post_id}, {"_id": 1}):
+            return False
+        views_collection.delete_one({"_id": result.upserted_id})
+        return None
+    return True
+
+def record_exact_views(posts_collection, views_collection, pairs):
+    # record_exact_view for many (postId, userId) pairs of existing posts:
+    # one bulk upsert of the view records and one bulk $inc of the counters.
+    # Returns the pairs that were first views.
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs:
+        return set()
+    now = datetime.utcnow().isoformat()
+    ops = [
+        UpdateOne({"postId": post_id, "userId": user_id}, {"$setOnInsert": {"timestamp": now}}, upsert=True)
+        for post_id, user_id in pairs
+    ]
+    try:
+        upserted = views_collection.bulk_write(ops, ordered=False).upserted_ids
+    except BulkWriteError as e:
+        # Duplicate-key races with concurrent views: count only our inserts
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+    first = [pairs[index] for index in upserted]
+    legacy = legacy_views(posts_collection, first)
+    counted = [pair for pair in first if pair not in legacy]
+    per_post = Counter(post_id for post_id, _ in counted)
+    if per_post:
+        posts_collection.bulk_write([
+            UpdateOne({"postId": post_id}, {"$inc": {"views": n, "version": 1}})
+            for post_id, n in per_post.items()
+        ], ordered=False)
+    return set(counted)
+
+def record_approximate_view(posts_collection, sketches_collection, post_id, user_id):
+    # Only a register that grows can change the estimate, so repeat views cost
+    # a single no-op $max
+    if not posts_collection.find_one({"postId": post_id}, {"_id": 1}):
+        return None
+    index, rank = hll_position(user_id)
+    result = sketches_collection.update_one(
+        {"postId": post_id},
+        {"$max": {f"registers.{index}": rank}},
+        upsert=True
+    )
+    if result.modified_count == 0 and result.upserted_id is None:
+        return False
+    sketch = sketches_collection.find_one({"postId": post_id}, {"_id": 0, "registers": 1})
+    posts_collection.update_one(
+        {"postId": post_id},
+        {"$set": {"views": hll_estimate(sketch.get("registers", {}))}, "$inc": {"version": 1}}
+    )
+    return True
+
+def record_view(posts_collection, views_collection, sketches_collection, post_id, user_id, mode="exact"):
+    if mode == "approximate":
+        return record_approximate_view(posts_collection, sketches_collection, post_id, user_id)
+    return record_exact_view(posts_collection, views_collection, post_id, user_id)
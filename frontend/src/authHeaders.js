@@ -0,0 +1,7 @@
+// JSON request headers plus the session token issued at login
+export function authHeaders() {
+  const token = localStorage.getItem("token");
+  return token
+    ? { "Content-Type": "application/json", Authorization: `Bearer ${token}` }
+    : { "Content-Type": "application/json" };
+}
@@ -3,6 +3,7 @@ import "./BlogCard.css";
 
 function BlogCard({
   image,
+  imageVariants,
   date = "Mar 23, 2023",
   readTime = "1",
   title = "Sample Blog Title",
@@ -15,7 +16,22 @@ function BlogCard({
   return (
     <div className="blog-card">
       <div className="blog-image-container">
-        {image && <img src={image} alt={title} className="blog-image" />}
+        {image && (
+          <img
+            src={image}
+            srcSet={
+              imageVariants
+                ? Object.entries(imageVariants)
+                    .map(([width, url]) => `${url} ${width}w`)
+                    .join(", ")
+                : undefined
+            }
+            sizes="(max-width: 600px) 100vw, 320px"
+            alt={title}
+            className="blog-image"
+            loading="lazy"
+          />
+        )}
       </div>
       <div className="blog-content">
         <h3 className="blog-title">{title}</h3>
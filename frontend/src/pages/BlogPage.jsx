@@ -1,8 +1,9 @@
-import React, { useEffect, useState, useCallback } from "react";
+import React, { useEffect, useState, useCallback, useRef } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import { FaThumbsUp, FaThumbsDown } from "react-icons/fa";
 import UserFunction from "../components/UserFunction";
 import "./BlogPage.css";
+import { authHeaders } from "../authHeaders";
 
 function BlogPage() {
   const { postId } = useParams();
@@ -13,10 +14,15 @@ function BlogPage() {
   const [error, setError] = useState("");
   const [commentContent, setCommentContent] = useState("");
   const [comments, setComments] = useState([]);
+  const [commentsCursor, setCommentsCursor] = useState(null);
   const [replyVisible, setReplyVisible] = useState({});
   const [replyData, setReplyData] = useState({});
+  // Read by the live event handlers, which outlive a single render
+  const commentsCursorRef = useRef(null);
+  commentsCursorRef.current = commentsCursor;
 
-  // Helper to fetch post data
+  // Helper to fetch post data. A plain GET, so the browser revalidates its
+  // cached copy with the ETag and a 304 skips the body.
   const fetchPostData = useCallback(async () => {
     try {
       const response = await fetch(`http://localhost:5000/api/post/${postId}`);
@@ -24,31 +30,155 @@ function BlogPage() {
         const errData = await response.json();
         throw new Error(errData.message || "Failed to fetch post");
       }
-      const data = await response.json();
-      setPost(data);
-      setComments(data.comments || []);
+      setPost(await response.json());
     } catch (err) {
       setError(err.message);
     }
   }, [postId]);
 
+  // Comments are paginated separately from the post, oldest first
+  const fetchComments = useCallback(
+    async (cursor) => {
+      try {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        const response = await fetch(
+          `http://localhost:5000/api/post/${postId}/comments${query}`
+        );
+        if (!response.ok) return;
+        const data = await response.json();
+        setComments((prev) =>
+          cursor ? [...prev, ...data.comments] : data.comments
+        );
+        setCommentsCursor(data.nextCursor);
+      } catch (err) {
+        console.error("Error fetching comments:", err);
+      }
+    },
+    [postId]
+  );
+
   useEffect(() => {
     if (postId) {
       fetchPostData();
+      fetchComments(null);
     }
-  }, [postId, fetchPostData]);
+  }, [postId, fetchPostData, fetchComments]);
+
+  // A logged-in reader's view goes through the batch endpoint, once per
+  // post and in parallel with the reads above
+  useEffect(() => {
+    const userId = localStorage.getItem("userId");
+    if (!postId || !userId) return;
+    fetch("http://localhost:5000/api/batch", {
+      method: "POST",
+      headers: authHeaders(),
+      body: JSON.stringify({
+        userId,
+        operations: [{ op: "add-view", postId }],
+      }),
+    }).catch((err) => console.error("Error recording view:", err));
+  }, [postId]);
+
+  // Show a new comment unless it is already listed (our own comments also
+  // come back on the event stream) or later pages are still unloaded
+  const appendComment = useCallback((comment) => {
+    if (commentsCursorRef.current) return;
+    setComments((prev) =>
+      prev.some((c) => c.commentId === comment.commentId)
+        ? prev
+        : [...prev, comment]
+    );
+  }, []);
+
+  const appendReply = useCallback((commentId, reply, replyCount) => {
+    setComments((prevComments) =>
+      prevComments.map((comment) => {
+        const replies = comment.replies || [];
+        if (
+          comment.commentId !== commentId ||
+          replies.some((r) => r.replyId === reply.replyId)
+        ) {
+          return comment;
+        }
+        return {
+          ...comment,
+          replyCount,
+          // Append only when the thread is fully loaded; otherwise the
+          // reply arrives with the next page
+          replies:
+            !comment.repliesCursor && replies.length === (comment.replyCount || 0)
+              ? [...replies, reply]
+              : comment.replies,
+        };
+      })
+    );
+  }, []);
+
+  // Live comments, replies and counters from other readers while the page
+  // is open
+  useEffect(() => {
+    if (!postId) return;
+    const source = new EventSource(
+      `http://localhost:5000/api/post/${postId}/events`
+    );
+    source.addEventListener("comment-added", (e) => {
+      const data = JSON.parse(e.data);
+      appendComment(data.comment);
+      setPost((prev) => prev && { ...prev, commentCount: data.commentCount });
+    });
+    source.addEventListener("reply-added", (e) => {
+      const data = JSON.parse(e.data);
+      appendReply(data.reply.commentId, data.reply, data.replyCount);
+    });
+    source.addEventListener("counters", (e) => {
+      const data = JSON.parse(e.data);
+      setPost((prev) => prev && { ...prev, ...data });
+    });
+    // The stream fell behind and missed events: refetch, and the browser
+    // reconnects on its own
+    source.addEventListener("resync", () => {
+      fetchPostData();
+      fetchComments(null);
+    });
+    return () => source.close();
+  }, [postId, fetchPostData, fetchComments, appendComment, appendReply]);
 
-  // Helper to update post data after like/dislike toggles
-  const refreshPost = async () => {
+  // Load (the next page of) replies for one comment on demand
+  const loadReplies = async (comment) => {
+    const query = comment.repliesCursor
+      ? `?cursor=${encodeURIComponent(comment.repliesCursor)}`
+      : "";
     try {
-      const refreshed = await fetch(`http://localhost:5000/api/post/${postId}`);
-      const data = await refreshed.json();
-      setPost(data);
+      const response = await fetch(
+        `http://localhost:5000/api/post/${postId}/comments/${comment.commentId}/replies${query}`
+      );
+      if (!response.ok) return;
+      const data = await response.json();
+      setComments((prevComments) =>
+        prevComments.map((c) =>
+          c.commentId === comment.commentId
+            ? {
+                ...c,
+                replies: [...(c.replies || []), ...data.replies],
+                repliesCursor: data.nextCursor,
+              }
+            : c
+        )
+      );
     } catch (err) {
-      console.error("Error refreshing post:", err);
+      console.error("Error fetching replies:", err);
     }
   };
 
+  // Apply the counters returned by a like/dislike toggle
+  const applyReaction = (data) => {
+    setPost((prev) => ({
+      ...prev,
+      likes: data.likes,
+      dislikes: data.dislikes,
+    }));
+  };
+
   // Add comment handler
   const handleAddComment = async (e) => {
     e.preventDefault();
@@ -62,13 +192,14 @@ function BlogPage() {
         `http://localhost:5000/api/post/${postId}/add-comment`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders(),
           body: JSON.stringify({ userId, content: commentContent }),
         }
       );
       const data = await response.json();
       if (response.ok) {
-        setComments([...comments, data.comment]);
+        appendComment(data.comment);
+        setPost((prev) => ({ ...prev, commentCount: data.commentCount }));
         setCommentContent("");
       } else {
         alert(data.message || "Failed to add comment.");
@@ -109,7 +240,7 @@ function BlogPage() {
         `http://localhost:5000/api/post/${postId}/add-reply`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders(),
           body: JSON.stringify({
             commentId,
             userId,
@@ -119,19 +250,7 @@ function BlogPage() {
       );
       const data = await response.json();
       if (response.ok) {
-        // Update comments with the new reply
-        setComments((prevComments) =>
-          prevComments.map((comment) =>
-            comment.commentId === commentId
-              ? {
-                  ...comment,
-                  replies: comment.replies
-                    ? [...comment.replies, data.reply]
-                    : [data.reply],
-                }
-              : comment
-          )
-        );
+        appendReply(commentId, data.reply, data.replyCount);
         // Reset reply input and hide the form
         setReplyData((prev) => ({
           ...prev,
@@ -159,15 +278,15 @@ function BlogPage() {
         `http://localhost:5000/api/post/${postId}/toggle-like`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders(),
           body: JSON.stringify({ userId }),
         }
       );
+      const data = await response.json();
       if (response.ok) {
-        refreshPost();
+        applyReaction(data);
       } else {
-        const errorData = await response.json();
-        alert(errorData.message || "Failed to toggle like");
+        alert(data.message || "Failed to toggle like");
       }
     } catch (error) {
       console.error("Error toggling like:", error);
@@ -186,15 +305,15 @@ function BlogPage() {
         `http://localhost:5000/api/post/${postId}/toggle-dislike`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders(),
           body: JSON.stringify({ userId }),
         }
       );
+      const data = await response.json();
       if (response.ok) {
-        refreshPost();
+        applyReaction(data);
       } else {
-        const errorData = await response.json();
-        alert(errorData.message || "Failed to toggle dislike");
+        alert(data.message || "Failed to toggle dislike");
       }
     } catch (error) {
       console.error("Error toggling dislike:", error);
@@ -283,7 +402,7 @@ function BlogPage() {
           </button>
         </div>
         <div className="comments-section">
-          <h3>Comments</h3>
+          <h3>Comments ({post.commentCount || 0})</h3>
           {comments.length > 0 ? (
             <div className="comments-list">
               {comments.map((comment) => (
@@ -308,6 +427,20 @@ function BlogPage() {
                       ))}
                     </div>
                   )}
+                  {(comment.repliesCursor ||
+                    (comment.replyCount || 0) >
+                      (comment.replies || []).length) && (
+                    <button
+                      onClick={() => loadReplies(comment)}
+                      className="reply-btn"
+                    >
+                      {comment.replies && comment.replies.length > 0
+                        ? "More replies"
+                        : `View ${comment.replyCount} ${
+                            comment.replyCount === 1 ? "reply" : "replies"
+                          }`}
+                    </button>
+                  )}
                   <button
                     onClick={() => toggleReplyForm(comment.commentId)}
                     className="reply-btn"
@@ -338,6 +471,14 @@ function BlogPage() {
           ) : (
             <p>No comments yet.</p>
           )}
+          {commentsCursor && (
+            <button
+              onClick={() => fetchComments(commentsCursor)}
+              className="reply-btn"
+            >
+              Load more comments
+            </button>
+          )}
           <form onSubmit={handleAddComment} className="comment-form">
             <textarea
               placeholder="Add a comment..."
@@ -5,6 +5,7 @@ import "react-toastify/dist/ReactToastify.css";
 import { useQuill } from "react-quilljs";
 import "quill/dist/quill.snow.css";
 import "./CreateBlogPost.css";
+import { authHeaders } from "../authHeaders";
 
 const quillModules = {
   toolbar: [
@@ -53,7 +54,7 @@ function CreateBlogPost() {
         `http://localhost:5000/api/user/${userId}/create-post`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders(),
           body: JSON.stringify(newPost),
         }
       );
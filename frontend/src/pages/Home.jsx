@@ -19,7 +19,8 @@ function Home() {
         throw new Error("Failed to fetch posts");
       }
       const data = await response.json();
-      setPosts(data);
+      // Search responses are paged: { results, nextCursor }
+      setPosts(query ? data.results : data);
     } catch (error) {
       console.error(error);
     }
@@ -29,19 +30,8 @@ function Home() {
     fetchPosts();
   }, []);
 
-  const handleCardClick = async (postId) => {
-    const userId = localStorage.getItem("userId");
-    if (userId) {
-      try {
-        await fetch(`http://localhost:5000/api/post/${postId}/add-view`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ userId }),
-        });
-      } catch (err) {
-        console.error("Failed to add view:", err);
-      }
-    }
+  // The post page records the view along with its own fetch
+  const handleCardClick = (postId) => {
     navigate(`/post/${postId}`);
   };
 
@@ -76,17 +66,18 @@ function Home() {
                 onClick={() => handleCardClick(post.postId)}
               >
                 <BlogCard
-                  image={post.image || "https://via.placeholder.com/150"}
+                  image={post.image || post.thumbnail || "https://via.placeholder.com/150"}
+                  imageVariants={post.imageVariants}
                   date={
                     post.timestamp
                       ? new Date(post.timestamp).toLocaleDateString()
                       : "N/A"
                   }
-                  readTime="2"
+                  readTime={post.readingTime || 1}
                   title={post.title}
-                  subtitle={post.content.substring(0, 50) + "..."}
+                  subtitle={post.excerpt}
                   views={post.views || 0}
-                  comments={post.comments ? post.comments.length : 0}
+                  comments={post.commentCount || 0}
                   likes={post.likes || 0}
                   author={post.author || "Unknown"}
                 />
@@ -29,8 +29,8 @@ function Login() {
       const data = await response.json();
 
       if (response.ok) {
-        // Store a dummy token; in a real app, use data.token from backend
-        localStorage.setItem("token", "dummy_token");
+        // Signed session token, sent with every write
+        localStorage.setItem("token", data.token);
         // Store the userId returned from the backend
         if (data.userId) {
           localStorage.setItem("userId", data.userId);
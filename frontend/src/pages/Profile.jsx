@@ -2,11 +2,14 @@ import React, { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { FaTrashAlt, FaEdit } from "react-icons/fa"; // Import icons for delete and update
 import "./Profile.css";
+import { authHeaders } from "../authHeaders";
 
 function Profile() {
   const navigate = useNavigate();
   const [user, setUser] = useState(null);
   const [error, setError] = useState("");
+  // Cursor for the next page of post summaries (null when there are no more)
+  const [nextCursor, setNextCursor] = useState(null);
   // State to track which post options are open; key is postId (for post deletion/update)
   const [openOptions, setOpenOptions] = useState({});
   // State to control the profile options menu (for updating profile)
@@ -31,7 +34,7 @@ function Profile() {
     }
 
     if (userId) {
-      fetch(`http://localhost:5000/api/user/${userId}`)
+      fetch(`http://localhost:5000/api/user/${userId}?fields=title,image`)
         .then(async (res) => {
           if (!res.ok) {
             const errorData = await res.json();
@@ -41,6 +44,7 @@ function Profile() {
         })
         .then((data) => {
           setUser(data);
+          setNextCursor(data.nextCursor);
           // Pre-fill the update form with current details
           setUpdateData({
             name: data.name,
@@ -58,6 +62,28 @@ function Profile() {
     }
   }, [navigate]);
 
+  const loadMorePosts = async () => {
+    const userId = localStorage.getItem("userId");
+    if (!userId || !nextCursor) return;
+    try {
+      const response = await fetch(
+        `http://localhost:5000/api/user/${userId}/posts?fields=title,image&cursor=${encodeURIComponent(nextCursor)}`
+      );
+      const data = await response.json();
+      if (response.ok) {
+        setUser((prevUser) => ({
+          ...prevUser,
+          posts: [...prevUser.posts, ...data.posts],
+        }));
+        setNextCursor(data.nextCursor);
+      } else {
+        alert(data.message || "Failed to load more posts");
+      }
+    } catch (error) {
+      console.error("Error loading posts:", error);
+    }
+  };
+
   const handlePostClick = (postId) => {
     navigate(`/post/${postId}`);
   };
@@ -73,7 +99,7 @@ function Profile() {
     try {
       const response = await fetch(
         `http://localhost:5000/api/user/${userId}/delete-post/${postId}`,
-        { method: "DELETE" }
+        { method: "DELETE", headers: authHeaders() }
       );
       const data = await response.json();
       if (response.ok) {
@@ -104,13 +130,27 @@ function Profile() {
         `http://localhost:5000/api/user/${userId}/update`,
         {
           method: "PUT",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders(),
           body: JSON.stringify(updateData),
         }
       );
       const data = await response.json();
       if (response.ok) {
+        // A new name comes with a new token
+        if (data.token) {
+          localStorage.setItem("token", data.token);
+        }
         setUser((prev) => ({ ...prev, ...updateData }));
+        // A changed image comes back as its stored URL with its own
+        // variants; the ones kept from before would show the old picture
+        if ("profileImage" in data) {
+          setUser((prev) => ({
+            ...prev,
+            profileImage: data.profileImage,
+            profileImageVariants: data.profileImageVariants,
+          }));
+          setUpdateData((prev) => ({ ...prev, profileImage: data.profileImage }));
+        }
         setUpdateModalVisible(false);
         setOpenProfileOptions(false);
         alert(data.message);
@@ -170,7 +210,11 @@ function Profile() {
           )}
         </div>
         {user.profileImage ? (
-          <img src={user.profileImage} alt="User" className="profile-pic" />
+          <img
+            src={user.profileImageVariants?.["320"] || user.profileImage}
+            alt="User"
+            className="profile-pic"
+          />
         ) : (
           <img src="./image.jpg" alt="Default User" className="profile-pic" />
         )}
@@ -234,7 +278,7 @@ function Profile() {
                 >
                   {post.image && (
                     <img
-                      src={post.image}
+                      src={post.imageVariants?.["320"] || post.image}
                       alt={post.title}
                       className="post-image"
                     />
@@ -247,6 +291,11 @@ function Profile() {
         ) : (
           <p>You have no posts yet.</p>
         )}
+        {nextCursor && (
+          <button className="load-more-button" onClick={loadMorePosts}>
+            Load more
+          </button>
+        )}
       </div>
 
       {updateModalVisible && (
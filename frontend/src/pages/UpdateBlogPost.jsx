@@ -5,6 +5,7 @@ import { ToastContainer, toast } from "react-toastify";
 import "react-quill/dist/quill.snow.css";
 import "react-toastify/dist/ReactToastify.css";
 import "./CreateBlogPost.css"; // You may reuse the CreateBlogPost styles
+import { authHeaders } from "../authHeaders";
 
 const quillModules = {
   toolbar: [
@@ -77,7 +78,7 @@ function UpdateBlogPost() {
         `http://localhost:5000/api/user/${userId}/update-post/${postId}`,
         {
           method: "PUT",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders(),
           body: JSON.stringify(updatedPost),
         }
       );